@@ -1,21 +1,16 @@
 import re
 import json
 import web
-import zipfile
 
-from bs4 import BeautifulSoup
 from bson.errors import InvalidId
 
-from cStringIO import StringIO
-
 from dlkit.runtime.errors import *
-from dlkit.runtime.primordium import Type, DataInputStream, DisplayText
+from dlkit.runtime.primordium import Type, DisplayText
 from dlkit.records.registry import ANSWER_GENUS_TYPES,\
     ASSESSMENT_TAKEN_RECORD_TYPES, COMMENT_RECORD_TYPES, BANK_RECORD_TYPES,\
     QUESTION_RECORD_TYPES, ANSWER_RECORD_TYPES, ITEM_RECORD_TYPES, ITEM_GENUS_TYPES,\
     ASSESSMENT_RECORD_TYPES, QUESTION_GENUS_TYPES
 
-from urllib import quote
 
 import assessment_utilities as autils
 import repository.repository_utilities as rutils
@@ -98,6 +93,8 @@ MULTI_LANGUAGE_FEEDBACK_ANSWER_RECORD = Type(**ANSWER_RECORD_TYPES['multi-langua
 
 urls = (
     "/banks/(.*)/assessmentsoffered/(.*)/assessmentstaken", "AssessmentsTaken",
+    "/banks/(.*)/assessmentsoffered/(.*)/results/export", "AssessmentOfferedResultsExport",
+    "/banks/(.*)/assessmentsoffered/(.*)/results/summary", "AssessmentOfferedResultsSummary",
     "/banks/(.*)/assessmentsoffered/(.*)/results", "AssessmentOfferedResults",
     "/banks/(.*)/assessmentsoffered/(.*)", "AssessmentOfferedDetails",
     "/banks/(.*)/assessmentstaken/(.*)/questions/(.*)/qti", "AssessmentTakenQuestionQTIDetails",
@@ -106,6 +103,7 @@ urls = (
     "/banks/(.*)/assessmentstaken/(.*)/questions/(.*)", "AssessmentTakenQuestionDetails",
     "/banks/(.*)/assessmentstaken/(.*)/questions", "AssessmentTakenQuestions",
     "/banks/(.*)/assessmentstaken/(.*)/finish", "FinishAssessmentTaken",
+    "/banks/(.*)/assessmentstaken/(.*)/submit", "AssessmentTakenSubmit",
     "/banks/(.*)/assessmentstaken/(.*)", "AssessmentTakenDetails",
     "/banks/(.*)/assessments/(.*)/assessmentsoffered", "AssessmentsOffered",
     "/banks/(.*)/assessments/(.*)/assignedbankids/(.*)", "AssessmentRemoveAssignedBankIds",
@@ -114,6 +112,8 @@ urls = (
     "/banks/(.*)/assessments/(.*)/items", "AssessmentItemsList",
     "/banks/(.*)/assessments/(.*)", "AssessmentDetails",
     "/banks/(.*)/assessments", "AssessmentsList",
+    "/banks/(.*)/itemimports/(.*)", "ItemImportDetails",
+    "/banks/(.*)/itemimports", "ItemImportsList",
     "/banks/(.*)/items/(.*)/videoreplacement", "ItemVideoTagReplacement",
     "/banks/(.*)/items/(.*)/qti", "ItemQTIDetails",
     "/banks/(.*)/items/(.*)", "ItemDetails",
@@ -151,18 +151,7 @@ class AssessmentBanksList(utilities.BaseClass):
             am = autils.get_assessment_manager()
             inputs = web.input()
             if 'displayName' in inputs or 'genusTypeId' in inputs:
-                querier = am.get_bank_query()
-                if 'displayName' in inputs:
-                    if autils._unescaped(inputs['displayName']):
-                        querier.match_display_name(quote(inputs['displayName'], safe='/ '), match=True)
-                    else:
-                        querier.match_display_name(inputs['displayName'], match=True)
-                if 'genusTypeId' in inputs:
-                    if (autils._unescaped(inputs['genusTypeId'])):
-                        querier.match_genus_type(quote(inputs['genusTypeId'], safe='/ '), match=True)
-                    else:
-                        querier.match_genus_type(inputs['genusTypeId'], match=True)
-                assessment_banks = am.get_banks_by_query(querier)
+                assessment_banks = autils.search_banks(am, inputs)
             else:
                 assessment_banks = am.banks
             banks = utilities.extract_items(assessment_banks)
@@ -184,7 +173,9 @@ class AssessmentBanksList(utilities.BaseClass):
 
             form = utilities.set_form_basics(form, data)
 
-            new_bank = utilities.convert_dl_object(am.create_bank(form))
+            new_bank = am.create_bank(form)
+            autils.index_bank(new_bank)
+            new_bank = utilities.convert_dl_object(new_bank)
 
             if 'aliasId' in data:
                 am.alias_bank(utilities.clean_id(json.loads(new_bank)['id']),
@@ -246,6 +237,8 @@ class AssessmentBankDetails(utilities.BaseClass):
         try:
             am = autils.get_assessment_manager()
             data = am.delete_bank(utilities.clean_id(bank_id))
+            autils.forget_object(utilities.clean_id(bank_id))
+            autils.unindex_bank(utilities.clean_id(bank_id))
             return utilities.success()
         except Exception as ex:
             utilities.handle_exceptions(ex)
@@ -255,6 +248,8 @@ class AssessmentBankDetails(utilities.BaseClass):
         try:
             am = autils.get_assessment_manager()
             assessment_bank = am.get_bank(utilities.clean_id(bank_id))
+            if utilities.not_modified(utilities.get_etag(assessment_bank)):
+                return ''
             bank = utilities.convert_dl_object(assessment_bank)
             return bank
         except Exception as ex:
@@ -270,6 +265,8 @@ class AssessmentBankDetails(utilities.BaseClass):
 
             form = utilities.set_form_basics(form, data)
             updated_bank = am.update_bank(form)
+            autils.forget_object(updated_bank.ident)
+            autils.index_bank(updated_bank)
 
             if 'aliasId' in data:
                 am.alias_bank(updated_bank.ident, utilities.clean_id(data['aliasId']))
@@ -312,9 +309,9 @@ class AssessmentsList(utilities.BaseClass):
                 assessment_bank.use_isolated_bank_view()
 
             assessments = assessment_bank.get_assessments()
+            assessments, next_url = utilities.get_page(assessments, self.data())
 
-            data = utilities.extract_items(assessments)
-            return data
+            return utilities.page_response(assessments, self.data(), next_url)
         except Exception as ex:
             utilities.handle_exceptions(ex)
 
@@ -366,6 +363,61 @@ class AssessmentsList(utilities.BaseClass):
             utilities.handle_exceptions(ex)
 
 
+class ItemImportsList(utilities.BaseClass):
+    """
+    Bulk import of QTI packages into the given assessment bank.
+    api/v1/assessment/banks/<bank_id>/itemimports
+
+    POST
+    POST one or more qtiFiles, each a QTI package (zip) or a zip of QTI
+    packages. Returns 202 with the import job; the packages are imported
+    in the background, so GET the job for its progress and errors.
+    """
+    @utilities.format_response
+    def POST(self, bank_id):
+        try:
+            am = autils.get_assessment_manager()
+            bank = autils.get_bank(am, utilities.clean_id(bank_id))
+            bank.use_isolated_bank_view()
+            if not bank.can_create_items():
+                raise PermissionDenied()
+
+            qti_files = web.webapi.rawinput('post').get('qtiFiles', [])
+            if not isinstance(qti_files, list):
+                qti_files = [qti_files]
+            uploads = [(f.filename, f.file) for f in qti_files if getattr(f, 'filename', None)]
+            if len(uploads) == 0:
+                raise NullArgument('qtiFiles')
+
+            job = autils.start_qti_import(bank, uploads)
+            web.ctx.status = '202 Accepted'
+            return job
+        except Exception as ex:
+            utilities.handle_exceptions(ex)
+
+
+class ItemImportDetails(utilities.BaseClass):
+    """
+    Progress of a bulk QTI import job.
+    api/v1/assessment/banks/<bank_id>/itemimports/<job_id>
+
+    GET
+    status is pending, running, complete or failed. processed of total
+    packages are done, with the new itemIds and the per-file errors.
+    """
+    @utilities.format_response
+    def GET(self, bank_id, job_id):
+        try:
+            am = autils.get_assessment_manager()
+            bank = am.get_bank(utilities.clean_id(bank_id))
+            job = autils.get_import_job(job_id)
+            if job['bankId'] != str(bank.ident):
+                raise NotFound()
+            return job
+        except Exception as ex:
+            utilities.handle_exceptions(ex)
+
+
 class ItemsList(utilities.BaseClass):
     """
     Return list of items in the given assessment bank. Make sure to embed
@@ -394,36 +446,22 @@ class ItemsList(utilities.BaseClass):
             if 'isolated' in params:
                 assessment_bank.use_isolated_bank_view()
 
-            if any(term in params for term in ['displayName', 'displayNames',
-                                               'genusTypeId']):
-                querier = assessment_bank.get_item_query()
-                if 'displayName' in params:
-                    if autils._unescaped(params['displayName']):
-                        querier.match_display_name(quote(params['displayName'], safe='/ '), match=True)
-                    else:
-                        querier.match_display_name(params['displayName'], match=True)
-                if 'displayNames' in params:
-                    if autils._unescaped(params['displayNames']):
-                        querier.match_display_names(quote(params['displayNames'], safe='/ '), match=True)
-                    else:
-                        querier.match_display_names(params['displayNames'], match=True)
-                if 'genusTypeId' in params:
-                    if (autils._unescaped(params['genusTypeId'])):
-                        querier.match_genus_type(quote(params['genusTypeId'], safe='/ '), match=True)
-                    else:
-                        querier.match_genus_type(params['genusTypeId'], match=True)
-                items = assessment_bank.get_items_by_query(querier)
+            if any(term in params for term in autils.SEARCH_PARAMETERS):
+                items = autils.search_items(assessment_bank, params)
             else:
                 items = assessment_bank.get_items()
 
+            items, next_url = utilities.get_page(items, params)
             results = []
 
             for item in items:
                 item_qti = None
+                if 'unshuffled' in params:
+                    unrandomized_order = autils.get_unrandomized_order(item)
                 if 'qti' in params:
                     # do this first to not mess up unrandomized MC choices
                     try:
-                        item_qti = item.get_qti_xml(media_file_root_path=autils.get_media_path(assessment_bank))
+                        item_qti = autils.get_qti_xml(item, assessment_bank)
                     except AttributeError:
                         pass  # not a qti question
                 item_map = item.object_map
@@ -434,11 +472,12 @@ class ItemsList(utilities.BaseClass):
                 if 'wronganswers' in params:
                     item_map = autils.update_item_json_answers(item, item_map)
                 if 'unshuffled' in params:
-                    item_map = autils.update_item_json_random_choices(assessment_bank, item, item_map)
+                    item_map = autils.update_item_json_random_choices(assessment_bank, item, item_map,
+                                                                      unrandomized_order)
 
                 results.append(item_map)
 
-            return json.dumps(results)
+            return utilities.page_response(results, params, next_url)
         except Exception as ex:
             utilities.handle_exceptions(ex)
 
@@ -449,7 +488,7 @@ class ItemsList(utilities.BaseClass):
             if bank_id is None:
                 utilities.verify_keys_present(self.data(), ['bankId'])
                 bank_id = self.data()['bankId']
-            bank = am.get_bank(utilities.clean_id(bank_id))
+            bank = autils.get_bank(am, utilities.clean_id(bank_id))
             bank.use_isolated_bank_view()
 
             try:
@@ -534,6 +573,7 @@ class ItemsList(utilities.BaseClass):
                         autils.archive_item(bank, parent_item)
 
                     new_item = bank.create_item(form)
+                    autils.index_item(new_item)
                     question = None
 
                     if 'question' in item_json:
@@ -635,213 +675,14 @@ class ItemsList(utilities.BaseClass):
                             afc = autils.set_answer_form_genus_and_feedback(answer, afc)
                             new_answer = bank.create_answer(afc)
             else:
-                # get each set of files individually, because
-                # we are doing this in memory, so the file pointer changes
-                # once we read in a file
-                # https://docs.python.org/2/library/zipfile.html
-                keywords = []
-                description = ''
-                learning_objective = None
-                media_files = {}
-                qti_file = None
-
-                # get manifest keywords first
-                with zipfile.ZipFile(x['qtiFile'].file) as qti_zip:
-                    for zip_file_name in qti_zip.namelist():
-                        if zip_file_name == 'imsmanifest.xml':
-                            manifest = qti_zip.open(zip_file_name)
-                            manifest_xml = manifest.read()
-                            manifest_soup = BeautifulSoup(manifest_xml, 'lxml-xml')
-                            if manifest_soup.resources.resource.metadata.general.description:
-                                for keyword in manifest_soup.resources.resource.metadata.general.description:
-                                    if keyword is not None and keyword.string is not None:
-                                        if '[type]' in keyword.string:
-                                            split_keywords = keyword.string.split('}')
-                                            type_tag = split_keywords[0]
-                                            keywords.append(type_tag.replace('[type]', '').replace('<', '').replace('>', '').replace('{', '').replace('}', ''))
-                                            if len(split_keywords) > 1:
-                                                description += '\n'.join(split_keywords[1::]).strip()
-                                        else:
-                                            description += keyword.string
-                            if manifest_soup.resources.lom:
-                                for classification in manifest_soup.resources.lom.find_all('classification'):
-                                    if classification.purpose.value.string == 'target audience':
-                                        learning_objective = classification.taxonPath.taxon.entry.string.string
-
-                # now get media files
-                with zipfile.ZipFile(x['qtiFile'].file) as qti_zip:
-                    for zip_file_name in qti_zip.namelist():
-                        if 'media/' in zip_file_name and zip_file_name != 'media/':
-                            # this method must match what is in the QTI QuestionFormRecord
-                            file_name = zip_file_name.replace('media/', '').replace('.', '_')
-                            file_obj = DataInputStream(StringIO(qti_zip.open(zip_file_name).read()))
-                            file_obj.name = zip_file_name
-                            media_files[file_name] = file_obj
-                # now deal with the question xml
-                with zipfile.ZipFile(x['qtiFile'].file) as qti_zip:
-                    for zip_file_name in qti_zip.namelist():
-                        if ('.xml' in zip_file_name and
-                                'media/' not in zip_file_name and
-                                zip_file_name != 'imsmanifest.xml'):
-                            qti_file = qti_zip.open(zip_file_name, 'rU')
-
-                    qti_xml = qti_file.read()
-
-                    # to handle video tags, we need to do a blanket replace
-                    # of  &lt; => <
-                    # and &gt; => >
-                    # with the assumption that will not break anything else ...
-                    # clean_qti_xml = qti_xml.replace('&lt;', '<').replace('&gt;', '>')
-                    # deprecated
-                    clean_qti_xml = qti_xml
-
-                    soup = BeautifulSoup(clean_qti_xml, 'xml')
-
-                    # QTI ID alias check to see if this item exists already
-                    # if so, create a new item and provenance it...
-                    original_qti_id = utilities.construct_qti_id(soup.assessmentItem['identifier'])
-                    try:
-                        parent_item = bank.get_item(original_qti_id)
-                        add_provenance_parent = True
-                    except (NotFound, InvalidId):
-                        parent_item = None
-                        add_provenance_parent = False
-
-                    # if this is a numeric response, do not add the wrong answer item
-                    # record, because need that to go through the magical items
-                    if soup.itemBody.textEntryInteraction and soup.templateDeclaration:
-                        items_records_list = [QTI_ITEM,
-                                              PROVENANCE_ITEM_RECORD,
-                                              MULTI_LANGUAGE_ITEM_RECORD]
-                    else:
-                        items_records_list = [QTI_ITEM,
-                                              PROVENANCE_ITEM_RECORD,
-                                              WRONG_ANSWER_ITEM,
-                                              MULTI_LANGUAGE_ITEM_RECORD]
-                    form = bank.get_item_form_for_create(items_records_list)
-
-                    # in order to support multi-languages, let's keep the title
-                    # but minus the last language code
-                    # i.e. ee_u1l01a01q01_en
-                    # keep ee_u1l01a01q01 as the item name
-                    item_name = soup.assessmentItem['title']
-                    language_code = None
-                    if any(lang_code in item_name for lang_code in ['en', 'hi', 'te']):
-                        language_code = item_name.split('_')[-1]
-                        item_name = '_'.join(item_name.split('_')[0:-1])
-
-                    form.add_display_name(utilities.create_display_text(item_name,
-                                                                        language_code))
-
-                    form.add_description(utilities.create_display_text(description or 'QTI AssessmentItem',
-                                                                       language_code))
-                    form.load_from_qti_item(clean_qti_xml,
-                                            keywords=keywords)
-                    if learning_objective is not None:
-                        # let's use unicode by default ...
-                        form.set_learning_objectives([utilities.clean_id(u'learning.Objective%3A{0}%40CLIX.TISS.EDU'.format(learning_objective).encode('utf8'))])
-                    if add_provenance_parent:
-                        form.set_provenance(str(parent_item.ident))
-                        # and also archive the parent
-                        autils.archive_item(bank, parent_item)
-                    new_item = bank.create_item(form)
-
-                    # ID Alias with the QTI ID from Onyx
-                    bank.alias_item(new_item.ident,
-                                    original_qti_id)
-
-                    q_form = bank.get_question_form_for_create(new_item.ident, [QTI_QUESTION,
-                                                                                MULTI_LANGUAGE_QUESTION_RECORD])
-                    if len(media_files) == 0:
-                        media_files = None
-
-                    q_form.load_from_qti_item(clean_qti_xml,
-                                              media_files=media_files,
-                                              keywords=keywords)
-                    question = bank.create_question(q_form)
-
-                    local_map = {
-                        'type': str(new_item.genus_type)
-                    }
-                    if (autils.is_multiple_choice(local_map) or
-                            autils.is_ordered_choice(local_map)):
-                        choices = question.get_choices()
-                    else:
-                        choices = None
-                    answer_record_types = [QTI_ANSWER,
-                                           MULTI_LANGUAGE_FEEDBACK_ANSWER_RECORD,
-                                           FILES_ANSWER_RECORD]
-                    # correct answer
-                    # need a default one, even for extended text interaction
-                    a_form = bank.get_answer_form_for_create(new_item.ident, answer_record_types)
-                    a_form.load_from_qti_item(clean_qti_xml,
-                                              keywords=keywords,
-                                              correct=True,
-                                              feedback_choice_id='correct',
-                                              media_files=media_files)
-                    answer = bank.create_answer(a_form)
-
-                    # now let's do the incorrect answers with feedback, if available
-                    if choices is not None:
-                        # what if there are multiple right answer choices,
-                        #  i.e. movable words?
-                        right_answers = answer.object_map['choiceIds']
-                        wrong_answers = [c for c in choices if c['id'] not in right_answers]
-
-                        # survey questions should mark all choices as correct,
-                        # because Onyx only lets you pick one ... so let's fix that ...
-                        if autils.is_survey(local_map):
-                            for wrong_answer in wrong_answers:
-                                a_form = bank.get_answer_form_for_create(new_item.ident, answer_record_types)
-                                # force to True in load_from_qti_item, once the choiceId is set
-                                a_form.load_from_qti_item(clean_qti_xml,
-                                                          keywords=keywords,
-                                                          correct=False,
-                                                          feedback_choice_id=wrong_answer['id'],
-                                                          media_files=media_files)
-
-                                bank.create_answer(a_form)
-                        else:
-                            # for now only support a generic wrong answer feedback for
-                            # mc multi-select ... otherwise have to do scoring somehow
-                            if (len(wrong_answers) > 0 and
-                                    str(new_item.genus_type) != str(CHOICE_INTERACTION_MULTI_GENUS)):
-                                for wrong_answer in wrong_answers:
-                                    a_form = bank.get_answer_form_for_create(new_item.ident, answer_record_types)
-                                    a_form.load_from_qti_item(clean_qti_xml,
-                                                              keywords=keywords,
-                                                              correct=False,
-                                                              feedback_choice_id=wrong_answer['id'],
-                                                              media_files=media_files)
-
-                                    bank.create_answer(a_form)
-                            else:
-                                # create a generic one
-                                a_form = bank.get_answer_form_for_create(new_item.ident, answer_record_types)
-                                a_form.load_from_qti_item(clean_qti_xml,
-                                                          keywords=keywords,
-                                                          correct=False,
-                                                          feedback_choice_id='incorrect',
-                                                          media_files=media_files)
-
-                                bank.create_answer(a_form)
-                    elif str(new_item.genus_type) in [str(INLINE_CHOICE_INTERACTION_GENUS),
-                                                      str(NUMERIC_RESPONSE_INTERACTION_GENUS)]:
-                        # create a generic one
-                        a_form = bank.get_answer_form_for_create(new_item.ident, answer_record_types)
-                        a_form.load_from_qti_item(clean_qti_xml,
-                                                  keywords=keywords,
-                                                  correct=False,
-                                                  feedback_choice_id='incorrect',
-                                                  media_files=media_files)
-
-                        bank.create_answer(a_form)
+                new_item = autils.create_qti_item(bank, uploaded_file)
 
             full_item = bank.get_item(new_item.ident)
-            return_data = utilities.convert_dl_object(full_item)
+            unrandomized_order = autils.get_unrandomized_order(full_item)
+            return_data = full_item.object_map
 
             return_data = autils.update_item_json_answers(full_item, return_data)
-            return_data = autils.update_item_json_random_choices(bank, full_item, return_data)
+            return_data = autils.update_item_json_random_choices(bank, full_item, return_data, unrandomized_order)
 
             return return_data
         except Exception as ex:
@@ -962,9 +803,8 @@ class AssessmentHierarchiesNodeChildrenList(utilities.BaseClass):
             nodes = am.get_bank_nodes(utilities.clean_id(bank_id),
                                       0, descendant_levels, False)
             if 'display_names' in web.input():
-                data = json.loads(utilities.extract_items(nodes.get_child_bank_nodes()))
+                data = list(utilities.iter_item_maps(nodes.get_child_bank_nodes()))
                 update_bank_names(data)
-                data = json.dumps(data)
             else:
                 data = utilities.extract_items(nodes.get_child_bank_nodes())
             return data
@@ -991,6 +831,8 @@ class AssessmentHierarchiesNodeChildrenList(utilities.BaseClass):
                 child_bank = am.get_bank(utilities.clean_id(child_id))
                 am.add_child_bank(utilities.clean_id(bank_id),
                                   child_bank.ident)
+            # federated bank searches now cover other banks
+            autils.ITEM_SEARCH_INDEX.forget_scopes()
             # clear memcached here, if using caching?
             try:
                 import memcache
@@ -1156,6 +998,8 @@ class ItemDetails(utilities.BaseClass):
             am = autils.get_assessment_manager()
             bank = am.get_bank(utilities.clean_id(bank_id))
             data = bank.delete_item(utilities.clean_id(sub_id))
+            autils.forget_qti(utilities.clean_id(sub_id))
+            autils.unindex_item(utilities.clean_id(sub_id))
             return utilities.success()
         except IllegalState as ex:
             utilities.handle_exceptions(type(ex)('This Item is being used in one or more '
@@ -1168,14 +1012,14 @@ class ItemDetails(utilities.BaseClass):
     def GET(self, bank_id, sub_id):
         try:
             am = autils.get_assessment_manager()
-            ils = am.get_item_lookup_session(proxy=am._proxy)
-            ils.use_federated_bank_view()
-
-            item = ils.get_item(utilities.clean_id(sub_id))
-            data = utilities.convert_dl_object(item)
+            item, item_bank = autils.get_routed_object(am, sub_id)
+            if utilities.not_modified(utilities.get_etag(item)):
+                return ''
+            unrandomized_order = autils.get_unrandomized_order(item)
+            data = item.object_map
 
             data = autils.update_item_json_answers(item, data)
-            data = autils.update_item_json_random_choices(ils, item, data)
+            data = autils.update_item_json_random_choices(item_bank, item, data, unrandomized_order)
 
             return data
         except Exception as ex:
@@ -1185,7 +1029,7 @@ class ItemDetails(utilities.BaseClass):
     def PUT(self, bank_id, sub_id):
         try:
             am = autils.get_assessment_manager()
-            bank = am.get_bank(utilities.clean_id(bank_id))
+            bank = autils.get_bank(am, utilities.clean_id(bank_id))
             bank.use_isolated_bank_view()
             local_data_map = self.data()
 
@@ -1210,6 +1054,7 @@ class ItemDetails(utilities.BaseClass):
                 form = autils.update_item_metadata(local_data_map, form)
 
                 updated_item = bank.update_item(form)
+                autils.index_item(updated_item)
                 if 'aliasId' in local_data_map:
                     bank.alias_item(updated_item.ident,
                                     utilities.clean_id(local_data_map['aliasId']))
@@ -1244,6 +1089,7 @@ class ItemDetails(utilities.BaseClass):
                 method(qf)
 
             if 'answers' in local_data_map:
+                choice_question = None
                 for answer in local_data_map['answers']:
                     if 'id' in answer:
                         a_id = utilities.clean_id(answer['id'])
@@ -1276,20 +1122,23 @@ class ItemDetails(utilities.BaseClass):
                             # the actual MC3 ChoiceIds, NOT the index passed
                             # in by the consumer.
                             # update this here because we need the new question,
-                            # if one was created.
-                            updated_item = bank.get_item(updated_item.ident)
-
-                            question = updated_item.get_question()
-                            afc = autils.update_answer_form(answer, afc, question)
+                            # if one was created. Creating answers does not
+                            # change the question, so only get it once.
+                            if choice_question is None:
+                                updated_item = bank.get_item(updated_item.ident)
+                                choice_question = updated_item.get_question()
+                            afc = autils.update_answer_form(answer, afc, choice_question)
                         else:
                             afc = autils.update_answer_form(answer, afc)
                         afc = autils.update_answer_form_with_files(afc, answer)
                         bank.create_answer(afc)
+            autils.forget_qti(utilities.clean_id(sub_id))
             full_item = bank.get_item(utilities.clean_id(sub_id))
-            return_data = utilities.convert_dl_object(full_item)
+            unrandomized_order = autils.get_unrandomized_order(full_item)
+            return_data = full_item.object_map
 
             return_data = autils.update_item_json_answers(full_item, return_data)
-            return_data = autils.update_item_json_random_choices(bank, full_item, return_data)
+            return_data = autils.update_item_json_random_choices(bank, full_item, return_data, unrandomized_order)
 
             return return_data
         except Exception as ex:
@@ -1307,19 +1156,16 @@ class ItemQTIDetails(utilities.BaseClass):
     def GET(self, bank_id, sub_id):
         try:
             am = autils.get_assessment_manager()
-            ils = am.get_item_lookup_session(proxy=am._proxy)
-            ils.use_federated_bank_view()
-
-            item = ils.get_item(utilities.clean_id(sub_id))
-
-            # don't do item.object_map here to get the bankId,
+            # routed to the item's bank, and don't do item.object_map here,
             # we've "gotten" the question and set the choice order (for randomized
             # MC). So by getting the QTI XML here, it's impossible to get the
             # original choice order, if shuffle = False...
-            item_bank = am.get_bank(utilities.clean_id(item._my_map['assignedBankIds'][0]))
+            item, item_bank = autils.get_routed_object(am, sub_id)
+            if utilities.not_modified(utilities.get_etag(item)):
+                return ''
 
             try:
-                return item.get_qti_xml(media_file_root_path=autils.get_media_path(item_bank))
+                return autils.get_qti_xml(item, item_bank)
             except AttributeError:
                 return ''
         except Exception as ex:
@@ -1352,10 +1198,11 @@ class AssessmentItemsList(utilities.BaseClass):
             params = self.data()
             for item in items:
                 item_qti = None
+                unrandomized_order = autils.get_unrandomized_order(item)
                 if 'qti' in params:
                     try:
                         # do this first to not mess up unrandomized MC choices
-                        item_qti = item.get_qti_xml(media_file_root_path=autils.get_media_path(bank))
+                        item_qti = autils.get_qti_xml(item, bank)
                     except AttributeError:
                         pass  # not a QTI item
 
@@ -1365,7 +1212,7 @@ class AssessmentItemsList(utilities.BaseClass):
                     item_map['qti'] = item_qti
 
                 item_map = autils.update_item_json_answers(item, item_map)
-                item_map = autils.update_item_json_random_choices(bank, item, item_map)
+                item_map = autils.update_item_json_random_choices(bank, item, item_map, unrandomized_order)
 
                 data.append(item_map)
 
@@ -1407,9 +1254,10 @@ class AssessmentItemsList(utilities.BaseClass):
             items = bank.get_assessment_items(utilities.clean_id(sub_id))
             data = []
             for item in items:
+                unrandomized_order = autils.get_unrandomized_order(item)
                 item_map = item.object_map
                 item_map = autils.update_item_json_answers(item, item_map)
-                item_map = autils.update_item_json_random_choices(bank, item, item_map)
+                item_map = autils.update_item_json_random_choices(bank, item, item_map, unrandomized_order)
                 data.append(item_map)
 
             return json.dumps(data)
@@ -1448,9 +1296,10 @@ class AssessmentItemsList(utilities.BaseClass):
 
             data = []
             for item in items:
+                unrandomized_order = autils.get_unrandomized_order(item)
                 item_map = item.object_map
                 item_map = autils.update_item_json_answers(item, item_map)
-                item_map = autils.update_item_json_random_choices(bank, item, item_map)
+                item_map = autils.update_item_json_random_choices(bank, item, item_map, unrandomized_order)
                 data.append(item_map)
 
             return json.dumps(data)
@@ -1497,10 +1346,9 @@ class AssessmentsOffered(utilities.BaseClass):
     def GET(self, bank_id, sub_id):
         try:
             am = autils.get_assessment_manager()
-            bank = am.get_bank(utilities.clean_id(bank_id))
+            bank = autils.get_bank(am, utilities.clean_id(bank_id))
             offerings = bank.get_assessments_offered_for_assessment(utilities.clean_id(sub_id))
-            data = utilities.extract_items(offerings)
-            return data
+            return utilities.stream_items(offerings)
         except Exception as ex:
             utilities.handle_exceptions(ex)
 
@@ -1509,7 +1357,7 @@ class AssessmentsOffered(utilities.BaseClass):
         # Cannot create offerings if no items attached to assessment
         try:
             am = autils.get_assessment_manager()
-            bank = am.get_bank(utilities.clean_id(bank_id))
+            bank = autils.get_bank(am, utilities.clean_id(bank_id))
             autils.check_assessment_has_items(bank, utilities.clean_id(sub_id))
 
             if isinstance(self.data(), list):
@@ -1553,8 +1401,10 @@ class AssessmentOfferedDetails(utilities.BaseClass):
     def DELETE(self, bank_id, offering_id):
         try:
             am = autils.get_assessment_manager()
-            bank = am.get_bank(utilities.clean_id(bank_id))
+            bank = autils.get_bank(am, utilities.clean_id(bank_id))
             data = bank.delete_assessment_offered(utilities.clean_id(offering_id))
+            autils.forget_object(utilities.clean_id(offering_id))
+            autils.forget_results_summary(utilities.clean_id(offering_id))
             return utilities.success()
         except IllegalState as ex:
             utilities.handle_exceptions(type(ex)('There are still AssessmentTakens '
@@ -1567,10 +1417,7 @@ class AssessmentOfferedDetails(utilities.BaseClass):
     def GET(self, bank_id, offering_id):
         try:
             am = autils.get_assessment_manager()
-            aols = am.get_assessment_offered_lookup_session(proxy=am._proxy)
-            aols.use_federated_bank_view()
-
-            offering = aols.get_assessment_offered(utilities.clean_id(offering_id))
+            offering, bank = autils.get_routed_object(am, offering_id, 'assessment_offered')
             data = utilities.convert_dl_object(offering)
             return data
         except Exception as ex:
@@ -1580,7 +1427,7 @@ class AssessmentOfferedDetails(utilities.BaseClass):
     def PUT(self, bank_id, offering_id):
         try:
             am = autils.get_assessment_manager()
-            bank = am.get_bank(utilities.clean_id(bank_id))
+            bank = autils.get_bank(am, utilities.clean_id(bank_id))
 
             if isinstance(self.data(), list):
                 if len(self.data()) == 1:
@@ -1599,6 +1446,7 @@ class AssessmentOfferedDetails(utilities.BaseClass):
                 data = utilities.convert_dl_object(return_data[0])
             else:
                 raise InvalidArgument()
+            autils.forget_object(utilities.clean_id(offering_id))
             return data
         except Exception as ex:
             utilities.handle_exceptions(ex)
@@ -1626,7 +1474,7 @@ class AssessmentOfferedResults(utilities.BaseClass):
 
         try:
             am = autils.get_assessment_manager()
-            bank = am.get_bank(utilities.clean_id(bank_id))
+            bank = autils.get_bank(am, utilities.clean_id(bank_id))
             params = self.data()
 
             with_additional_attempts = False
@@ -1659,6 +1507,68 @@ class AssessmentOfferedResults(utilities.BaseClass):
             utilities.handle_exceptions(ex)
 
 
+class AssessmentOfferedResultsExport(utilities.BaseClass):
+    """
+    Stream the class results for an assessment offered, one taken at a time
+    api/v2/assessment/banks/<bank_id>/assessmentsoffered/<offered_id>/results/export
+
+    GET
+    ?format=ndjson (default) for a taken per line, like in /results
+    ?format=csv for a row per question of each taken
+    ?since=2017-01-31T12:00:00Z for only the takens started, answered or finished since then (UTC)
+    ?additionalAttempts as in /results
+    """
+    @utilities.allow_cors
+    def GET(self, bank_id, offering_id):
+        try:
+            am = autils.get_assessment_manager()
+            bank = autils.get_bank(am, utilities.clean_id(bank_id))
+            offered = autils.get_assessment_offered(bank, utilities.clean_id(offering_id))
+            params = self.data()
+
+            export_format = params.get('format', 'ndjson')
+            if export_format not in autils.RESULTS_EXPORT_FORMATS:
+                raise InvalidArgument('format should be csv or ndjson')
+            since = None
+            if 'since' in params:
+                since = autils.get_results_since(params['since'])
+
+            takens = bank.get_assessments_taken_for_assessment_offered(offered.ident)
+            web.header('Content-Type', autils.RESULTS_EXPORT_FORMATS[export_format])
+            return autils.stream_results_export(bank,
+                                                takens,
+                                                export_format=export_format,
+                                                since=since,
+                                                with_additional_attempts='additionalAttempts' in params)
+        except Exception as ex:
+            utilities.handle_exceptions(ex)
+
+
+class AssessmentOfferedResultsSummary(utilities.BaseClass):
+    """
+    Get the class results summary for an assessment offered: how many takens
+    there are and are completed, and for each question, how many takens answered
+    it, answered it right and picked each choice
+    api/v2/assessment/banks/<bank_id>/assessmentsoffered/<offered_id>/results/summary
+
+    GET
+    """
+    @utilities.format_response
+    def GET(self, bank_id, offering_id):
+        try:
+            am = autils.get_assessment_manager()
+            bank = autils.get_bank(am, utilities.clean_id(bank_id))
+
+            # as for the takens list, learners should not see everyone else's results
+            if not bank.can_search_assessments_taken():
+                raise PermissionDenied('You are not authorized to view this.')
+
+            offered = autils.get_assessment_offered(bank, utilities.clean_id(offering_id))
+            return autils.get_results_summary(bank, offered.ident)
+        except Exception as ex:
+            utilities.handle_exceptions(ex)
+
+
 class AssessmentsTaken(utilities.BaseClass):
     """
     Get or link takens of an assessment. Input can be from an offering or from an assessment --
@@ -1681,7 +1591,7 @@ class AssessmentsTaken(utilities.BaseClass):
     def GET(self, bank_id, sub_id):
         try:
             am = autils.get_assessment_manager()
-            bank = am.get_bank(utilities.clean_id(bank_id))
+            bank = autils.get_bank(am, utilities.clean_id(bank_id))
 
             # use canSearch assessment takens as proxy for learner vs. instructor
             # learners should ideally only see their takens...not everyone else's
@@ -1693,8 +1603,8 @@ class AssessmentsTaken(utilities.BaseClass):
                     utilities.clean_id(sub_id))
             else:
                 takens = bank.get_assessments_taken_for_assessment(utilities.clean_id(sub_id))
-            data = utilities.extract_items(takens)
-            return data
+            takens, next_url = utilities.get_page(takens, self.data())
+            return utilities.page_response(takens, self.data(), next_url)
         except Exception as ex:
             utilities.handle_exceptions(ex)
 
@@ -1710,7 +1620,7 @@ class AssessmentsTaken(utilities.BaseClass):
             if 'assessment.AssessmentOffered' not in sub_id:
                 raise Unsupported()
             am = autils.get_assessment_manager()
-            bank = am.get_bank(utilities.clean_id(bank_id))
+            bank = autils.get_bank(am, utilities.clean_id(bank_id))
 
             # first check if a taken exists for the user / offering
             user_id = am.effective_agent_id
@@ -1736,7 +1646,9 @@ class AssessmentsTaken(utilities.BaseClass):
                 # method.
                 form = bank.get_assessment_taken_form_for_create(utilities.clean_id(sub_id),
                                                                  [REVIEWABLE_TAKEN])
-                data = utilities.convert_dl_object(bank.create_assessment_taken(form))
+                taken = bank.create_assessment_taken(form)
+                autils.update_results_summary(taken)
+                data = utilities.convert_dl_object(taken)
 
             return data
         except Unsupported as ex:
@@ -1763,8 +1675,11 @@ class AssessmentTakenDetails(utilities.BaseClass):
     def DELETE(self, bank_id, taken_id):
         try:
             am = autils.get_assessment_manager()
-            bank = am.get_bank(utilities.clean_id(bank_id))
+            bank = autils.get_bank(am, utilities.clean_id(bank_id))
+            offered_id = autils.get_assessment_taken(bank, utilities.clean_id(taken_id)).get_assessment_offered_id()
             data = bank.delete_assessment_taken(utilities.clean_id(taken_id))
+            autils.forget_object(utilities.clean_id(taken_id))
+            autils.remove_from_results_summary(offered_id, utilities.clean_id(taken_id))
             return utilities.success()
         except Exception as ex:
             utilities.handle_exceptions(ex)
@@ -1773,9 +1688,7 @@ class AssessmentTakenDetails(utilities.BaseClass):
     def GET(self, bank_id, taken_id):
         try:
             am = autils.get_assessment_manager()
-            atls = am.get_assessment_taken_lookup_session(proxy=am._proxy)
-            atls.use_federated_bank_view()
-            taken = atls.get_assessment_taken(utilities.clean_id(taken_id))
+            taken, bank = autils.get_routed_object(am, taken_id, 'assessment_taken')
             data = utilities.convert_dl_object(taken)
             return data
         except Exception as ex:
@@ -1797,6 +1710,9 @@ class FinishAssessmentTaken(utilities.BaseClass):
             # "finish" the assessment section
             # bank.finished_assessment_section(first_section.ident)
             assessment_session.finish_assessment(utilities.clean_id(taken_id))
+            autils.forget_object(utilities.clean_id(taken_id))
+            bank = autils.get_bank(am, utilities.clean_id(bank_id))
+            autils.update_results_summary(autils.get_assessment_taken(bank, utilities.clean_id(taken_id)))
             data = {
                 'success': True
             }
@@ -1820,7 +1736,7 @@ class AssessmentTakenQuestions(utilities.BaseClass):
     def GET(self, bank_id, taken_id):
         try:
             am = autils.get_assessment_manager()
-            bank = am.get_bank(utilities.clean_id(bank_id))
+            bank = autils.get_bank(am, utilities.clean_id(bank_id))
             bank.use_isolated_bank_view()
             first_section = bank.get_first_assessment_section(utilities.clean_id(taken_id))
             questions = first_section.get_questions()
@@ -1829,7 +1745,7 @@ class AssessmentTakenQuestions(utilities.BaseClass):
                 for question in questions:
                     try:
                         # do this first, to not mess up unrandomized choices
-                        question_qti = question.get_qti_xml(media_file_root_path=autils.get_media_path(bank))
+                        question_qti = autils.get_qti_xml(question, bank)
                     except AttributeError:
                         # drag and drop doesn't support QTI
                         question_qti = None
@@ -1838,9 +1754,8 @@ class AssessmentTakenQuestions(utilities.BaseClass):
                         'qti': question_qti
                     })
                     data.append(question_map)
-                data = json.dumps(data)
             else:
-                data = utilities.extract_items(questions)
+                data = list(utilities.iter_item_maps(questions))
             return data
         except Exception as ex:
             utilities.handle_exceptions(ex)
@@ -1857,22 +1772,20 @@ class AssessmentTakenQuestionDetails(utilities.BaseClass):
     def GET(self, bank_id, taken_id, question_id):
         try:
             am = autils.get_assessment_manager()
-            bank = am.get_bank(utilities.clean_id(bank_id))
+            bank = autils.get_bank(am, utilities.clean_id(bank_id))
             first_section = bank.get_first_assessment_section(utilities.clean_id(taken_id))
             question = bank.get_question(first_section.ident,
                                          utilities.clean_id(question_id))
-            data = utilities.convert_dl_object(question)
+            data = question.object_map
 
             status = autils.get_question_status(bank,
                                                 first_section,
                                                 utilities.clean_id(question_id))
-            data = json.loads(data)
             data.update(status)
 
             # if 'fileIds' in data:
             #     data['files'] = question.get_files()
 
-            data = json.dumps(data)
             return data
         except Exception as ex:
             utilities.handle_exceptions(ex)
@@ -1889,11 +1802,11 @@ class AssessmentTakenQuestionQTIDetails(utilities.BaseClass):
     def GET(self, bank_id, taken_id, question_id):
         try:
             am = autils.get_assessment_manager()
-            bank = am.get_bank(utilities.clean_id(bank_id))
+            bank = autils.get_bank(am, utilities.clean_id(bank_id))
             first_section = bank.get_first_assessment_section(utilities.clean_id(taken_id))
             question = bank.get_question(first_section.ident,
                                          utilities.clean_id(question_id))
-            data = question.get_qti_xml(media_file_root_path=autils.get_media_path(bank))
+            data = autils.get_qti_xml(question, bank)
             # if 'fileIds' in data:
             #     data['files'] = question.get_files()
             return data
@@ -1918,7 +1831,7 @@ class AssessmentTakenQuestionStatus(utilities.BaseClass):
     def GET(self, bank_id, taken_id, question_id):
         try:
             am = autils.get_assessment_manager()
-            bank = am.get_bank(utilities.clean_id(bank_id))
+            bank = autils.get_bank(am, utilities.clean_id(bank_id))
             first_section = bank.get_first_assessment_section(utilities.clean_id(taken_id))
             question = bank.get_question(first_section.ident,
                                          utilities.clean_id(question_id))
@@ -1954,31 +1867,14 @@ class AssessmentTakenQuestionSubmit(utilities.BaseClass):
             x = web.input(submission={})
 
             am = autils.get_assessment_manager()
-            bank = am.get_bank(utilities.clean_id(bank_id))
+            bank = autils.get_bank(am, utilities.clean_id(bank_id))
             bank.use_isolated_bank_view()
             first_section = bank.get_first_assessment_section(utilities.clean_id(taken_id))
-            question = first_section.get_question(utilities.clean_id(question_id))
-            response_form = bank.get_response_form(assessment_section_id=first_section.ident,
-                                                   item_id=question.ident)
             local_data_map = self.data()
-            if 'type' not in local_data_map:
-                # kind of a hack
-                q_object_map = question.object_map
-                question_map = q_object_map['genusTypeId']
-                if question_map != 'GenusType%3ADEFAULT%40DLKIT.MIT.EDU':
-                    local_data_map['type'] = q_object_map['genusTypeId']
-                    local_data_map['type'] = local_data_map['type'].replace('question-type',
-                                                                            'answer-type')
-                else:
-                    local_data_map['type'] = q_object_map['recordTypeIds'][0]
-                    local_data_map['type'] = local_data_map['type'].replace('question-record-type',
-                                                                            'answer-record-type')
             try:
                 filename = x['submission'].filename
             except AttributeError:
-                if autils.is_file_submission(local_data_map) and not autils.is_mw_sandbox(local_data_map):
-                    # TODO: for now, take empty response for MW Sandbox
-                    raise IllegalState('You must supply a file with a file upload question in the "submission" field.')
+                pass
             else:
                 if '.' not in filename:
                     extension = x['submission'].__dict__['type'].split('/')[-1]  # make assumption about mimetype
@@ -1987,63 +1883,74 @@ class AssessmentTakenQuestionSubmit(utilities.BaseClass):
                     if extension not in filename:
                         filename = '{0}.{1}'.format(filename, extension)
                 local_data_map['files'] = {filename: x['submission'].file}
-            try:
-                update_form = autils.update_response_form(local_data_map, response_form)
-            except AttributeError:
-                # form might not have the right records / methods that match the question
-                update_form = response_form
-            bank.submit_response(first_section.ident, question.ident, update_form)
+            # TODO: for now, take empty response for MW Sandbox
+            return_data = autils.submit_response(bank, first_section, question_id, local_data_map,
+                                                 allow_empty_mw_sandbox=True)
             # the above code logs the response in Mongo
+            autils.forget_object(utilities.clean_id(taken_id))
+            autils.update_results_summary(autils.get_assessment_taken(bank, utilities.clean_id(taken_id)),
+                                          question_id=question_id)
+            return return_data
+        except Exception as ex:
+            utilities.handle_exceptions(ex)
 
-            response = bank.get_response(first_section.ident, question.ident)
-            correct = response.is_correct()
-
-            if autils.always_right(local_data_map):
-                correct = True
-
-            feedback = "No feedback available."
-            return_data = {
-                'correct': correct,
-                'feedback': feedback
-            }
 
-            # update with item solution, if available
-            feedback_strings = []
-            confused_los = []
+class AssessmentTakenSubmit(utilities.BaseClass):
+    """
+    Submits a batch of student responses, in order, i.e. when an offline
+    player syncs. Returns correct or not, and feedback, for each one
+    api/v1/assessment/banks/<bank_id>/assessmentstaken/<taken_id>/submit
 
-            item = first_section._get_item(question.ident)
-            try:
-                feedback = item.get_feedback_for_response(response)
-            except (NotFound, IllegalState, AttributeError):
-                pass
-            else:
-                # Need to wrap the feedback in <?xml> and also as a single block
-                # to make this work with OEA player
-                feedback_wrapped = feedback.text
-                if feedback_wrapped is None:
-                    feedback_wrapped = ''
-                if u'<modalFeedback' not in feedback_wrapped:
-                    feedback_wrapped = u'<modalFeedback>{0}</modalFeedback>'.format(feedback_wrapped)
+    POST only
 
-                feedback_soup = BeautifulSoup(feedback_wrapped, 'xml')
-                feedback_strings.append(feedback_soup.prettify())
+    Example (each response is like a question submit, plus its questionId):
+        [{"questionId": "assessment.Item%3A...%40ODL.MIT.EDU",
+          "choiceIds": ["id8f6e0a1b-cd4e-4b6e-9d8a-a1b2c3d4e5f6"]},
+         {"questionId": "assessment.Item%3A...%40ODL.MIT.EDU",
+          "integerValues": {"frontFaceValue": 0, "sideFaceValue": 1, "topFaceValue": 2}}]
 
-            try:
-                response_los = item.get_confused_learning_objective_ids_for_response(response)
-            except(NotFound, IllegalState, AttributeError):
-                pass
-            else:
-                confused_los += list(response_los)
+    A response that cannot be submitted gets an "error" message instead,
+    and the rest are still submitted. File responses are not supported.
+    """
+    @utilities.format_response
+    def POST(self, bank_id, taken_id):
+        try:
+            responses = self.data()
+            if isinstance(responses, dict):
+                utilities.verify_keys_present(responses, ['responses'])
+                responses = responses['responses']
+            if not isinstance(responses, list):
+                raise InvalidArgument('Send a list of responses')
+            for response in responses:
+                utilities.verify_keys_present(response, ['questionId'])
 
-            if len(feedback_strings) > 0:
-                return_data.update({
-                    'feedback': feedback_strings[0]
-                })
-            if len(confused_los) > 0:
-                return_data.update({
-                    'confusedLearningObjectiveIds': confused_los
-                })
-            return return_data
+            am = autils.get_assessment_manager()
+            bank = autils.get_bank(am, utilities.clean_id(bank_id))
+            bank.use_isolated_bank_view()
+            # so that nothing is stored if none of it can be
+            if not bank.can_take_assessments():
+                raise PermissionDenied()
+            first_section = bank.get_first_assessment_section(utilities.clean_id(taken_id))
+            results = []
+            for response in responses:
+                try:
+                    try:
+                        first_section.is_question_answered(utilities.clean_id(response['questionId']))
+                    except NotFound:
+                        # scaffold / waypoint sections add questions as they are
+                        # answered, so it may be new since the section was fetched
+                        first_section = bank.get_first_assessment_section(utilities.clean_id(taken_id))
+                    return_data = autils.submit_response(bank, first_section,
+                                                         response['questionId'], dict(response))
+                except Exception as ex:
+                    return_data = {
+                        'error': str(ex) or type(ex).__name__
+                    }
+                return_data['questionId'] = response['questionId']
+                results.append(return_data)
+            autils.forget_object(utilities.clean_id(taken_id))
+            autils.update_results_summary(autils.get_assessment_taken(bank, utilities.clean_id(taken_id)))
+            return results
         except Exception as ex:
             utilities.handle_exceptions(ex)
 
@@ -2061,7 +1968,7 @@ class AssessmentTakenQuestionSurrender(utilities.BaseClass):
     def POST(self, bank_id, taken_id, question_id):
         try:
             am = autils.get_assessment_manager()
-            bank = am.get_bank(utilities.clean_id(bank_id))
+            bank = autils.get_bank(am, utilities.clean_id(bank_id))
             first_section = bank.get_first_assessment_section(utilities.clean_id(taken_id))
             question = bank.get_question(first_section.ident,
                                          utilities.clean_id(question_id))
@@ -2071,6 +1978,8 @@ class AssessmentTakenQuestionSurrender(utilities.BaseClass):
             response_form.display_name = 'I surrendered'
             bank.submit_response(first_section.ident, question.ident, response_form)
             # the above code logs the response in Mongo
+            autils.update_results_summary(autils.get_assessment_taken(bank, utilities.clean_id(taken_id)),
+                                          question_id=question_id)
 
             answers = bank.get_answers(first_section.ident, question.ident)
             data = utilities.extract_items(answers)
@@ -2155,6 +2064,7 @@ class ItemVideoTagReplacement(utilities.BaseClass):
 
                 # third, replace the source attributes in the markup with
                 # the AssetContent placeholders
+                from bs4 import BeautifulSoup
                 soup = BeautifulSoup(updated_text, 'xml')
                 new_media_regex = re.compile('^(?!AssetContent).*$')
                 for new_media in soup.find_all(src=new_media_regex):
@@ -2182,6 +2092,7 @@ class ItemVideoTagReplacement(utilities.BaseClass):
                     form.set_text(str(soup.itemBody))
 
                 bank.update_question(form)
+                autils.forget_qti(item.ident)
                 item = bank.get_item(item.ident)
 
         return utilities.convert_dl_object(item)
@@ -1,21 +1,35 @@
+import csv
+import datetime
+import fcntl
+import hashlib
+import itertools
 import json
+import multiprocessing
 import os
 import re
+import shutil
+import tempfile
+import threading
+import time
+import uuid
 import web
+import zipfile
 
-from bs4 import BeautifulSoup
 from bson import ObjectId
 from bson.errors import InvalidId
 
+from collections import namedtuple
+from contextlib import contextmanager
+from copy import deepcopy
+from cStringIO import StringIO
+from multiprocessing.pool import ThreadPool
+
 from dlkit.abstract_osid.osid.objects import OsidObjectForm
 from dlkit.json_ import types
-from dlkit.runtime import PROXY_SESSION, RUNTIME
 from dlkit.runtime.errors import InvalidArgument, Unsupported, NotFound, NullArgument,\
-    IllegalState
-from dlkit.runtime.primitives import InitializableLocale
+    IllegalState, OperationFailed
 from dlkit.runtime.primordium import Duration, DateTime, Id, Type,\
     DataInputStream, DisplayText, RectangularSpatialUnit, BasicCoordinate
-from dlkit.runtime.proxy_example import SimpleRequest
 
 from inflection import underscore
 
@@ -24,7 +38,7 @@ from dlkit.records.registry import ASSESSMENT_OFFERED_RECORD_TYPES,\
     ITEM_RECORD_TYPES, ITEM_GENUS_TYPES, ASSET_CONTENT_GENUS_TYPES,\
     QUESTION_RECORD_TYPES
 
-from urllib import quote
+from urllib import quote, unquote
 
 import repository.repository_utilities as rutils
 import utilities
@@ -52,6 +66,9 @@ WRONG_ANSWER = Type(**ANSWER_GENUS_TYPES['wrong-answer'])
 RIGHT_ANSWER = Type(**ANSWER_GENUS_TYPES['right-answer'])
 
 LABEL_ORTHO_FACES_ITEM_RECORD = Type(**ITEM_RECORD_TYPES['label-ortho-faces'])
+MULTI_LANGUAGE_ITEM_RECORD = Type(**ITEM_RECORD_TYPES['multi-language'])
+PROVENANCE_ITEM_RECORD = Type(**ITEM_RECORD_TYPES['provenance'])
+QTI_ITEM = Type(**ITEM_RECORD_TYPES['qti'])
 
 FILES_ANSWER_RECORD = Type(**ANSWER_RECORD_TYPES['files'])
 FILES_QUESTION_RECORD = Type(**QUESTION_RECORD_TYPES['files'])
@@ -101,6 +118,84 @@ DEFAULT_LANGUAGE_TYPE = Type(**types.Language().get_type_data('DEFAULT'))
 DEFAULT_SCRIPT_TYPE = Type(**types.Script().get_type_data('DEFAULT'))
 DEFAULT_FORMAT_TYPE = Type(**types.Format().get_type_data('DEFAULT'))
 
+# bank id, host -> repository assets URL, see get_media_path()
+MEDIA_PATH_CACHE_SIZE = 1024  # entries
+MEDIA_PATH_CACHE = utilities.LRUCache(MEDIA_PATH_CACHE_SIZE)
+
+# (object type, item / offered / taken id) -> bank id, see get_object_bank()
+BANK_ROUTES_SIZE = 16384  # entries
+BANK_ROUTES = utilities.LRUCache(BANK_ROUTES_SIZE)
+
+# rendered QTI XML, see get_qti_xml()
+QTI_CACHE_SIZE = 32 * 1024 * 1024  # bytes
+QTI_CACHE = utilities.LRUCache(QTI_CACHE_SIZE, size_of=len)
+
+# (item id, item revision) -> compiled AnswerKeys, see get_answer_keys()
+ANSWER_KEY_CACHE_SIZE = 4096  # entries
+ANSWER_KEY_CACHE = utilities.LRUCache(ANSWER_KEY_CACHE_SIZE)
+
+# what grading needs from an Answer, as plain immutable values:
+# choices is the choice ids in order (None if the answer has no choices),
+# inline_choices a frozenset of (region, frozenset of choice ids),
+# faces (front, side, top) and numeric_range (low, high) for the edX types
+AnswerKey = namedtuple('AnswerKey', ['genus_type', 'record_type', 'right', 'choices',
+                                     'choice_set', 'inline_choices', 'faces', 'numeric_range'])
+# the compiled answers of one question, with the right answers' choices
+# gathered into sets so a submission is graded by a single lookup
+AnswerKeys = namedtuple('AnswerKeys', ['answers', 'right_orders', 'right_choice_sets',
+                                       'right_inline_choices'])
+
+# questionId authorities that the magic item lookup session (see
+# dlkit_configs) resolves to an item with params, see SectionItemLookupSession
+MAGIC_ITEM_AUTHORITIES = ['magic-randomize-choices-question-record',
+                          'magic-randomize-inline-choices-question-record',
+                          'qti-numeric-response']
+
+# archive bank name -> archive bank id, see get_archive_bank_id()
+ARCHIVE_BANK_IDS = {}
+ARCHIVE_BANK_IDS_LOCK = threading.Lock()
+
+# item and bank names (all languages), genus types and learning
+# objectives, see search_items() and search_banks(). The journal files
+# keep the server worker processes' indexes current
+SEARCH_INDEX_PATH = os.environ.get('QBANK_SEARCH_INDEX_PATH',
+                                   os.path.join(tempfile.gettempdir(), 'qbank-lite-search'))
+ITEM_SEARCH_INDEX = utilities.SearchIndex(text_fields=['displayName'],
+                                          journal_path=os.path.join(SEARCH_INDEX_PATH, 'items'))
+BANK_SEARCH_INDEX = utilities.SearchIndex(text_fields=['displayName'],
+                                          journal_path=os.path.join(SEARCH_INDEX_PATH, 'banks'))
+SEARCH_PARAMETERS = {  # query parameter -> indexed field
+    'displayName': 'displayName',
+    'displayNames': 'displayName',
+    'genusTypeId': 'genusTypeId',
+    'learningObjectiveId': 'learningObjectiveIds'
+}
+
+# bulk QTI imports, see start_qti_import()
+QTI_IMPORT_JOBS_PATH = os.environ.get('QBANK_IMPORT_JOBS_PATH',
+                                      os.path.join(tempfile.gettempdir(), 'qbank-lite-imports'))
+QTI_IMPORT_PROCESSES = int(os.environ.get('QBANK_IMPORT_PROCESSES', 0)) or None  # per worker, None = its share of the CPUs
+QTI_IMPORT_POOL = None  # see start_qti_import_pool()
+QTI_IMPORT_JOB_TTL = int(os.environ.get('QBANK_IMPORT_JOB_TTL', 24 * 60 * 60))  # seconds, see expire_import_jobs()
+
+# class results exports, see stream_results_export()
+RESULTS_EXPORT_FORMATS = {  # ?format= -> content type
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson'
+}
+RESULTS_EXPORT_COLUMNS = ['takenId', 'takingAgentId', 'actualStartTime', 'completionTime',
+                          'itemId', 'responded', 'isCorrect', 'submissionTime', 'choiceIds', 'error']
+RESULTS_EXPORT_THREADS = int(os.environ.get('QBANK_RESULTS_EXPORT_THREADS', 4))
+
+# per-offered results summaries, kept up to date as takens are created,
+# answered, finished and deleted, see update_results_summary()
+RESULTS_SUMMARIES_PATH = os.environ.get('QBANK_RESULTS_SUMMARIES_PATH',
+                                        os.path.join(tempfile.gettempdir(), 'qbank-lite-results'))
+
+# QTI media SHA-256 -> stored asset, per repository, see QTIMediaForm
+QTI_MEDIA_INDEX_PATH = os.environ.get('QBANK_MEDIA_INDEX_PATH',
+                                      os.path.join(tempfile.gettempdir(), 'qbank-lite-media'))
+
 
 def _unescaped(string):
     return ':' in string and '@' in string
@@ -192,6 +287,33 @@ def add_files_to_form(form, files):
     return form
 
 
+def add_to_results_summary(summary, taken_summary, count=1):
+    """add a taken's share (see get_taken_summary()) to an offered's
+    results summary, or take it away with count=-1"""
+    summary['takens'] += count
+    if taken_summary['completed']:
+        summary['completed'] += count
+    questions = dict((question['itemId'], question) for question in summary['questions'])
+    for response in taken_summary['questions']:
+        if response['itemId'] not in questions:
+            questions[response['itemId']] = {
+                'itemId': response['itemId'],
+                'responded': 0,
+                'correct': 0,
+                'choiceIds': {}
+            }
+            summary['questions'].append(questions[response['itemId']])
+        question = questions[response['itemId']]
+        if response['responded']:
+            question['responded'] += count
+        if response['isCorrect']:
+            question['correct'] += count
+        for choice_id in response['choiceIds']:
+            question['choiceIds'][choice_id] = question['choiceIds'].get(choice_id, 0) + count
+            if question['choiceIds'][choice_id] == 0:
+                del question['choiceIds'][choice_id]
+
+
 def always_right(question_map):
     return (is_file_submission(question_map) or
             is_mw_sandbox(question_map) or
@@ -220,47 +342,34 @@ def archive_bank_genus():
 def archive_item(original_bank, item):
     """archive this item to a clone of the original bank
     Create the archive bank if it does not exist"""
-
-    # NOTE: instead of using two query params, the expected_name
-    #       AND the expected_genus, we need to resort to using
-    #       only the genus and match on the name ourselves
-    #       There seems to be mismatching regex behavior between
-    #       the deployment Ubuntu and Mac, where Mac will find
-    #       the archive files using both params, but Ubuntu will not...
     am = get_assessment_manager()
+    archive_id = get_archive_bank_id(am, original_bank)
+    try:
+        am.assign_item_to_bank(item.ident, archive_id)
+    except NotFound:
+        # the cached archive bank may have been deleted since
+        forget_archive_bank_id(archive_id)
+        archive_id = get_archive_bank_id(am, original_bank)
+        am.assign_item_to_bank(item.ident, archive_id)
+    am.unassign_item_from_bank(item.ident, original_bank.ident)
+    forget_bank_route(str(item.ident))
+    forget_qti(item.ident)
+    # so that every worker finds it when searching the archive bank
+    index_item(item)
 
-    querier = am.get_bank_query()
-
-    expected_name = archive_bank_names(original_bank.ident)
-    expected_genus = archive_bank_genus()
-
-    # querier.match_display_name(expected_name, match=True)
-    querier.match_genus_type(expected_genus, match=True)
-
-    banks = am.get_banks_by_query(querier)
-    if banks.available() == 0:
-        # create the bank
-        form = am.get_bank_form_for_create([])
-        form.set_genus_type(expected_genus)
-        form.display_name = expected_name
-        form.description = 'For Archiving Items'
-        archive = am.create_bank(form)
-    else:
-        archive = None
-        for bank in banks:
-            if bank.display_name.text == expected_name:
-                archive = bank
-                break
-        if archive is None:
-            # create the bank
-            form = am.get_bank_form_for_create([])
-            form.set_genus_type(expected_genus)
-            form.display_name = expected_name
-            form.description = 'For Archiving Items'
-            archive = am.create_bank(form)
 
-    am.assign_item_to_bank(item.ident, archive.ident)
-    am.unassign_item_from_bank(item.ident, original_bank.ident)
+def can_review_solutions(taken, bank=None):
+    """whether taken shows the solution of answered questions, which
+    taken.get_solution_for_question() would look up for each question"""
+    try:
+        taken.get_solution_for_question  # only takens with review options
+        if bank is not None:
+            offered = get_assessment_offered(bank, taken.get_assessment_offered_id())
+        else:
+            offered = taken.get_assessment_offered()
+        return offered.can_review_solution_after_attempt()
+    except (AttributeError, IllegalState, NotFound):
+        return False
 
 
 def check_assessment_has_items(bank, assessment_id):
@@ -275,6 +384,50 @@ def check_assessment_has_items(bank, assessment_id):
         raise LookupError('No items')
 
 
+def compile_answer_key(answer):
+    """the AnswerKey that grades submissions against answer"""
+    record_type = answer.object_map['recordTypeIds'][0]
+    try:
+        choices = tuple(str(choice_id) for choice_id in answer.get_choice_ids())
+    except (AttributeError, IllegalState, KeyError):
+        choices = None
+    try:
+        inline_choices = frozenset((region, frozenset(str(choice_id) for choice_id in data['choiceIds']))
+                                   for region, data in answer.get_inline_choice_ids().iteritems())
+    except (AttributeError, IllegalState, KeyError):
+        inline_choices = None
+    faces = None
+    numeric_range = None
+    if record_type == 'answer-record-type%3Alabel-ortho-faces%40ODL.MIT.EDU':
+        faces = (int(answer.get_front_face_value()),
+                 int(answer.get_side_face_value()),
+                 int(answer.get_top_face_value()))
+    elif record_type == 'answer-record-type%3Anumeric-response-edx%40ODL.MIT.EDU':
+        expected = answer.get_decimal()
+        tolerance = answer.get_tolerance()
+        numeric_range = (expected - tolerance, expected + tolerance)
+    return AnswerKey(genus_type=str(answer.genus_type),
+                     record_type=record_type,
+                     right=is_right_answer(answer),
+                     choices=choices,
+                     choice_set=frozenset(choices or ()),
+                     inline_choices=inline_choices,
+                     faces=faces,
+                     numeric_range=numeric_range)
+
+
+def compile_answer_keys(answers):
+    keys = tuple(compile_answer_key(answer) for answer in answers)
+    right_keys = [key for key in keys if key.right]
+    return AnswerKeys(answers=keys,
+                      right_orders=frozenset(key.choices for key in right_keys
+                                             if key.choices is not None),
+                      right_choice_sets=frozenset(key.choice_set for key in right_keys
+                                                  if key.choices is not None),
+                      right_inline_choices=frozenset(key.inline_choices for key in right_keys
+                                                     if key.inline_choices is not None))
+
+
 def create_new_item(bank, data):
     if ('question' in data and
             'type' in data['question'] and
@@ -363,32 +516,231 @@ def create_new_item(bank, data):
             form = set_item_learning_objectives(data, form)
 
     new_item = bank.create_item(form)
+    index_item(new_item)
     return new_item
 
 
-def evaluate_inline_choice(answers, submission):
-    correct = False
-    right_answers = [a for a in answers
-                     if is_right_answer(a)]
-
-    for answer in right_answers:
-        answer_choices = answer.get_inline_choice_ids()
-        num_total = 0
-        num_right = 0
-        for inline_region, data in answer_choices.iteritems():
-            num_total += data['choiceIds'].available()
-        if len(submission.keys()) == len(answer_choices.keys()):
-            # assume order doesn't matter within the region -- though
-            # per QTI spec, I think it's only 1 choice per inline region
-            for inline_region, data in answer_choices.iteritems():
-                if ('choiceIds' in submission[inline_region] and
-                        len(submission[inline_region]['choiceIds']) == data['choiceIds'].available()):
-                    for choice_id in data['choiceIds']:
-                        if str(choice_id) in submission[inline_region]['choiceIds']:
-                            num_right += 1
-        if num_right == num_total:
-            correct = True
-    return correct
+def create_qti_item(bank, qti_file, package=None):
+    """create an item, with its question and answers, from a QTI package
+    (zip). package is parse_qti_package(qti_file), if already parsed.
+    The zip is opened once, and media files are streamed from it
+    into storage as the question and answers reference them"""
+    with zipfile.ZipFile(qti_file) as qti_zip:
+        if package is None:
+            package = read_qti_package(qti_zip)
+        media_files = get_qti_media_files(qti_zip, package['mediaNames'])
+        return create_qti_item_from_package(bank, package, media_files)
+
+
+def create_qti_item_from_package(bank, package, media_files):
+    keywords = package['keywords']
+    description = package['description']
+    learning_objective = package['learningObjective']
+
+    # to handle video tags, we need to do a blanket replace
+    # of  &lt; => <
+    # and &gt; => >
+    # with the assumption that will not break anything else ...
+    # clean_qti_xml = qti_xml.replace('&lt;', '<').replace('&gt;', '>')
+    # deprecated
+    clean_qti_xml = package['qtiXml']
+
+    # QTI ID alias check to see if this item exists already
+    # if so, create a new item and provenance it...
+    original_qti_id = utilities.construct_qti_id(package['identifier'])
+    fingerprint = get_qti_fingerprint(package, media_files)
+    try:
+        parent_item = bank.get_item(original_qti_id)
+        add_provenance_parent = True
+    except (NotFound, InvalidId):
+        parent_item = None
+        add_provenance_parent = False
+    else:
+        # ... unless it is a byte-identical re-upload of an unedited item,
+        # then keep it as-is
+        try:
+            if bank.get_item(get_qti_fingerprint_id(fingerprint, parent_item)).ident == parent_item.ident:
+                return parent_item
+        except (NotFound, InvalidId):
+            pass
+
+    # if this is a numeric response, do not add the wrong answer item
+    # record, because need that to go through the magical items
+    if package['numericResponse']:
+        items_records_list = [QTI_ITEM,
+                              PROVENANCE_ITEM_RECORD,
+                              MULTI_LANGUAGE_ITEM_RECORD]
+    else:
+        items_records_list = [QTI_ITEM,
+                              PROVENANCE_ITEM_RECORD,
+                              ITEM_WITH_WRONG_ANSWERS_RECORD_TYPE,
+                              MULTI_LANGUAGE_ITEM_RECORD]
+    form = bank.get_item_form_for_create(items_records_list)
+
+    # in order to support multi-languages, let's keep the title
+    # but minus the last language code
+    # i.e. ee_u1l01a01q01_en
+    # keep ee_u1l01a01q01 as the item name
+    item_name = package['title']
+    language_code = None
+    if any(lang_code in item_name for lang_code in ['en', 'hi', 'te']):
+        language_code = item_name.split('_')[-1]
+        item_name = '_'.join(item_name.split('_')[0:-1])
+
+    form.add_display_name(utilities.create_display_text(item_name,
+                                                        language_code))
+
+    form.add_description(utilities.create_display_text(description or 'QTI AssessmentItem',
+                                                       language_code))
+    form.load_from_qti_item(clean_qti_xml,
+                            keywords=keywords)
+    if learning_objective is not None:
+        # let's use unicode by default ...
+        form.set_learning_objectives([utilities.clean_id(u'learning.Objective%3A{0}%40CLIX.TISS.EDU'.format(learning_objective).encode('utf8'))])
+    if add_provenance_parent:
+        form.set_provenance(str(parent_item.ident))
+        # and also archive the parent
+        archive_item(bank, parent_item)
+    new_item = bank.create_item(form)
+    index_item(new_item)
+
+    # ID Alias with the QTI ID from Onyx
+    bank.alias_item(new_item.ident,
+                    original_qti_id)
+
+    media_repository = rutils.get_repository_manager().get_repository(bank.ident)
+    q_form = bank.get_question_form_for_create(new_item.ident, [QTI_QUESTION,
+                                                                MULTI_LANGUAGE_QUESTION_RECORD])
+    dedupe_qti_media(media_repository, q_form, QTI_QUESTION)
+    if len(media_files) == 0:
+        media_files = None
+
+    q_form.load_from_qti_item(clean_qti_xml,
+                              media_files=media_files,
+                              keywords=keywords)
+    question = bank.create_question(q_form)
+
+    local_map = {
+        'type': str(new_item.genus_type)
+    }
+    if (is_multiple_choice(local_map) or
+            is_ordered_choice(local_map)):
+        choices = question.get_choices()
+    else:
+        choices = None
+    answer_record_types = [QTI_ANSWER,
+                           MULTI_LANGUAGE_FEEDBACK_ANSWER_RECORD,
+                           FILES_ANSWER_RECORD]
+    # correct answer
+    # need a default one, even for extended text interaction
+    a_form = bank.get_answer_form_for_create(new_item.ident, answer_record_types)
+    dedupe_qti_media(media_repository, a_form, QTI_ANSWER)
+    a_form.load_from_qti_item(clean_qti_xml,
+                              keywords=keywords,
+                              correct=True,
+                              feedback_choice_id='correct',
+                              media_files=media_files)
+    answer = bank.create_answer(a_form)
+
+    # now let's do the incorrect answers with feedback, if available
+    if choices is not None:
+        # what if there are multiple right answer choices,
+        #  i.e. movable words?
+        right_answers = answer.object_map['choiceIds']
+        wrong_answers = [c for c in choices if c['id'] not in right_answers]
+
+        # survey questions should mark all choices as correct,
+        # because Onyx only lets you pick one ... so let's fix that ...
+        if is_survey(local_map):
+            for wrong_answer in wrong_answers:
+                a_form = bank.get_answer_form_for_create(new_item.ident, answer_record_types)
+                dedupe_qti_media(media_repository, a_form, QTI_ANSWER)
+                # force to True in load_from_qti_item, once the choiceId is set
+                a_form.load_from_qti_item(clean_qti_xml,
+                                          keywords=keywords,
+                                          correct=False,
+                                          feedback_choice_id=wrong_answer['id'],
+                                          media_files=media_files)
+
+                bank.create_answer(a_form)
+        else:
+            # for now only support a generic wrong answer feedback for
+            # mc multi-select ... otherwise have to do scoring somehow
+            if (len(wrong_answers) > 0 and
+                    str(new_item.genus_type) != str(CHOICE_INTERACTION_MULTI_GENUS)):
+                for wrong_answer in wrong_answers:
+                    a_form = bank.get_answer_form_for_create(new_item.ident, answer_record_types)
+                    dedupe_qti_media(media_repository, a_form, QTI_ANSWER)
+                    a_form.load_from_qti_item(clean_qti_xml,
+                                              keywords=keywords,
+                                              correct=False,
+                                              feedback_choice_id=wrong_answer['id'],
+                                              media_files=media_files)
+
+                    bank.create_answer(a_form)
+            else:
+                # create a generic one
+                a_form = bank.get_answer_form_for_create(new_item.ident, answer_record_types)
+                dedupe_qti_media(media_repository, a_form, QTI_ANSWER)
+                a_form.load_from_qti_item(clean_qti_xml,
+                                          keywords=keywords,
+                                          correct=False,
+                                          feedback_choice_id='incorrect',
+                                          media_files=media_files)
+
+                bank.create_answer(a_form)
+    elif str(new_item.genus_type) in [str(INLINE_CHOICE_INTERACTION_GENUS),
+                                      str(NUMERIC_RESPONSE_INTERACTION_GENUS)]:
+        # create a generic one
+        a_form = bank.get_answer_form_for_create(new_item.ident, answer_record_types)
+        dedupe_qti_media(media_repository, a_form, QTI_ANSWER)
+        a_form.load_from_qti_item(clean_qti_xml,
+                                  keywords=keywords,
+                                  correct=False,
+                                  feedback_choice_id='incorrect',
+                                  media_files=media_files)
+
+        bank.create_answer(a_form)
+
+    # so that re-uploading this package finds the item, until it is edited
+    bank.alias_item(new_item.ident,
+                    get_qti_fingerprint_id(fingerprint, bank.get_item(new_item.ident)))
+    return new_item
+
+
+def dedupe_qti_media(repository, form, qti_record_type):
+    """make form's QTI record add media files through a QTIMediaForm"""
+    form._get_record(qti_record_type).my_osid_object_form = QTIMediaForm(repository, form)
+
+
+def evaluate_inline_choice(answer_keys, submission):
+    # assume order doesn't matter within the region -- though
+    # per QTI spec, I think it's only 1 choice per inline region.
+    # A right answer without any inline regions matches every submission
+    return (frozenset() in answer_keys.right_inline_choices or
+            get_submitted_inline_choices(submission) in answer_keys.right_inline_choices)
+
+
+def expire_import_jobs():
+    """remove the import jobs last updated more than QTI_IMPORT_JOB_TTL
+    ago, with the uploads of any job that a stopped worker left unfinished"""
+    expired = time.time() - QTI_IMPORT_JOB_TTL
+    try:
+        names = os.listdir(QTI_IMPORT_JOBS_PATH)
+    except OSError:
+        return
+    for name in names:
+        path = os.path.join(QTI_IMPORT_JOBS_PATH, name)
+        try:
+            if os.path.getmtime(path) >= expired:
+                continue
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                os.remove(path)
+        except OSError:
+            # removed by another thread or worker in the meantime
+            pass
 
 
 def extract_id_using_index(object_, potential_id, key):
@@ -432,6 +784,35 @@ def find_answer_in_answers(ans_id, ans_list):
     return None
 
 
+def forget_archive_bank_id(archive_id):
+    """call if an archive bank is not found"""
+    with ARCHIVE_BANK_IDS_LOCK:
+        for name in [n for n, i in ARCHIVE_BANK_IDS.items() if str(i) == str(archive_id)]:
+            del ARCHIVE_BANK_IDS[name]
+
+
+def forget_bank_route(object_id, object_type='item'):
+    """call after an object is assigned to or unassigned from a bank"""
+    key = get_bank_route_key(object_id, object_type)
+    BANK_ROUTES.forget(lambda route_key: route_key == key)
+
+
+def forget_object(object_id=None):
+    """call after a write, so get_bank() and friends re-load the object"""
+    utilities.get_request_context().forget_object(object_id)
+
+
+def forget_results_summary(offered_id):
+    """call after an offered is deleted"""
+    shutil.rmtree(os.path.join(RESULTS_SUMMARIES_PATH, offered_id.identifier), ignore_errors=True)
+
+
+def forget_qti(item_id):
+    """call after an item changes, to drop its cached QTI XML"""
+    stored_id = get_stored_item_id(item_id)
+    QTI_CACHE.forget(lambda key: key[0] == stored_id)
+
+
 def get_answer_records(answer):
     """answer is a dictionary"""
     # check for wrong-answer genus type to get the right
@@ -445,36 +826,85 @@ def get_answer_records(answer):
     return a_types
 
 
+def get_answer_keys(item):
+    """(item's right and wrong answers, see get_item_answers(), and their
+    AnswerKeys, in the same order). The keys are compiled once per revision
+    of item, so grading does not walk the Answers. The answers and the
+    revision are looked up once per item per request"""
+    def get_answers_and_revision(item_id):
+        revision = utilities.get_revision(item)
+        return get_item_answers(item), revision
+
+    answers, revision = utilities.get_request_context().get_object('answer keys',
+                                                                   item.ident,
+                                                                   get_answers_and_revision)
+    return answers, ANSWER_KEY_CACHE.get((str(item.ident), revision),
+                                         lambda: compile_answer_keys(answers))
+
+
+def get_archive_bank_id(manager, original_bank):
+    """the Id of original_bank's archive bank, which is created if it does
+    not exist. On a miss, ARCHIVE_BANK_IDS is loaded with all archive
+    banks in one query, and each new archive bank is added to it"""
+
+    # NOTE: instead of using two query params, the expected_name
+    #       AND the expected_genus, we need to resort to using
+    #       only the genus and match on the name ourselves
+    #       There seems to be mismatching regex behavior between
+    #       the deployment Ubuntu and Mac, where Mac will find
+    #       the archive files using both params, but Ubuntu will not...
+    expected_name = archive_bank_names(original_bank.ident)
+    expected_genus = archive_bank_genus()
+
+    # holding the lock while creating, so concurrent imports
+    # do not create two archive banks for the same bank
+    with ARCHIVE_BANK_IDS_LOCK:
+        if expected_name not in ARCHIVE_BANK_IDS:
+            querier = manager.get_bank_query()
+            querier.match_genus_type(expected_genus, match=True)
+            for bank in manager.get_banks_by_query(querier):
+                ARCHIVE_BANK_IDS.setdefault(bank.display_name.text, bank.ident)
+        if expected_name not in ARCHIVE_BANK_IDS:
+            # create the bank
+            form = manager.get_bank_form_for_create([])
+            form.set_genus_type(expected_genus)
+            form.display_name = expected_name
+            form.description = 'For Archiving Items'
+            archive = manager.create_bank(form)
+            index_bank(archive)
+            ARCHIVE_BANK_IDS[expected_name] = archive.ident
+        return ARCHIVE_BANK_IDS[expected_name]
+
+
 def get_assessment_manager():
-    condition = PROXY_SESSION.get_proxy_condition()
-    dummy_request = SimpleRequest(username=web.ctx.env.get('HTTP_X_API_PROXY', 'student@tiss.edu'),
-                                  authenticated=True)
-    condition.set_http_request(dummy_request)
-
-    if 'HTTP_X_API_LOCALE' in web.ctx.env:
-        language_code = web.ctx.env['HTTP_X_API_LOCALE'].lower()
-        if language_code in ['en', 'hi', 'te']:
-            if language_code == 'en':
-                language_code = 'ENG'
-                script_code = 'LATN'
-            elif language_code == 'hi':
-                language_code = 'HIN'
-                script_code = 'DEVA'
-            else:
-                language_code = 'TEL'
-                script_code = 'TELU'
-        else:
-            language_code = DEFAULT_LANGUAGE_TYPE.identifier
-            script_code = DEFAULT_SCRIPT_TYPE.identifier
+    return utilities.get_service_manager('ASSESSMENT')
+
+
+def get_assessment_offered(bank, offered_id):
+    """like bank.get_assessment_offered, but only loaded once per request"""
+    return utilities.get_request_context().get_object('assessment.AssessmentOffered',
+                                                      offered_id,
+                                                      bank.get_assessment_offered)
 
-        locale = InitializableLocale(language_type_identifier=language_code,
-                                     script_type_identifier=script_code)
 
-        condition.set_locale(locale)
+def get_assessment_taken(bank, taken_id):
+    """like bank.get_assessment_taken, but only loaded once per request"""
+    return utilities.get_request_context().get_object('assessment.AssessmentTaken',
+                                                      taken_id,
+                                                      bank.get_assessment_taken)
 
-    proxy = PROXY_SESSION.get_proxy(condition)
-    return RUNTIME.get_service_manager('ASSESSMENT',
-                                       proxy=proxy)
+
+def get_bank(manager, bank_id):
+    """like manager.get_bank, but only loaded once per request. The bank's
+    views are reset each time, see reset_bank_views()"""
+    return utilities.get_request_context().get_object('assessment.Bank',
+                                                      bank_id,
+                                                      manager.get_bank,
+                                                      reset=reset_bank_views)
+
+
+def get_bank_route_key(object_id, object_type='item'):
+    return object_type, get_stored_item_id(utilities.clean_id(object_id))
 
 
 def get_choice_files(files):
@@ -487,29 +917,114 @@ def get_choice_files(files):
     return dict((k, files[k]) for k in files.keys() if k.startswith('choice'))
 
 
+def get_csv_line(values):
+    """values as a line of CSV, in UTF-8"""
+    line = StringIO()
+    csv.writer(line).writerow([unicode(value).encode('utf8') if value is not None else ''
+                               for value in values])
+    return line.getvalue()
+
+
+def get_datetime(time_map):
+    """the datetime of a time in an object map, i.e. {"year": 2017, ...}"""
+    return datetime.datetime(time_map['year'], time_map['month'], time_map['day'],
+                             time_map['hour'], time_map['minute'], time_map['second'],
+                             time_map.get('microsecond', 0))
+
+
 def get_drop_behavior_as_string(object_map):
     if 'dropBehaviorType' in object_map:
         return object_map['dropBehaviorType']
     return None
 
 
+def get_import_job(job_id):
+    """the stored state of a bulk QTI import job. Jobs are files, so that
+    every server worker process can report on them"""
+    if not re.match(r'^[0-9a-f]{32}$', job_id):
+        raise NotFound()
+    try:
+        with open(os.path.join(QTI_IMPORT_JOBS_PATH, '{0}.json'.format(job_id))) as job_file:
+            return json.load(job_file)
+    except IOError:
+        raise NotFound()
+
+
+def get_magic_item_id(question_id):
+    """the id of the item behind a section's questionId, which for magic
+    questions (see MAGIC_ITEM_AUTHORITIES) also has params in its identifier"""
+    if question_id.authority in MAGIC_ITEM_AUTHORITIES:
+        return Id(identifier=unquote(question_id.identifier).split('?')[0],
+                  namespace=question_id.namespace,
+                  authority=question_id.authority)
+    return question_id
+
+
+def get_media_by_hash(repository, sha256):
+    """(asset Id, asset content Id) of the QTI media with this SHA-256
+    in repository, or None if it is not stored there (any more)"""
+    try:
+        with open(os.path.join(QTI_MEDIA_INDEX_PATH, repository.ident.identifier, sha256)) as index_file:
+            entry = json.load(index_file)
+        asset = repository.get_asset(utilities.clean_id(entry['assetId']))
+    except (IOError, ValueError, NotFound):
+        return None
+    return asset.ident, utilities.clean_id(entry['assetContentId'])
+
+
 def get_media_path(bank):
+    """the assets URL of the bank's repository. Cached per (bank, host),
+    so listing N items does one repository lookup instead of N"""
     host_path = web.ctx.get('homedomain', '')
-    rm = rutils.get_repository_manager()
-    repo = rm.get_repository(bank.ident)
-    return '{0}/api/v1/repository/repositories/{1}/assets'.format(host_path,
-                                                                  str(repo.ident))
+
+    def get_repository_path():
+        rm = rutils.get_repository_manager()
+        repo = rm.get_repository(bank.ident)
+        return '{0}/api/v1/repository/repositories/{1}/assets'.format(host_path,
+                                                                      str(repo.ident))
+
+    return MEDIA_PATH_CACHE.get((str(bank.ident), host_path), get_repository_path)
 
 
 def get_object_bank(manager, object_id, object_type='item', bank_id=None):
-    """Get the object's bank even without the bankId"""
+    """Get the object's bank even without the bankId.
+    The bank is routed by BANK_ROUTES, which is filled in from the
+    object's assignedBankIds on the first federated lookup"""
     # primarily used for Item and AssessmentsOffered
     if bank_id is None:
-        lookup_session = getattr(manager, 'get_{0}_lookup_session'.format(object_type))()
-        lookup_session.use_federated_bank_view()
-        object_ = getattr(lookup_session, 'get_{0}'.format(object_type))(utilities.clean_id(object_id))
-        bank_id = object_.object_map['assignedBankIds'][0]
-    return manager.get_bank(utilities.clean_id(bank_id))
+        def get_assigned_bank_id():
+            lookup_session = getattr(manager, 'get_{0}_lookup_session'.format(object_type))(proxy=manager._proxy)
+            lookup_session.use_federated_bank_view()
+            object_ = getattr(lookup_session, 'get_{0}'.format(object_type))(utilities.clean_id(object_id))
+            return object_._my_map['assignedBankIds'][0]
+
+        bank_id = BANK_ROUTES.get(get_bank_route_key(object_id, object_type),
+                                  get_assigned_bank_id)
+    return get_bank(manager, utilities.clean_id(bank_id))
+
+
+def get_routed_object(manager, object_id, object_type='item'):
+    """(object, bank) for an item, assessment_offered or assessment_taken,
+    from its routed bank. Re-routes it once if it is not in that bank"""
+    def get_object(bank):
+        # offereds and takens are only loaded once per request
+        if object_type == 'assessment_offered':
+            return get_assessment_offered(bank, utilities.clean_id(object_id))
+        if object_type == 'assessment_taken':
+            return get_assessment_taken(bank, utilities.clean_id(object_id))
+        return getattr(bank, 'get_{0}'.format(object_type))(utilities.clean_id(object_id))
+
+    bank = get_object_bank(manager, object_id, object_type)
+    bank.use_isolated_bank_view()
+    try:
+        object_ = get_object(bank)
+    except NotFound:
+        # moved to another bank since it was routed
+        forget_bank_route(object_id, object_type)
+        bank = get_object_bank(manager, object_id, object_type)
+        bank.use_isolated_bank_view()
+        object_ = get_object(bank)
+    return object_, bank
 
 
 def get_ovs_file_set(files, index):
@@ -521,6 +1036,139 @@ def get_ovs_file_set(files, index):
     return (small_file, big_file)
 
 
+class QTIMediaForm(object):
+    """stands in for a question or answer form in its QTI record, so that
+    load_from_qti_item() stores each media file by its SHA-256. Bytes
+    already in the bank's repository, i.e. from a re-uploaded item or
+    another item in the unit, are referenced instead of stored again.
+    The hashes are indexed in files under QTI_MEDIA_INDEX_PATH"""
+    def __init__(self, repository, form):
+        self._form = form
+        self._repository = repository
+
+    def __getattr__(self, name):
+        return getattr(self._form, name)
+
+    def add_file(self, asset_data, label=None, asset_type=None, asset_content_type=None, **kwargs):
+        sha256 = asset_data.get_sha256()
+        stored_media = get_media_by_hash(self._repository, sha256)
+        if stored_media is None:
+            self._form.add_file(asset_data,
+                                label=label,
+                                asset_type=asset_type,
+                                asset_content_type=asset_content_type,
+                                **kwargs)
+            file_ids = self._form._my_map['fileIds'][label]
+            save_media_hash(self._repository, sha256, file_ids['assetId'], file_ids['assetContentId'])
+        else:
+            asset_id, asset_content_id = stored_media
+            self._form.add_asset(asset_id,
+                                 asset_content_id=asset_content_id,
+                                 label=label,
+                                 asset_content_type=asset_content_type)
+
+
+class QTIMediaFile(object):
+    """a media file in an open QTI package zip, that is only
+    decompressed when read, so storing it streams from the zip
+    instead of holding every media file of the package in memory"""
+    def __init__(self, qti_zip, name):
+        self.name = name
+        self._qti_zip = qti_zip
+        self._sha256 = None
+        self._stream = None
+
+    def close(self):
+        if self._stream is not None:
+            self._stream.close()
+            self._stream = None
+
+    def get_sha256(self):
+        if self._sha256 is None:
+            digest = hashlib.sha256()
+            self.seek(0)
+            for chunk in iter(lambda: self.read(65536), ''):
+                digest.update(chunk)
+            self.seek(0)
+            self._sha256 = digest.hexdigest()
+        return self._sha256
+
+    def read(self, size=-1):
+        if self._stream is None:
+            self._stream = self._qti_zip.open(self.name)
+        data = self._stream.read(size)
+        if size < 0 or not data:
+            self.close()
+        return data
+
+    def seek(self, offset, whence=0):
+        # zip entries only read forwards, so rewind by opening again
+        if offset != 0 or whence != 0:
+            raise IOError('QTI media files can only seek to the start')
+        self.close()
+
+
+def get_qti_fingerprint(package, media_files):
+    """the content hash of a QTI package: a SHA-256 of its canonical
+    (C14N) item XML, manifest metadata and media files' SHA-256s"""
+    from lxml import etree
+    parser = etree.XMLParser(recover=True)
+    fingerprint = hashlib.sha256(etree.tostring(etree.fromstring(package['qtiXml'], parser),
+                                                method='c14n'))
+    fingerprint.update(json.dumps([package['description'],
+                                   package['keywords'],
+                                   package['learningObjective']]))
+    for file_name in sorted(media_files):
+        fingerprint.update(file_name)
+        fingerprint.update(media_files[file_name].get_sha256())
+    return fingerprint.hexdigest()
+
+
+def get_qti_fingerprint_id(fingerprint, item):
+    """an alias Id for an item imported from the QTI package with
+    fingerprint. It includes the item's revision, so it stops resolving
+    to the item once the item, its question or its answers are edited"""
+    return Id(identifier=hashlib.sha256(fingerprint + utilities.get_revision(item)).hexdigest(),
+              namespace='assessment.Item',
+              authority='QTI-FINGERPRINT')
+
+
+def get_qti_media_files(qti_zip, media_names):
+    """file name -> QTIMediaFile, for QTI form load_from_qti_item(), which
+    wraps each in a DataInputStream. Nothing is read until the file is stored"""
+    media_files = {}
+    for zip_file_name in media_names:
+        # this method must match what is in the QTI QuestionFormRecord
+        file_name = zip_file_name.replace('media/', '').replace('.', '_')
+        media_files[file_name] = QTIMediaFile(qti_zip, zip_file_name)
+    return media_files
+
+
+def get_qti_xml(obj, bank):
+    """QTI XML for an item or question, with media URLs in bank.
+    Cached per (id, revision, media path, locale), so unchanged
+    objects are only rendered once. Items that are shuffled each time
+    they are loaded are not cached, see is_shuffled().
+    Raises AttributeError for non-QTI objects, like obj.get_qti_xml()"""
+    media_path = get_media_path(bank)
+    if is_shuffled(obj):
+        return obj.get_qti_xml(media_file_root_path=media_path)
+    # get the revision first: rendering can re-order the stored choices.
+    # The full Id, because a taken's questions carry their order in it
+    key = (get_stored_item_id(obj.ident),
+           str(obj.ident),
+           utilities.get_revision(obj),
+           media_path,
+           utilities.get_request_context().language_code)
+    return QTI_CACHE.get(key, lambda: obj.get_qti_xml(media_file_root_path=media_path))
+
+
+def get_stored_item_id(item_id):
+    """the database id of an item. Randomized-choice items and their
+    questions have "magic" Ids, that also carry the choice order"""
+    return re.split(r'[%?]', item_id.identifier)[0]
+
+
 def get_answer_records_from_item_genus(item_genus_type):
     # records depends on the genusTypeId of the ITEM
     # can't rely on answer genus type because that's used for
@@ -708,6 +1356,20 @@ def get_question_records_from_item_genus(item_genus_type):
     return question_record_types
 
 
+def get_question_summary(question_map):
+    """a question's response in its taken's share of the results summary,
+    from the question map stored in its section"""
+    response = question_map['responses'][0]
+    if 'missingResponse' in response:
+        response = {}
+    return {
+        'itemId': question_map['itemId'],
+        'responded': bool(response),
+        'isCorrect': bool(response.get('isCorrect')),
+        'choiceIds': response.get('choiceIds') or []
+    }
+
+
 def get_question_status(bank, section, question_id):
     """
     Return the question status of answered or not, and if so, right or wrong
@@ -723,10 +1385,6 @@ def get_question_status(bank, section, question_id):
         student_response = None
 
     if student_response:
-        # Now need to actually check the answers against the
-        # item answers.
-        answers = bank.get_answers(section.ident, question_id)
-        # compare these answers to the submitted response
         response = student_response._my_map
         response.update({
             'type': str(response['recordTypeIds'][0]).replace('answer-record-type', 'answer-record-type')
@@ -734,7 +1392,10 @@ def get_question_status(bank, section, question_id):
         try:
             correct = student_response.is_correct()
         except (AttributeError, IllegalState):
-            correct = validate_response(student_response._my_map, answers)
+            # Now need to actually check the answers against the
+            # item answers.
+            item = section._get_item(question_id)
+            correct = validate_response(student_response._my_map, item)
         data = {
             'responded': True,
             'correct': correct
@@ -746,18 +1407,38 @@ def get_question_status(bank, section, question_id):
     return data
 
 
-def get_response_map(bank, section, question_id):
-    # append the student's last response and status if available
+def get_item_answers(item):
+    """the right and wrong answers of item, like section.get_answers()"""
+    answers = list(item.get_answers())
+    try:
+        answers += list(item.get_wrong_answers())
+    except AttributeError:
+        pass
+    return answers
+
+
+def get_item_solution(item):
+    """the item's solution, as the review options taken record's
+    get_solution_for_question() finds it, without looking up the taken's
+    offered for each question. Raises KeyError if there is none"""
+    item_map = item.object_map
+    if 'solution' in item_map:
+        return item_map['solution']  # fbw items
+    return item_map['texts']['solution']  # edX items
+
+
+def get_response_map(section, question_id, show_solution=False):
+    # append the student's last response and status if available.
+    # Answers, confused LOs and feedback all come from the one item, which
+    # get_taken_section_map() has already looked up with the rest of the section
     if section.is_question_answered(question_id):
-        # response = bank.get_response(section.ident, question_id)
         response = section.get_response(question_id)
-        response_map = response.object_map
+        response_map = get_response_object_map(response)
+        item = section._get_item(question_id)
         if response_map['isCorrect'] is None:
             # to make this work with validate_response()
             response_map['type'] = response_map['recordTypeIds']
-            correct = validate_response(response_map,
-                                        bank.get_answers(section.ident,
-                                                         question_id))
+            correct = validate_response(response_map, item)
             response_map.update({
                 'isCorrect': correct
             })
@@ -767,10 +1448,10 @@ def get_response_map(bank, section, question_id):
         except IllegalState:
             pass
         try:
-            response_map['feedback'] = update_json_response_with_feedback(bank,
-                                                                          section,
-                                                                          question_id,
-                                                                          response_map['isCorrect'])
+            response_map['feedback'] = update_json_response_with_feedback(response,
+                                                                          item,
+                                                                          response_map['isCorrect'],
+                                                                          show_solution=show_solution)
         except IllegalState:
             pass
     else:
@@ -778,6 +1459,107 @@ def get_response_map(bank, section, question_id):
     return response_map
 
 
+def get_response_object_map(response):
+    # have to use ._my_answer here because feedback record calls
+    # osid_objects.OsidObject.object_map, which expects an OsidObject
+    # not a Rule
+    response_map = response._my_answer.object_map
+    # the section's object_map may have converted it already
+    if (response_map.get('submissionTime') is not None and
+            not isinstance(response_map['submissionTime'], dict)):
+        response_map['submissionTime'] = {
+            'year': response_map['submissionTime'].year,
+            'month': response_map['submissionTime'].month,
+            'day': response_map['submissionTime'].day,
+            'hour': response_map['submissionTime'].hour,
+            'minute': response_map['submissionTime'].minute,
+            'second': response_map['submissionTime'].second,
+            'microsecond': response_map['submissionTime'].microsecond
+        }
+    return response_map
+
+
+def get_results_csv_rows(taken_map):
+    """the RESULTS_EXPORT_COLUMNS of each question in a taken's results,
+    or one row with the error, for a taken that could not be loaded"""
+    def format_time(time_map):
+        if time_map is None:
+            return None
+        return get_datetime(time_map).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+    if 'error' in taken_map:
+        yield [taken_map['id']] + [None] * (len(RESULTS_EXPORT_COLUMNS) - 2) + [taken_map['error']]
+        return
+    for section_map in taken_map['sections']:
+        for question_map in section_map['questions']:
+            response_map = question_map.get('response') or {}
+            yield [taken_map['id'],
+                   taken_map['takingAgentId'],
+                   format_time(taken_map['actualStartTime']),
+                   format_time(taken_map['completionTime']),
+                   question_map.get('itemId'),
+                   question_map['responded'],
+                   question_map['isCorrect'],
+                   format_time(response_map.get('submissionTime')),
+                   ' '.join(response_map.get('choiceIds') or []),
+                   None]
+
+
+def get_results_since(since):
+    """the ?since= of a results export, an ISO 8601 UTC time like
+    2017-01-31T12:00:00Z, as a datetime"""
+    for time_format in ['%Y-%m-%dT%H:%M:%S.%fZ', '%Y-%m-%dT%H:%M:%SZ', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d']:
+        try:
+            return datetime.datetime.strptime(since, time_format)
+        except ValueError:
+            pass
+    raise InvalidArgument('since should be an ISO 8601 UTC time, like 2017-01-31T12:00:00Z')
+
+
+def get_results_summary(bank, offered_id):
+    """the takens and completed takens of an offered, and how many takens
+    answered each question, answered it right and picked each choice.
+    Counts all of the offered's takens the first time it is asked for,
+    after that update_results_summary() keeps it up to date"""
+    summary = load_results_summary(os.path.join(RESULTS_SUMMARIES_PATH, offered_id.identifier))
+    if summary is None:
+        with lock_results_summary(offered_id) as summary_path:
+            summary = load_results_summary(summary_path)
+            if summary is None:
+                summary = rebuild_results_summary(bank, offered_id, summary_path)
+    del summary['takenIds']
+    for question in summary['questions']:
+        question['correctRate'] = None
+        if question['responded'] > 0:
+            question['correctRate'] = float(question['correct']) / question['responded']
+    summary['assessmentOfferedId'] = str(offered_id)
+    return summary
+
+
+def get_search_criteria(params):
+    """(indexed field, value) pairs for the search parameters in params"""
+    criteria = []
+    for parameter, field in SEARCH_PARAMETERS.items():
+        if parameter in params:
+            value = params[parameter]
+            if _unescaped(value):
+                value = quote(value, safe='/ ')
+            criteria.append((field, value))
+    return criteria
+
+
+def get_search_fields(object_):
+    """the indexed fields of an item or a bank"""
+    object_map = object_._my_map
+    display_names = [object_map['displayName']['text']]
+    display_names += [name['text'] for name in object_map.get('displayNames', [])]
+    return {
+        'displayName': display_names,
+        'genusTypeId': [object_map['genusTypeId']],
+        'learningObjectiveIds': object_map.get('learningObjectiveIds', [])
+    }
+
+
 def get_spatial_unit_as_spatial_unit(object_map):
     if 'spatialUnit' in object_map:
         unit = object_map['spatialUnit']
@@ -796,6 +1578,111 @@ def get_spatial_unit_as_spatial_unit(object_map):
     return None
 
 
+def get_submitted_inline_choices(submission):
+    """an inlineRegions submission in the form of AnswerKey.inline_choices,
+    or None if a region repeats a choice, which never matches an answer"""
+    regions = []
+    for inline_region, data in submission.iteritems():
+        choice_ids = data.get('choiceIds', [])
+        if len(set(choice_ids)) != len(choice_ids):
+            return None
+        regions.append((inline_region, frozenset(choice_ids)))
+    return frozenset(regions)
+
+
+class SectionItemLookupSession(object):
+    """stands in for a section's item lookup session, so that its questions,
+    answers, confused LOs and solutions all come from the section's items
+    as looked up in one query, instead of several lookups per question.
+    Other items go through to the section's own (magic) item lookup session.
+    There is no public API for this, so it relies on dlkit internals: the
+    section's _item_lookup_session, _get_item_lookup_session() and _get_item(),
+    the unbound ItemLookupSession.get_items_by_ids(), which skips the magic
+    session's one-by-one lookups, and the magic Ids' params. See
+    test_section_item_lookup_matches_dlkit_internals, which fails if a dlkit
+    upgrade changes any of them"""
+    def __init__(self, section):
+        from dlkit.json_.assessment.sessions import ItemLookupSession
+        self._session = section._get_item_lookup_session()
+        question_ids = [Id(question_map['questionId']) for question_map in section._my_map['questions']]
+        item_ids = [get_magic_item_id(question_id) for question_id in question_ids]
+        found = {}
+        for item in ItemLookupSession.get_items_by_ids(self._session, item_ids):
+            # one Item per question, even if an item is in the section twice
+            found.setdefault(item.ident.identifier, []).append(item)
+
+        self._items = {}  # questionId -> Item
+        for question_id, item_id in zip(question_ids, item_ids):
+            if found.get(item_id.identifier):
+                item = found[item_id.identifier].pop(0)
+                if question_id.authority in MAGIC_ITEM_AUTHORITIES:
+                    # the magic params, i.e. the order of randomized choices
+                    item.set_params(json.loads(unquote(question_id.identifier).split('?')[-1]))
+                self._items[str(question_id)] = item
+
+    def __getattr__(self, name):
+        return getattr(self._session, name)
+
+    def get_item(self, item_id):
+        if str(item_id) in self._items:
+            return self._items[str(item_id)]
+        return self._session.get_item(item_id)
+
+
+def get_taken_results(taken, bank, since=None, with_additional_attempts=False):
+    """the taken's map with its sections, as in the offered's results.
+    With since, None if the taken was not started, answered or finished
+    since then"""
+    if since is not None:
+        # whole seconds, because the section maps' response times are
+        since = since.replace(microsecond=0)
+        completion_time = taken._my_map['completionTime']
+        if completion_time is not None and completion_time < since:
+            return None  # finished takens do not change
+    taken_map = taken.object_map
+    taken_map['sections'] = get_taken_section_map(taken,
+                                                  update=False,
+                                                  bank=bank,
+                                                  with_additional_attempts=with_additional_attempts)
+    if since is not None:
+        times = [taken._my_map['actualStartTime'], taken._my_map['completionTime']]
+        times += [get_datetime(question_map['response']['submissionTime'])
+                  for section_map in taken_map['sections']
+                  for question_map in section_map['questions']
+                  if question_map['responded'] and question_map['response'].get('submissionTime')]
+        if not any(time is not None and time >= since for time in times):
+            return None
+    return taken_map
+
+
+def get_taken_summary(taken, question_id=None, previous_taken_summary=None):
+    """a taken's share of its offered's results summary: whether it is
+    completed, and its response to each question, from its sections'
+    stored questions. With question_id and the taken's previous share,
+    only that question's response is re-read"""
+    try:
+        question_maps = [question_map
+                         for section in taken._get_assessment_sections()
+                         for question_map in section._my_map['questions']]
+    except KeyError:
+        # no sections -- never got the question
+        question_maps = []
+    if (question_id is None or previous_taken_summary is None or
+            len(previous_taken_summary['questions']) != len(question_maps)):
+        # i.e. scaffold / waypoint sections added questions
+        responses = [get_question_summary(question_map) for question_map in question_maps]
+    else:
+        question_id = str(utilities.clean_id(question_id))
+        responses = list(previous_taken_summary['questions'])
+        for index, question_map in enumerate(question_maps):
+            if question_id in (question_map['questionId'], question_map['itemId']):
+                responses[index] = get_question_summary(question_map)
+    return {
+        'completed': taken._my_map['completionTime'] is not None,
+        'questions': responses
+    }
+
+
 def get_taken_section_map(taken, update=False, with_files=False, bank=None, with_additional_attempts=False):
     # let's get the questions first ... we need to inject that information into
     # the response, so that UI side we can match on the original, canonical itemId
@@ -810,20 +1697,7 @@ def get_taken_section_map(taken, update=False, with_files=False, bank=None, with
             for index, response in enumerate(bank.get_responses(_section.ident)):
                 s_map['questions'][index]['additionalAttempts'] = []
                 for additional_attempt in response.get_additional_attempts():
-                    # have to use ._my_answer here because feedback record calls
-                    # osid_objects.OsidObject.object_map, which expects an OsidObject
-                    # not a Rule
-                    attempt_map = additional_attempt._my_answer.object_map
-                    if 'submissionTime' in attempt_map and attempt_map['submissionTime'] is not None:
-                        attempt_map['submissionTime'] = {
-                            'year': attempt_map['submissionTime'].year,
-                            'month': attempt_map['submissionTime'].month,
-                            'day': attempt_map['submissionTime'].day,
-                            'hour': attempt_map['submissionTime'].hour,
-                            'minute': attempt_map['submissionTime'].minute,
-                            'second': attempt_map['submissionTime'].second,
-                            'microsecond': attempt_map['submissionTime'].microsecond
-                        }
+                    attempt_map = get_response_object_map(additional_attempt)
                     s_map['questions'][index]['additionalAttempts'].append(attempt_map)
 
         if update:
@@ -831,14 +1705,16 @@ def get_taken_section_map(taken, update=False, with_files=False, bank=None, with
             # This assumes that section object maps now get questions via the mixins.py
             question_maps = []
 
+            # look up all of the section's items at once
+            _section._item_lookup_session = SectionItemLookupSession(_section)
             questions = _section.get_questions(update=update)
             for index, question in enumerate(questions):
                 question_map = question.object_map
                 if with_files:
                     question_map['files'] = question.get_files()
-                response_map = get_response_map(bank,
-                                                _section,
-                                                question.ident)
+                response_map = get_response_map(_section,
+                                                question.ident,
+                                                show_solution=show_solution)
                 responded = False
                 if response_map is not None:
                     responded = True
@@ -855,6 +1731,7 @@ def get_taken_section_map(taken, update=False, with_files=False, bank=None, with
         return s_map
 
     section_maps = []
+    show_solution = update and can_review_solutions(taken, bank)
 
     try:
         sections = taken._get_assessment_sections()
@@ -923,12 +1800,39 @@ def get_reuse_as_integer(object_map):
     return None
 
 
+def get_unrandomized_order(item):
+    """the stored order of the question's choices, droppables, targets and
+    zones, as lists of ids (or dicts of region -> ids, for inline choices).
+    item.get_question() shuffles these in place, so call this before
+    getting its question, object_map or QTI"""
+    order = {}
+    question_map = item._my_map.get('question') or {}
+    for key in ['choices', 'droppables', 'targets', 'zones']:
+        objects = question_map.get(key)
+        if isinstance(objects, dict):
+            order[key] = dict((region, [o['id'] for o in region_objects])
+                              for region, region_objects in objects.iteritems())
+        elif isinstance(objects, list):
+            order[key] = [o['id'] for o in objects]
+    return order
+
+
 def get_visible_as_boolean(object_map):
     if 'visible' in object_map:
         return bool(object_map['visible'])
     return None
 
 
+def index_bank(bank):
+    """call after a bank is created or updated"""
+    BANK_SEARCH_INDEX.add(str(bank.ident), get_search_fields(bank))
+
+
+def index_item(item):
+    """call after an item is created or updated"""
+    ITEM_SEARCH_INDEX.add(str(item.ident), get_search_fields(item))
+
+
 def is_drag_and_drop(object_data):
     if 'type' in object_data:
         # in this case (for responses) it is a passed dictionary
@@ -1014,6 +1918,17 @@ def is_ordered_choice(response):
                                                      'qti-order-interaction-object-manipulation'])
 
 
+def is_shuffled(obj):
+    """whether obj is an item whose question shuffles its choices each
+    time the item is loaded. A taken's questions keep one order, which
+    their "magic" Ids carry"""
+    if 'question' not in obj._my_map:
+        return False  # a question
+    question_map = obj._my_map['question'] or {}
+    randomized = str(RANDOMIZED_MULTI_CHOICE_QUESTION_RECORD) in question_map.get('recordTypeIds', [])
+    return bool(question_map.get('shuffle', randomized))
+
+
 def is_short_answer(response):
     if isinstance(response['type'], list):
         return any(mc in r
@@ -1047,37 +1962,194 @@ def object_to_be_ordered(object_map):
     return 'order' in object_map and object_map['order'] is not None
 
 
-def match_submission_to_answer(answers, response):
+def load_results_summary(summary_path):
+    """an offered's results summary, or None if it has to be counted again.
+    summary.json keeps the ids of the takens it counts, so that a taken
+    whose share in takens/ is lost is not counted twice"""
+    summary = load_results_summary_file(os.path.join(summary_path, 'summary.json'))
+    if summary is None or 'takenIds' not in summary:
+        return None
+    return summary
+
+
+def load_results_summary_file(file_path):
+    """a results summary, or a taken's share of it, or None if there is none"""
+    try:
+        with open(file_path) as summary_file:
+            return json.load(summary_file)
+    except (IOError, ValueError):
+        return None
+
+
+@contextmanager
+def lock_results_summary(offered_id):
+    """lock an offered's results summary for writing, across threads and
+    server worker processes. Yields the summary's directory"""
+    summary_path = os.path.join(RESULTS_SUMMARIES_PATH, offered_id.identifier)
+    utilities.makedirs(os.path.join(summary_path, 'takens'))
+    with open(os.path.join(summary_path, 'lock'), 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield summary_path
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def match_submission_to_answer(response, item):
     submission = get_response_submissions(response)
-    answer_match = None
-    default_answer = None
-    match = False
 
     if is_inline_choice(response):
-        # try to find an exact match response according to the regions + choiceIds
-        # if no exact match found, just look for a "wrong answer" answer with no inlineRegions
-        for answer in answers:
-            answer_regions = answer.get_inline_choice_ids()
-            if answer_regions == {} and str(answer.genus_type) == str(WRONG_ANSWER):
-                default_answer = answer
-            num_total = 0
-            num_right = 0
-            for inline_region, data in answer_regions.iteritems():
-                num_total += data['choiceIds'].available()
-            if len(answer_regions.keys()) == len(submission.keys()):
-                for inline_region, data in answer_regions.iteritems():
-                    if data['choiceIds'].available() == len(submission[inline_region]['choiceIds']):
-                        for choice_id in data['choiceIds']:
-                            if str(choice_id) in submission[inline_region]['choiceIds']:
-                                num_right += 1
-            if num_total == num_right:
-                match = True
-                answer_match = answer
-                break
-    if not match:
-        return default_answer
-    else:
-        return answer_match
+        # find the first answer that matches exactly according to the regions + choiceIds,
+        # or that has no inlineRegions, like the default "wrong answer"
+        answers, answer_keys = get_answer_keys(item)
+        submitted = get_submitted_inline_choices(submission)
+        for answer, key in zip(answers, answer_keys.answers):
+            if key.inline_choices is not None and key.inline_choices in (frozenset(), submitted):
+                return answer
+    return None
+
+
+def parse_qti_upload(upload):
+    """parse_qti_package() for the import job process pool, which
+    returns (package, error message) instead of raising"""
+    file_name, path = upload
+    try:
+        return parse_qti_package(path), None
+    except Exception as ex:
+        return None, 'Could not parse {0}: {1}'.format(file_name, str(ex) or type(ex).__name__)
+
+
+def parse_qti_item_xml(qti_xml):
+    """the identifier and title of a QTI assessmentItem, and whether it
+    is a numeric response (text entry with template variables)"""
+    from lxml import etree
+    item = None
+    has_template = False
+    has_text_entry = False
+    for event, element in etree.iterparse(StringIO(qti_xml), events=('start',), recover=True):
+        tag = etree.QName(element).localname
+        if item is None:
+            item = element
+        elif tag == 'templateDeclaration':
+            has_template = True
+        elif tag == 'textEntryInteraction':
+            if any(etree.QName(parent).localname == 'itemBody' for parent in element.iterancestors()):
+                has_text_entry = True
+    if item is None:
+        raise InvalidArgument('No assessmentItem in the QTI item XML')
+    return {
+        'identifier': item.attrib['identifier'],
+        'title': unicode(item.attrib['title']),
+        'numericResponse': has_template and has_text_entry
+    }
+
+
+def parse_qti_manifest(manifest):
+    """the keywords, description and learning objective (target audience)
+    of the first resource in a QTI imsmanifest.xml file object.
+    Parsed as a stream, and stops at the second resource"""
+    from lxml import etree
+
+    def get_first(element, tag):
+        for child in element.iter():
+            if child is not element and etree.QName(child).localname == tag:
+                return child
+        return None
+
+    def get_string(element):
+        # like BeautifulSoup's .string, for elements without children
+        if element is None or len(element) > 0:
+            return None
+        return element.text
+
+    keywords = []
+    description = ''
+    learning_objective = None
+    has_description = False
+    resources = 0
+
+    for event, element in etree.iterparse(manifest, events=('start', 'end'), recover=True):
+        tag = etree.QName(element).localname
+        if event == 'start':
+            if tag == 'resource':
+                resources += 1
+                if resources > 1:
+                    break
+            continue
+        if resources != 1:
+            continue
+        if (tag == 'description' and not has_description and
+                etree.QName(element.getparent()).localname == 'general'):
+            has_description = True
+            strings = [element.text]
+            for child in element:
+                strings += [get_string(child), child.tail]
+            for string in strings:
+                if string is None:
+                    continue
+                if '[type]' in string:
+                    split_keywords = string.split('}')
+                    type_tag = split_keywords[0]
+                    keywords.append(type_tag.replace('[type]', '').replace('<', '').replace('>', '').replace('{', '').replace('}', ''))
+                    if len(split_keywords) > 1:
+                        description += '\n'.join(split_keywords[1::]).strip()
+                else:
+                    description += string
+        elif (tag == 'classification' and
+                any(etree.QName(parent).localname == 'lom' for parent in element.iterancestors())):
+            purpose = get_first(element, 'purpose')
+            if purpose is not None and get_string(get_first(purpose, 'value')) == 'target audience':
+                taxon_path = get_first(element, 'taxonPath')
+                taxon = get_first(taxon_path, 'taxon') if taxon_path is not None else None
+                entry = get_first(taxon, 'entry') if taxon is not None else None
+                if entry is not None:
+                    learning_objective = get_string(get_first(entry, 'string'))
+
+    return {
+        'description': description,
+        'keywords': keywords,
+        'learningObjective': unicode(learning_objective) if learning_objective is not None else None
+    }
+
+
+def parse_qti_package(qti_file):
+    """read_qti_package() for a QTI package (zip) file or path.
+    Does not touch the database, so it can run in another process"""
+    with zipfile.ZipFile(qti_file) as qti_zip:
+        return read_qti_package(qti_zip)
+
+
+def remove_from_results_summary(offered_id, taken_id):
+    """call after a taken is deleted, to take it out of its offered's
+    results summary"""
+    if not os.path.isdir(os.path.join(RESULTS_SUMMARIES_PATH, offered_id.identifier)):
+        return
+    with lock_results_summary(offered_id) as summary_path:
+        summary = load_results_summary(summary_path)
+        taken_file_path = os.path.join(summary_path, 'takens', '{0}.json'.format(taken_id.identifier))
+        taken_summary = load_results_summary_file(taken_file_path)
+        if summary is not None and str(taken_id) in summary['takenIds']:
+            if taken_summary is None:
+                # its share is lost -- get_results_summary() counts the takens again
+                os.remove(os.path.join(summary_path, 'summary.json'))
+            else:
+                add_to_results_summary(summary, taken_summary, count=-1)
+                summary['takenIds'].remove(str(taken_id))
+                save_results_summary_file(os.path.join(summary_path, 'summary.json'), summary)
+        if taken_summary is not None:
+            os.remove(taken_file_path)
+
+
+def reset_bank_views(bank):
+    """put a bank's views back to those of a newly loaded bank, so that the
+    use_*_view() calls of one caller do not leak into the next one's"""
+    bank.use_isolated_bank_view()
+    for object_name in list(bank._object_views):
+        try:
+            getattr(bank, 'use_comparative_{0}_view'.format(object_name))()
+        except AttributeError:
+            pass
+    bank._object_views.clear()
 
 
 def remove_language_type(object_map):
@@ -1090,12 +2162,176 @@ def remove_field(object_map, field):
     return False
 
 
+def rebuild_results_summary(bank, offered_id, summary_path):
+    """count all of an offered's takens into a new results summary. Call
+    with the summary locked, see lock_results_summary()"""
+    summary = {
+        'takens': 0,
+        'completed': 0,
+        'questions': [],
+        'takenIds': []
+    }
+    for taken in bank.get_assessments_taken_for_assessment_offered(offered_id):
+        taken_summary = get_taken_summary(taken)
+        save_results_summary_file(os.path.join(summary_path,
+                                               'takens',
+                                               '{0}.json'.format(taken.ident.identifier)),
+                                  taken_summary)
+        add_to_results_summary(summary, taken_summary)
+        summary['takenIds'].append(str(taken.ident))
+    save_results_summary_file(os.path.join(summary_path, 'summary.json'), summary)
+    return summary
+
+
+def read_qti_package(qti_zip):
+    """the manifest keywords, description and learning objective, the item
+    XML (with its identifier and title) and the media file names of an
+    open QTI package zip. Makes one pass over the zip's entries, and only
+    reads the manifest and the item XML -- the media stays in the zip"""
+    package = {
+        'description': '',
+        'keywords': [],
+        'learningObjective': None
+    }
+    media_names = []
+    qti_xml = None
+
+    for zip_file_name in qti_zip.namelist():
+        if zip_file_name == 'imsmanifest.xml':
+            with qti_zip.open(zip_file_name) as manifest:
+                package.update(parse_qti_manifest(manifest))
+        elif 'media/' in zip_file_name:
+            if zip_file_name != 'media/':
+                media_names.append(zip_file_name)
+        elif '.xml' in zip_file_name:
+            qti_xml = zip_file_name
+
+    if qti_xml is None:
+        raise InvalidArgument('No QTI item XML in the package')
+    with qti_zip.open(qti_xml, 'rU') as item_file:
+        qti_xml = item_file.read()
+
+    package.update(parse_qti_item_xml(qti_xml))
+    package['mediaNames'] = media_names
+    package['qtiXml'] = qti_xml
+    return package
+
+
 def reorder_list_by_unrandomized_list(unrandomized_list, randomized_list):
-    reordered_list = []
-    for object_ in unrandomized_list:
-        matching_object = [o for o in randomized_list if o['id'] == object_['id']][0]
-        reordered_list.append(matching_object)
-    return reordered_list
+    """unrandomized_list can be objects or just their ids"""
+    positions = {}
+    for index, object_ in enumerate(unrandomized_list):
+        positions[object_['id'] if isinstance(object_, dict) else object_] = index
+    return sorted([o for o in randomized_list if o['id'] in positions],
+                  key=lambda o: positions[o['id']])
+
+
+def run_qti_import(job, env):
+    """import each QTI package of the job into its bank. Parsing happens in
+    QTI_IMPORT_POOL, if it is started, while the items are created here"""
+    # the request is over, so give this thread its own context and managers
+    web.ctx.env = env
+    web.ctx.homedomain = env.get('HOMEDOMAIN', '')
+    web.ctx.request_context = utilities.RequestContext(env, pooled=False)
+    job_path = os.path.join(QTI_IMPORT_JOBS_PATH, job['id'])
+    try:
+        bank = get_bank(get_assessment_manager(), utilities.clean_id(job['bankId']))
+        uploads = []
+        for index, file_name in enumerate(job['fileNames']):
+            path = os.path.join(job_path, str(index))
+            try:
+                with zipfile.ZipFile(path) as outer_zip:
+                    zip_file_names = outer_zip.namelist()
+                    if 'imsmanifest.xml' in zip_file_names:
+                        uploads.append((file_name, path))
+                        continue
+                    # a zip of QTI packages
+                    inner_names = [n for n in zip_file_names if n.lower().endswith('.zip')]
+                    for inner_name in inner_names:
+                        inner_path = '{0}-{1}'.format(path, len(uploads))
+                        with open(inner_path, 'wb') as inner_file:
+                            shutil.copyfileobj(outer_zip.open(inner_name), inner_file)
+                        uploads.append(('{0}/{1}'.format(file_name, inner_name), inner_path))
+            except zipfile.BadZipfile:
+                inner_names = None
+            if not inner_names:
+                job['errors'].append({'fileName': file_name, 'message': 'Not a QTI package, or a zip of them'})
+
+        job['status'] = 'running'
+        job['total'] = len(uploads)
+        save_import_job(job)
+
+        if len(uploads) > 1 and QTI_IMPORT_POOL is not None:
+            packages = QTI_IMPORT_POOL.imap(parse_qti_upload, uploads)
+        else:
+            packages = (parse_qti_upload(upload) for upload in uploads)
+
+        for (file_name, path), (package, error) in itertools.izip(uploads, packages):
+            if error is None:
+                try:
+                    new_item = create_qti_item(bank, path, package)
+                    job['itemIds'].append(str(new_item.ident))
+                except Exception as ex:
+                    error = 'Could not import {0}: {1}'.format(file_name, str(ex) or type(ex).__name__)
+            if error is not None:
+                job['errors'].append({'fileName': file_name, 'message': error})
+            job['processed'] += 1
+            save_import_job(job)
+        job['status'] = 'complete'
+    except Exception as ex:
+        job['status'] = 'failed'
+        job['errors'].append({'fileName': None, 'message': str(ex) or type(ex).__name__})
+    finally:
+        shutil.rmtree(job_path, ignore_errors=True)
+        save_import_job(job)
+
+
+def save_import_job(job):
+    """write the job state, see utilities.save_file()"""
+    utilities.save_file(os.path.join(QTI_IMPORT_JOBS_PATH, '{0}.json'.format(job['id'])),
+                        json.dumps(job))
+
+
+def save_results_summary_file(file_path, data):
+    """write a results summary, or a taken's share of it, see
+    utilities.save_file()"""
+    utilities.save_file(file_path, json.dumps(data))
+
+
+def save_media_hash(repository, sha256, asset_id, asset_content_id):
+    """index a stored QTI media file by its SHA-256, see QTIMediaForm"""
+    index_path = os.path.join(QTI_MEDIA_INDEX_PATH, repository.ident.identifier)
+    utilities.makedirs(index_path)
+    utilities.save_file(os.path.join(index_path, sha256), json.dumps({
+        'assetId': str(asset_id),
+        'assetContentId': str(asset_content_id)
+    }))
+
+
+def search_banks(manager, params):
+    """the banks that match the search parameters in params.
+    Answered from BANK_SEARCH_INDEX, which loads all banks once"""
+    def get_documents():
+        for bank in manager.get_banks():
+            yield str(bank.ident), get_search_fields(bank)
+
+    BANK_SEARCH_INDEX.load('banks', get_documents)
+    bank_ids = BANK_SEARCH_INDEX.search(get_search_criteria(params))
+    return manager.get_banks_by_ids([utilities.clean_id(bank_id) for bank_id in sorted(bank_ids)])
+
+
+def search_items(bank, params):
+    """the items in bank that match the search parameters in params.
+    Answered from ITEM_SEARCH_INDEX, which loads the bank's items the
+    first time it is searched. The bank's isolated / federated view then
+    filters the matches, so items of other banks are never returned"""
+    def get_documents():
+        for item in bank.get_items():
+            yield str(item.ident), get_search_fields(item)
+
+    ITEM_SEARCH_INDEX.load((str(bank.ident), 'isolated' in params), get_documents)
+    item_ids = ITEM_SEARCH_INDEX.search(get_search_criteria(params))
+    return bank.get_items_by_ids([utilities.clean_id(item_id) for item_id in sorted(item_ids)])
 
 
 def set_answer_form_genus_and_feedback(answer, answer_form):
@@ -1115,6 +2351,7 @@ def set_answer_form_genus_and_feedback(answer, answer_form):
             answer_form.add_feedback(utilities.create_display_text(answer['feedback']))
         except AttributeError:
             if 'modalFeedback' in answer['feedback']:
+                from bs4 import BeautifulSoup
                 feedback_xml = BeautifulSoup(answer['feedback'], 'xml')
                 answer_form.set_feedback(str(feedback_xml.modalFeedback))
             else:
@@ -1215,6 +2452,202 @@ def set_item_learning_objectives(data, form):
     return form
 
 
+def start_qti_import(bank, uploads):
+    """save the uploaded (file name, file) QTI packages, or zips of them,
+    and import them into the bank in the background.
+    Returns the job, see get_import_job()"""
+    job = {
+        'id': uuid.uuid4().hex,
+        'bankId': str(bank.ident),
+        'status': 'pending',
+        'fileNames': [],
+        'total': 0,
+        'processed': 0,
+        'itemIds': [],
+        'errors': []
+    }
+    expire_import_jobs()
+    job_path = os.path.join(QTI_IMPORT_JOBS_PATH, job['id'])
+    os.makedirs(job_path)
+    for index, (file_name, upload) in enumerate(uploads):
+        with open(os.path.join(job_path, str(index)), 'wb') as saved_file:
+            shutil.copyfileobj(upload, saved_file)
+        job['fileNames'].append(file_name)
+    save_import_job(job)
+
+    env = dict(web.ctx.env, HOMEDOMAIN=web.ctx.get('homedomain', ''))
+    thread = threading.Thread(target=run_qti_import,
+                              args=(deepcopy(job), env),
+                              name='qti-import-{0}'.format(job['id']))
+    thread.daemon = True
+    thread.start()
+    return job
+
+
+def start_qti_import_pool(workers=1):
+    """start QTI_IMPORT_POOL, the process pool that bulk QTI imports are
+    parsed in, with QTI_IMPORT_PROCESSES processes, or else this worker's
+    share of the CPUs, so that `workers` server workers do not start a
+    process per CPU each. With a single process there is no pool.
+    Call before serving, while there is only one thread, because
+    forking a process with other threads can deadlock it. See main.serve()"""
+    global QTI_IMPORT_POOL
+    processes = QTI_IMPORT_PROCESSES or multiprocessing.cpu_count() // max(workers, 1)
+    if QTI_IMPORT_POOL is None and processes > 1:
+        QTI_IMPORT_POOL = multiprocessing.Pool(processes)
+
+
+def stop_qti_import_pool():
+    global QTI_IMPORT_POOL
+    if QTI_IMPORT_POOL is not None:
+        QTI_IMPORT_POOL.terminate()
+        QTI_IMPORT_POOL = None
+
+
+def stream_results_export(bank, takens, export_format='ndjson', since=None, with_additional_attempts=False):
+    """an assessment offered's results, one taken at a time, as each is
+    ready: newline-delimited JSON with a taken map (like /results) per line,
+    or CSV with a row of RESULTS_EXPORT_COLUMNS per question.
+    The taken maps are built by a pool of RESULTS_EXPORT_THREADS threads,
+    each with its own managers and bank, a few takens ahead of what has
+    been sent. A taken that cannot be loaded gets an error record, with
+    its id and an "error" message. See get_taken_results() for since"""
+    env = web.ctx.env
+
+    def start_worker():
+        # the worker threads do not share the request's web.ctx, or
+        # its managers, which are not thread-safe
+        web.ctx.env = env
+        web.ctx.request_context = utilities.RequestContext(env, pooled=False)
+
+    def get_results(taken):
+        try:
+            worker_bank = get_bank(get_assessment_manager(), bank.ident)
+            return get_taken_results(taken,
+                                     worker_bank,
+                                     since=since,
+                                     with_additional_attempts=with_additional_attempts)
+        except Exception as ex:  # yes, this is overly broad, see utilities.extract_items
+            return {
+                'id': str(taken.ident),
+                'error': str(ex) or type(ex).__name__
+            }
+
+    def stream():
+        pool = ThreadPool(RESULTS_EXPORT_THREADS, start_worker)
+        try:
+            if export_format == 'csv':
+                yield get_csv_line(RESULTS_EXPORT_COLUMNS)
+            remaining_takens = iter(takens)
+            while True:
+                takens_window = list(itertools.islice(remaining_takens, RESULTS_EXPORT_THREADS * 4))
+                if not takens_window:
+                    break
+                for taken_map in pool.imap_unordered(get_results, takens_window):
+                    if taken_map is None:
+                        continue
+                    if export_format == 'csv':
+                        for row in get_results_csv_rows(taken_map):
+                            yield get_csv_line(row)
+                    else:
+                        yield utilities.to_json(taken_map) + '\n'
+        finally:
+            pool.terminate()
+    return stream()
+
+
+def submit_response(bank, section, question_id, response_data, allow_empty_mw_sandbox=False):
+    """submit a student response, response_data, for question_id in the
+    taken's section. Returns correct or not, and feedback.
+    File upload questions need response_data['files'], except MW Sandbox
+    questions with allow_empty_mw_sandbox"""
+    question = section.get_question(utilities.clean_id(question_id))
+    response_form = bank.get_response_form(assessment_section_id=section.ident,
+                                           item_id=question.ident)
+    if 'type' not in response_data:
+        # kind of a hack
+        q_object_map = question.object_map
+        question_map = q_object_map['genusTypeId']
+        if question_map != 'GenusType%3ADEFAULT%40DLKIT.MIT.EDU':
+            response_data['type'] = q_object_map['genusTypeId']
+            response_data['type'] = response_data['type'].replace('question-type',
+                                                                  'answer-type')
+        else:
+            response_data['type'] = q_object_map['recordTypeIds'][0]
+            response_data['type'] = response_data['type'].replace('question-record-type',
+                                                                  'answer-record-type')
+    if ('files' not in response_data and is_file_submission(response_data) and
+            not (allow_empty_mw_sandbox and is_mw_sandbox(response_data))):
+        raise IllegalState('You must supply a file with a file upload question in the "submission" field.')
+    try:
+        update_form = update_response_form(response_data, response_form)
+    except AttributeError:
+        # form might not have the right records / methods that match the question
+        update_form = response_form
+    bank.submit_response(section.ident, question.ident, update_form)
+
+    response = bank.get_response(section.ident, question.ident)
+    correct = response.is_correct()
+
+    if always_right(response_data):
+        correct = True
+
+    feedback = "No feedback available."
+    return_data = {
+        'correct': correct,
+        'feedback': feedback
+    }
+
+    # update with item solution, if available
+    feedback_strings = []
+    confused_los = []
+
+    item = section._get_item(question.ident)
+    try:
+        feedback = item.get_feedback_for_response(response)
+    except (NotFound, IllegalState, AttributeError):
+        pass
+    else:
+        # Need to wrap the feedback in <?xml> and also as a single block
+        # to make this work with OEA player
+        feedback_wrapped = feedback.text
+        if feedback_wrapped is None:
+            feedback_wrapped = ''
+        if u'<modalFeedback' not in feedback_wrapped:
+            feedback_wrapped = u'<modalFeedback>{0}</modalFeedback>'.format(feedback_wrapped)
+
+        from bs4 import BeautifulSoup
+        feedback_soup = BeautifulSoup(feedback_wrapped, 'xml')
+        feedback_strings.append(feedback_soup.prettify())
+
+    try:
+        response_los = item.get_confused_learning_objective_ids_for_response(response)
+    except(NotFound, IllegalState, AttributeError):
+        pass
+    else:
+        confused_los += list(response_los)
+
+    if len(feedback_strings) > 0:
+        return_data.update({
+            'feedback': feedback_strings[0]
+        })
+    if len(confused_los) > 0:
+        return_data.update({
+            'confusedLearningObjectiveIds': confused_los
+        })
+    return return_data
+
+
+def unindex_bank(bank_id):
+    """call after a bank is deleted"""
+    BANK_SEARCH_INDEX.remove(str(bank_id))
+
+
+def unindex_item(item_id):
+    """call after an item is deleted"""
+    ITEM_SEARCH_INDEX.remove(str(item_id))
+
+
 def update_answer_form(answer, form, question=None):
     if 'type' in answer:
         if isinstance(answer['type'], list):
@@ -1641,96 +3074,67 @@ def update_item_json_answers(item, item_map):
     return item_map
 
 
-def update_item_json_random_choices(bank, item, item_map):
-    # for convenience, return choices in original order
-    item = bank.get_item(item.ident)
+def update_item_json_random_choices(bank, item, item_map, unrandomized_order=None):
+    """for convenience, return choices in original order.
+    Pass in get_unrandomized_order(item) from before the item's question
+    was built, to skip re-getting the item"""
+    if unrandomized_order is None:
+        # need to re-get the item so that the choice order isn't already shuffled
+        # by .object_map
+        unrandomized_order = get_unrandomized_order(bank.get_item(item.ident))
     serialize = False
     if isinstance(item_map, basestring):
         item_map = json.loads(item_map)
         serialize = True
 
-    try:
-        # need to re-get the item so that the choice order isn't already shuffled
-        # by .object_map
-        question = item.get_question()
-    except TypeError:
-        # item has no question
-        pass
-    else:
-        if hasattr(question, 'get_unrandomized_choices'):
-            unrandomized_choice_order = question.get_unrandomized_choices()
-
-            # now need to get the updated texts, because they might have Assets
-            if isinstance(unrandomized_choice_order, dict):
-                new_choices = {}
-                for region, choices in unrandomized_choice_order.iteritems():
-                    new_choices[region] = reorder_list_by_unrandomized_list(choices,
-                                                                            item_map['question']['choices'][region])
+    question_map = item_map.get('question')
+    if question_map is not None:
+        for key, order in unrandomized_order.iteritems():
+            if key not in question_map:
+                continue
+            if isinstance(order, dict):
+                question_map[key] = dict((region, reorder_list_by_unrandomized_list(region_order,
+                                                                                    question_map[key][region]))
+                                         for region, region_order in order.iteritems())
             else:
-                new_choices = reorder_list_by_unrandomized_list(unrandomized_choice_order,
-                                                                item_map['question']['choices'])
-            item_map['question']['choices'] = new_choices
-        if hasattr(question, 'get_unrandomized_droppables'):
-            unrandomized_droppables_order = question.get_unrandomized_droppables()
-
-            new_droppables = reorder_list_by_unrandomized_list(unrandomized_droppables_order,
-                                                               item_map['question']['droppables'])
-
-            item_map['question']['droppables'] = new_droppables
-        if hasattr(question, 'get_unrandomized_targets'):
-            unrandomized_targets_order = question.get_unrandomized_targets()
-
-            new_targets = reorder_list_by_unrandomized_list(unrandomized_targets_order,
-                                                            item_map['question']['targets'])
-
-            item_map['question']['targets'] = new_targets
-        if hasattr(question, 'get_unrandomized_zones'):
-            unrandomized_zones_order = question.get_unrandomized_zones()
-
-            new_zones = reorder_list_by_unrandomized_list(unrandomized_zones_order,
-                                                          item_map['question']['zones'])
-
-            item_map['question']['zones'] = new_zones
+                question_map[key] = reorder_list_by_unrandomized_list(order, question_map[key])
 
         if serialize:
             item_map = json.dumps(item_map)
     return item_map
 
 
-def update_json_response_with_feedback(bank, section, question_id, correct):
-    """ move this logic out of views, since it's re-used in both Submit endpoints
-    :param bank:
-    :param data_map:
-    :param section:
-    :param question:
+def update_json_response_with_feedback(response, item, correct, show_solution=False):
+    """ the feedback for a response: the item's solution if the taken shows
+    solutions (see can_review_solutions()), otherwise the answer feedback
+    :param response: the section's response to item
+    :param item:
+    :param correct:
+    :param show_solution:
     :return:
     """
     def get_best_answer_to_use():
-        response = bank.get_response(section.ident, question_id)
-        response_map = response.object_map
+        response_map = get_response_object_map(response)
         response_map['type'] = response_map['recordTypeIds']
         submissions = get_response_submissions(response_map)
-        answers = bank.get_answers(section.ident, question_id)
+        multiple_choice = is_multiple_choice(response_map)
+        answers_to_match, answer_keys = get_answer_keys(item)
         exact_answer_match = None
         default_answer_match = None
-        for answer in answers:
-            correct_submissions = 0
-            answer_choice_ids = list(answer.get_choice_ids())
-            number_choices = len(answer_choice_ids)
-            if len(submissions) == number_choices:
-                for index, choice_id in enumerate(answer_choice_ids):
-                    if is_multiple_choice(response_map):
-                        if str(choice_id) in submissions:
-                            correct_submissions += 1
-            if not correct and str(answer.genus_type) == str(WRONG_ANSWER):
+        for answer, key in zip(answers_to_match, answer_keys.answers):
+            if key.choices is None:
+                raise AttributeError('answer has no choiceIds')
+            if not correct and key.genus_type == str(WRONG_ANSWER):
                 # take the first wrong answer by default ... just in case
                 # we don't have an exact match
                 default_answer_match = answer
-            elif correct and str(answer.genus_type) == str(RIGHT_ANSWER):
+            elif correct and key.genus_type == str(RIGHT_ANSWER):
                 default_answer_match = answer
 
-            if (correct_submissions == number_choices and
-                    len(submissions) == number_choices):
+            # other than multiple choice, only answers without choices match
+            if (len(submissions) == len(key.choices) and
+                    (multiple_choice or not key.choices) and
+                    key.choice_set.issubset(submissions)):
                 exact_answer_match = answer
                 break
 
@@ -1743,13 +3147,14 @@ def update_json_response_with_feedback(bank, section, question_id, correct):
 
     feedback = None
     try:
-        taken = section.get_assessment_taken()
-        feedback = taken.get_solution_for_question(question_id, section=section)['explanation']
+        if not show_solution:
+            raise IllegalState()
+        feedback = get_item_solution(item)
         if isinstance(feedback, basestring):
             feedback = {
                 'text': feedback
             }
-    except (IllegalState, TypeError, AttributeError):
+    except (IllegalState, KeyError, TypeError, AttributeError):
         # update with answer feedback, if available
         # for now, just support this for multiple choice questions...
         try:
@@ -2092,6 +3497,44 @@ def update_question_form_with_files(form, data):
     return form
 
 
+def update_results_summary(taken, question_id=None):
+    """call after a taken is created, answered or finished, to replace its
+    share of its offered's results summary with its current responses.
+    Pass question_id when only that question was answered. A failure is
+    logged, and the summary is counted again the next time it is asked
+    for, instead of failing the request that changed the taken"""
+    offered_id = None
+    try:
+        offered_id = taken.get_assessment_offered_id()
+        if not os.path.isdir(os.path.join(RESULTS_SUMMARIES_PATH, offered_id.identifier)):
+            # not asked for yet -- get_results_summary() will count this taken
+            return
+        with lock_results_summary(offered_id) as summary_path:
+            summary = load_results_summary(summary_path)
+            if summary is None:
+                return
+            taken_file_path = os.path.join(summary_path, 'takens', '{0}.json'.format(taken.ident.identifier))
+            previous_taken_summary = load_results_summary_file(taken_file_path)
+            if previous_taken_summary is not None:
+                add_to_results_summary(summary, previous_taken_summary, count=-1)
+            elif str(taken.ident) in summary['takenIds']:
+                # its share is lost -- get_results_summary() counts the takens again
+                os.remove(os.path.join(summary_path, 'summary.json'))
+                return
+            else:
+                summary['takenIds'].append(str(taken.ident))
+            taken_summary = get_taken_summary(taken,
+                                              question_id=question_id,
+                                              previous_taken_summary=previous_taken_summary)
+            add_to_results_summary(summary, taken_summary)
+            save_results_summary_file(taken_file_path, taken_summary)
+            save_results_summary_file(os.path.join(summary_path, 'summary.json'), summary)
+    except Exception:  # yes, this is overly broad, the taken is already saved
+        utilities.log_exception()
+        if offered_id is not None:
+            forget_results_summary(offered_id)
+
+
 def update_response_form(response, form):
     """
     Put the response data into the form and send it back
@@ -2180,7 +3623,7 @@ def update_response_form(response, form):
     return form
 
 
-def validate_response(response, answers):
+def validate_response(response, item):
     correct = False
     # for longer submissions / multi-answer questions, need to make
     # sure that all of them match...
@@ -2188,57 +3631,41 @@ def validate_response(response, answers):
         return True  # always say True because the file was accepted
 
     submission = get_response_submissions(response)
-
-    if is_multiple_choice(response) or is_ordered_choice(response):
-        right_answers = [a for a in answers
-                         if is_right_answer(a)]
-        for answer in right_answers:
-            num_right = 0
-            num_total = answer.get_choice_ids().available()
-            if len(submission) == num_total:
-                for index, choice_id in enumerate(answer.get_choice_ids()):
-                    if is_ordered_choice(response):
-                        if str(choice_id) == submission[index]:  # order matters
-                            num_right += 1
-                    else:
-                        if str(choice_id) in submission:  # order doesn't matter
-                            num_right += 1
-                if num_right == num_total and len(submission) == num_total:
-                    correct = True
+    answers, answer_keys = get_answer_keys(item)
+
+    if is_ordered_choice(response):
+        correct = tuple(submission) in answer_keys.right_orders  # order matters
+    elif is_multiple_choice(response):
+        # order doesn't matter, but each choice only counts once
+        correct = (len(set(submission)) == len(submission) and
+                   frozenset(submission) in answer_keys.right_choice_sets)
     elif is_inline_choice(response):
-        correct = evaluate_inline_choice(answers, submission)
+        correct = evaluate_inline_choice(answer_keys, submission)
     elif is_numeric_response(response):
-        right_answers = [a for a in answers
-                         if is_right_answer(a)]
-
-        for answer in right_answers:
-            correct = answer.is_match(submission)
-            break  # only take the first right answer for now
+        for answer, key in zip(answers, answer_keys.answers):
+            if key.right:
+                correct = answer.is_match(submission)
+                break  # only take the first right answer for now
     else:
-        for answer in answers:
-            ans_type = answer.object_map['recordTypeIds'][0]
-            if ans_type == 'answer-record-type%3Alabel-ortho-faces%40ODL.MIT.EDU':
+        for key in answer_keys.answers:
+            if key.faces is not None:
                 if isinstance(submission, basestring):
                     submission = json.loads(submission)
-                if (
-                    int(answer.get_front_face_value()) == int(submission['frontFaceValue']) and
-                    int(answer.get_side_face_value()) == int(submission['sideFaceValue']) and
-                    int(answer.get_top_face_value()) == int(submission['topFaceValue'])
-                ):
+                if key.faces == (int(submission['frontFaceValue']),
+                                 int(submission['sideFaceValue']),
+                                 int(submission['topFaceValue'])):
                     correct = True
                     break
-            elif (ans_type == 'answer-record-type%3Amulti-choice-ortho%40ODL.MIT.EDU' or
-                  ans_type == 'answer-record-type%3Amulti-choice-edx%40ODL.MIT.EDU'):
+            elif (key.record_type == 'answer-record-type%3Amulti-choice-ortho%40ODL.MIT.EDU' or
+                  key.record_type == 'answer-record-type%3Amulti-choice-edx%40ODL.MIT.EDU'):
                 if not isinstance(submission, list):
                     raise InvalidArgument('ChoiceIds should be a list, in a student response.')
-                if len(submission) == 1:
-                    if answer.get_choice_ids()[0] == submission[0]:
-                        correct = True
-                        break
-            elif ans_type == 'answer-record-type%3Anumeric-response-edx%40ODL.MIT.EDU':
-                expected = answer.get_decimal()
-                tolerance = answer.get_tolerance()
-                if (expected - tolerance) <= submission <= (expected + tolerance):
+                if len(submission) == 1 and key.choices[:1] == (submission[0],):
+                    correct = True
+                    break
+            elif key.numeric_range is not None:
+                low, high = key.numeric_range
+                if low <= submission <= high:
                     correct = True
                     break
     return correct
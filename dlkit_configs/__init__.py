@@ -1,33 +1,3 @@
-# pylint: disable=unused-import
-
-import dlkit.json_.assessment.managers
-import dlkit.json_.assessment.objects
-import dlkit.json_.assessment.sessions
-import dlkit.json_.hierarchy.managers
-import dlkit.json_.hierarchy.objects
-import dlkit.json_.hierarchy.sessions
-import dlkit.json_.osid.managers
-import dlkit.json_.osid.objects
-import dlkit.json_.osid.sessions
-import dlkit.json_.relationship.managers
-import dlkit.json_.relationship.objects
-import dlkit.json_.relationship.sessions
-import dlkit.json_.repository.managers
-import dlkit.json_.repository.objects
-import dlkit.json_.repository.sessions
-import dlkit.authz_adapter.assessment.managers
-import dlkit.authz_adapter.assessment.sessions
-import dlkit.authz_adapter.repository.managers
-import dlkit.authz_adapter.repository.sessions
-import dlkit.filesystem_adapter.repository.managers
-import dlkit.filesystem_adapter.repository.objects
-import dlkit.filesystem_adapter.repository.sessions
-import dlkit.filesystem_adapter.osid.managers
-import dlkit.filesystem_adapter.osid.objects
-import dlkit.filesystem_adapter.osid.sessions
-import dlkit.services.assessment
-import dlkit.services.hierarchy
-import dlkit.services.logging_
-import dlkit.services.osid
-import dlkit.services.relationship
-import dlkit.services.repository
+# The dlkit implementations are imported by the runtime on first use, to
+# keep startup fast, i.e. by main.warm_up() in each server worker.
+# main.spec lists them as hidden imports for PyInstaller.
@@ -179,10 +179,9 @@ class LogEntriesList(utilities.BaseClass):
             logm = logutils.get_logging_manager()
             log = logm.get_log(utilities.clean_id(log_id))
             entries = log.get_log_entries()
+            entries, next_url = utilities.get_page(entries, web.input())
 
-            data = utilities.extract_items(entries)
-
-            return data
+            return utilities.page_response(entries, web.input(), next_url)
         except Exception as ex:
             utilities.handle_exceptions(ex)
 
@@ -1,10 +1,22 @@
 #!/bin/sh
 
+# first, so that --profile-startup can time all the other imports
+import startup_profile
+
+import argparse
+import errno
+import itertools
 import os
+import signal
+import socket
 import sys
+import time
+import traceback
 import web
+import zlib
 
 from assessment import assessment
+from assessment import assessment_utilities as autils
 from logging_ import logging_
 from repository import repository
 import utilities
@@ -26,6 +38,16 @@ except AttributeError:
     CherryPyWSGIServer.ssl_certificate = "{0}/unplatform/unplatform.cert.dummy.pem".format(ABS_PATH)
     CherryPyWSGIServer.ssl_private_key = "{0}/unplatform/unplatform.key.dummy.pem".format(ABS_PATH)
 
+# response compression, see CompressionMiddleware
+COMPRESSIBLE_TYPES = ('application/json', 'application/xml')
+COMPRESSION_LEVEL = int(os.environ.get('QBANK_COMPRESSION_LEVEL', 6))
+COMPRESSION_MIN_SIZE = int(os.environ.get('QBANK_COMPRESSION_MIN_SIZE', 1024))
+
+# server mode, see serve()
+SERVER_THREADS = int(os.environ.get('QBANK_THREADS', 10))
+SERVER_WORKERS = int(os.environ.get('QBANK_WORKERS', 1))
+# service managers each worker builds before it serves, see warm_up()
+WARM_UP_SERVICES = ['ASSESSMENT', 'LOGGING', 'REPOSITORY', 'RESOURCE']
 
 web.config.debug = False
 
@@ -39,6 +61,127 @@ urls = (
     '/(.*)', 'index'
 )
 app = web.application(urls, locals())
+app.add_processor(web.loadhook(utilities.load_request_context))
+
+
+def get_content_coding(accept_encoding):
+    """pick gzip or deflate from an Accept-Encoding header, or None"""
+    accepted = {}
+    for coding in accept_encoding.split(','):
+        params = coding.split(';')
+        quality = 1.0
+        for param in params[1:]:
+            key, _, value = param.partition('=')
+            if key.strip() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[params[0].strip().lower()] = quality
+    for coding in ('gzip', 'deflate'):
+        if accepted.get(coding, accepted.get('*', 0.0)) > 0:
+            return coding
+    return None
+
+
+class CompressionMiddleware(object):
+    """gzip or deflate JSON and XML responses, per Accept-Encoding.
+    Responses under min_size bytes, and anything that is not a full 200 / 201
+    JSON or XML response -- like AssetContentStream files and byte ranges --
+    are passed through as-is. Streamed responses are compressed
+    as they are streamed"""
+    def __init__(self, app, min_size=None, level=None):
+        self.app = app
+        self.min_size = COMPRESSION_MIN_SIZE if min_size is None else min_size
+        self.level = COMPRESSION_LEVEL if level is None else level
+
+    def __call__(self, environ, start_response):
+        coding = get_content_coding(environ.get('HTTP_ACCEPT_ENCODING', ''))
+        if coding is None or self.level == 0 or environ['REQUEST_METHOD'] == 'HEAD':
+            return self.app(environ, start_response)
+
+        response = []
+        written = []
+
+        def capture_response(status, headers, exc_info=None):
+            response[:] = [status, headers, exc_info]
+            return written.append
+
+        app_iter = self.app(environ, capture_response)
+        return self.compress(app_iter, coding, response, written, start_response)
+
+    def compress(self, app_iter, coding, response, written, start_response):
+        try:
+            chunks = iter(app_iter)
+            buffered = written
+            # in case the app only calls start_response once iterated
+            while not response:
+                buffered.append(next(chunks))
+            status, headers, exc_info = response
+
+            if not self.is_compressible(status, headers):
+                start_response(status, headers, exc_info)
+                for chunk in itertools.chain(buffered, chunks):
+                    yield chunk
+                return
+
+            headers = self.add_vary(headers)
+            size = sum(len(chunk) for chunk in buffered)
+            for chunk in chunks:
+                buffered.append(chunk)
+                size += len(chunk)
+                if size >= self.min_size:
+                    break
+            else:
+                # the whole body is smaller than min_size
+                start_response(status, headers, exc_info)
+                yield ''.join(buffered)
+                return
+
+            compressed_headers = [('Content-Encoding', coding)]
+            for name, value in headers:
+                if name.lower() == 'content-length':
+                    continue
+                elif name.lower() == 'etag' and not value.startswith('W/'):
+                    # the compressed bytes are only equivalent, not identical
+                    value = 'W/' + value
+                compressed_headers.append((name, value))
+            start_response(status, compressed_headers, exc_info)
+
+            if coding == 'gzip':
+                window_bits = 16 + zlib.MAX_WBITS
+            else:
+                window_bits = zlib.MAX_WBITS
+            compressor = zlib.compressobj(self.level, zlib.DEFLATED, window_bits)
+            for chunk in itertools.chain(buffered, chunks):
+                data = compressor.compress(chunk)
+                if data:
+                    yield data
+            yield compressor.flush()
+        finally:
+            if hasattr(app_iter, 'close'):
+                app_iter.close()
+
+    @staticmethod
+    def add_vary(headers):
+        """add Accept-Encoding to the Vary header"""
+        vary = [value for name, value in headers if name.lower() == 'vary']
+        vary.append('Accept-Encoding')
+        return [(name, value) for name, value in headers
+                if name.lower() != 'vary'] + [('Vary', ', '.join(vary))]
+
+    @staticmethod
+    def is_compressible(status, headers):
+        if status.split(' ', 1)[0] not in ('200', '201'):
+            return False
+        content_type = ''
+        for name, value in headers:
+            name = name.lower()
+            if name in ('content-encoding', 'content-range', 'accept-ranges'):
+                return False
+            elif name == 'content-type':
+                content_type = value.split(';')[0].strip().lower()
+        return content_type in COMPRESSIBLE_TYPES
 
 
 class bootloader_storage_path:
@@ -71,5 +214,170 @@ def is_test():
         return os.environ['WEBPY_ENV'] == 'test'
     return False
 
+
+def get_options(argv):
+    parser = argparse.ArgumentParser(description='Run the QBank server.')
+    parser.add_argument('address', nargs='?', default='',
+                        help='port, or ip:port, to listen on. Defaults to 0.0.0.0:8080')
+    parser.add_argument('--workers', type=int, default=SERVER_WORKERS,
+                        help='number of pre-forked worker processes. Use one per core')
+    parser.add_argument('--threads', type=int, default=SERVER_THREADS,
+                        help='number of request threads in each worker')
+    parser.add_argument('--profile-startup', action='store_true',
+                        help='print how long the imports took, before serving')
+    return parser.parse_args(argv)
+
+
+def make_server(server_address, threads, listen_socket=None):
+    """CherryPy server for the app, same as app.run() would make, so
+    with the same TLS setup. With listen_socket, it serves on that
+    already-bound socket instead of binding its own"""
+    func = app.wsgifunc(CompressionMiddleware)
+    func = web.httpserver.LogMiddleware(web.httpserver.StaticMiddleware(func))
+    server = web.httpserver.WSGIServer(server_address, func)
+    server.numthreads = threads
+
+    if listen_socket is not None:
+        def bind(family, type, proto=0):
+            server.socket = listen_socket
+            if server.ssl_adapter is not None:
+                server.socket = server.ssl_adapter.bind(listen_socket)
+        server.bind = bind
+    return server
+
+
+def run_worker(server, workers=1):
+    """serve until SIGTERM / SIGINT, then finish the in-flight requests.
+    workers is how many workers serve alongside this one"""
+    def stop_serving(signum, frame):
+        server.ready = False
+
+    signal.signal(signal.SIGTERM, stop_serving)
+    signal.signal(signal.SIGINT, stop_serving)
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    warm_up()
+    # before the request threads start, see start_qti_import_pool()
+    autils.start_qti_import_pool(workers)
+    try:
+        server.start()
+    finally:
+        # the listening socket is shared with the other workers,
+        # so only stop the request threads
+        server.socket = None
+        server.stop()
+        autils.stop_qti_import_pool()
+
+
+def warm_up():
+    """build a manager of each of WARM_UP_SERVICES, so that the dlkit
+    implementations and bs4, which are only imported when first used,
+    are imported by each worker after it forks, instead of by its first
+    request"""
+    try:
+        import bs4  # noqa
+        context = utilities.RequestContext({}, pooled=False)
+        for service_name in WARM_UP_SERVICES:
+            context.get_manager(service_name)
+    except Exception:  # serve anyway -- the first request imports them
+        utilities.log_exception()
+
+
+def serve(server_address, workers=1, threads=SERVER_THREADS):
+    """serve the app with `workers` pre-forked processes, each with
+    `threads` request threads. The master process only binds the socket
+    and watches the workers, so each worker opens its own datastore
+    connections. SIGHUP gracefully replaces all the workers, SIGTERM or
+    SIGINT gracefully stops them"""
+    scheme = 'https' if CherryPyWSGIServer.ssl_certificate else 'http'
+    print "{0}://{1}:{2}/ ({3} x {4} threads)".format(scheme, server_address[0], server_address[1],
+                                                      max(workers, 1), threads)
+
+    if workers <= 1 or not hasattr(os, 'fork'):
+        server = make_server(server_address, threads)
+        warm_up()
+        autils.start_qti_import_pool()
+        try:
+            server.start()
+        except (KeyboardInterrupt, SystemExit):
+            server.stop()
+        finally:
+            autils.stop_qti_import_pool()
+        return
+
+    listen_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listen_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listen_socket.bind(server_address)
+    listen_socket.listen(socket.SOMAXCONN)
+
+    children = {}  # pid -> generation
+    retired = set()
+    state = {'generation': 0, 'stopping': False}
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            exit_code = 0
+            try:
+                run_worker(make_server(server_address, threads, listen_socket), workers)
+            except Exception:
+                traceback.print_exc()
+                exit_code = 1
+            os._exit(exit_code)
+        children[pid] = state['generation']
+
+    def restart(signum, frame):
+        state['generation'] += 1
+
+    def stop(signum, frame):
+        state['stopping'] = True
+
+    signal.signal(signal.SIGHUP, restart)
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for _ in range(workers):
+        spawn()
+
+    while children:
+        if state['stopping']:
+            to_retire = children.keys()
+        elif state['generation'] not in children.values():
+            # SIGHUP, so start the new workers before stopping the old ones
+            to_retire = children.keys()
+            for _ in range(workers):
+                spawn()
+        else:
+            to_retire = []
+        for pid in to_retire:
+            if pid not in retired:
+                os.kill(pid, signal.SIGTERM)
+                retired.add(pid)
+
+        try:
+            pid, exit_status = os.waitpid(-1, os.WNOHANG)
+        except OSError as ex:
+            if ex.errno != errno.EINTR:
+                raise
+            continue
+        if pid == 0:
+            time.sleep(0.5)
+            continue
+
+        retired.discard(pid)
+        generation = children.pop(pid, None)
+        if generation == state['generation'] and not state['stopping']:
+            # the worker died, so replace it
+            time.sleep(1)
+            spawn()
+
+    listen_socket.close()
+
+
 if (not is_test()) and __name__ == "__main__":
-    app.run()
+    options = get_options(sys.argv[1:])
+    if options.profile_startup:
+        startup_profile.uninstall()
+        startup_profile.print_report()
+    serve(web.validip(options.address),
+          workers=options.workers,
+          threads=options.threads)
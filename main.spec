@@ -14,6 +14,11 @@ a = Analysis(['main.py'],
                             'bs4',
                             'lxml',
                             'dlkit',
+                            'dlkit.authz_adapter',
+                            'dlkit.authz_adapter.assessment.managers',
+                            'dlkit.authz_adapter.assessment.sessions',
+                            'dlkit.authz_adapter.repository.managers',
+                            'dlkit.authz_adapter.repository.sessions',
                             'dlkit.filesystem_adapter',
                             'dlkit.filesystem_adapter.osid.managers',
                             'dlkit.filesystem_adapter.osid.sessions',
@@ -85,23 +85,17 @@ class AssetsList(utilities.BaseClass):
             else:
                 repository = rm.get_repository(utilities.clean_id(repository_id))
                 assets = repository.get_assets()
-            data = utilities.extract_items(assets)
+            assets, next_url = utilities.get_page(assets, params)
+            full_urls = 'fullUrls' in params
 
-            # Update the source field with the displayName.text of the actual resource
-            data = json.loads(data)
-            for asset_map in data:
-                resource_utils.update_asset_map_with_resource(asset_map)
-            data = json.dumps(data)
-
-            if 'fullUrls' in params:
-                data = json.loads(data)
-                updated_data = []
-                for asset in data:
-                    updated_data.append(rutils.update_asset_map_with_content_url(rm, asset))
+            def update_asset_map(asset_map):
+                # Update the source field with the displayName.text of the actual resource
+                asset_map = resource_utils.update_asset_map_with_resource(asset_map)
+                if full_urls:
+                    asset_map = rutils.update_asset_map_with_content_url(rm, asset_map)
+                return asset_map
 
-                data = json.dumps(updated_data)
-
-            return data
+            return utilities.page_response(assets, params, next_url, update_map=update_asset_map)
         except Exception as ex:
             utilities.handle_exceptions(ex)
 
@@ -229,14 +223,14 @@ class AssetsList(utilities.BaseClass):
 
             # need to get the updated asset with Contents
             asset = repository.get_asset(asset.ident)
-            asset_map = json.loads(utilities.convert_dl_object(asset))
+            asset_map = asset.object_map
             if 'returnUrl' in web.input().keys():
                 asset_map = rutils.update_asset_map_with_content_url(rm, asset_map)
 
             # Update the source field with the displayName.text of the actual resource
             asset_map = resource_utils.update_asset_map_with_resource(asset_map)
 
-            return json.dumps(asset_map)
+            return asset_map
         except Exception as ex:
             utilities.handle_exceptions(ex)
 
@@ -383,11 +377,11 @@ class AssetContentsList(utilities.BaseClass):
                                                                                    params)
 
             # need to get the updated asset with Contents
-            asset_content_map = json.loads(utilities.convert_dl_object(asset_content))
+            asset_content_map = asset_content.object_map
             if 'fullUrl' in params:
                 asset_content_map = rutils.update_asset_map_with_content_url(rm, asset_content_map)
 
-            return json.dumps(asset_content_map)
+            return asset_content_map
         except Exception as ex:
             utilities.handle_exceptions(ex)
 
@@ -490,15 +484,16 @@ class AssetDetails(utilities.BaseClass):
             rm = rutils.get_repository_manager()
             als = rm.get_asset_lookup_session(proxy=rm._proxy)
             als.use_federated_repository_view()
-            data = utilities.convert_dl_object(als.get_asset(utilities.clean_id(asset_id)))
+            asset = als.get_asset(utilities.clean_id(asset_id))
+            # the source and provider names are in the response, too
+            etag = utilities.get_etag(asset, *resource_utils.get_asset_resource_revisions(asset))
+            if utilities.not_modified(etag):
+                return ''
+            data = asset.object_map
 
             if 'fullUrls' in self.data().keys():
-                data = json.loads(data)
-
                 data = rutils.update_asset_map_with_content_url(rm, data)
 
-                data = json.dumps(data)
-
             # Update the source field with the displayName.text of the actual resource
             data = resource_utils.update_asset_map_with_resource(data)
 
@@ -6,10 +6,7 @@ from dlkit.primordium.transport.objects import DataInputStream
 from dlkit.primordium.type.primitives import Type
 from dlkit.json_ import types
 
-from dlkit.runtime import PROXY_SESSION, RUNTIME
 from dlkit.runtime.errors import NotFound
-from dlkit.runtime.primitives import InitializableLocale
-from dlkit.runtime.proxy_example import SimpleRequest
 
 from dlkit.records import registry
 
@@ -326,35 +323,7 @@ def get_file_extension(file_name):
 
 
 def get_repository_manager():
-    condition = PROXY_SESSION.get_proxy_condition()
-    dummy_request = SimpleRequest(username=web.ctx.env.get('HTTP_X_API_PROXY', 'student@tiss.edu'),
-                                  authenticated=True)
-    condition.set_http_request(dummy_request)
-
-    if 'HTTP_X_API_LOCALE' in web.ctx.env:
-        language_code = web.ctx.env['HTTP_X_API_LOCALE'].lower()
-        if language_code in ['en', 'hi', 'te']:
-            if language_code == 'en':
-                language_code = 'ENG'
-                script_code = 'LATN'
-            elif language_code == 'hi':
-                language_code = 'HIN'
-                script_code = 'DEVA'
-            else:
-                language_code = 'TEL'
-                script_code = 'TELU'
-        else:
-            language_code = DEFAULT_LANGUAGE_TYPE.identifier
-            script_code = DEFAULT_SCRIPT_TYPE.identifier
-
-        locale = InitializableLocale(language_type_identifier=language_code,
-                                     script_type_identifier=script_code)
-
-        condition.set_locale(locale)
-
-    proxy = PROXY_SESSION.get_proxy(condition)
-    return RUNTIME.get_service_manager('REPOSITORY',
-                                       proxy=proxy)
+    return utilities.get_service_manager('REPOSITORY')
 
 
 def get_singular_filename(file_name):
@@ -1,16 +1,12 @@
 import json
-import web
 
 from bson.errors import InvalidId
 
 from dlkit.primordium.type.primitives import Type
 from dlkit.json_ import types
-from dlkit.runtime import PROXY_SESSION, RUNTIME
 from dlkit.runtime.errors import NotFound
-from dlkit.runtime.proxy_example import SimpleRequest
-from dlkit.runtime.primitives import InitializableLocale
 
-from utilities import clean_id
+from utilities import clean_id, get_revision, get_service_manager
 
 DEFAULT_LANGUAGE_TYPE = Type(**types.Language().get_type_data('DEFAULT'))
 DEFAULT_SCRIPT_TYPE = Type(**types.Script().get_type_data('DEFAULT'))
@@ -23,6 +19,19 @@ def get_alias_resource_id(resource_name, authority='ODL.MIT.EDU'):
                                                            authority))
 
 
+def get_asset_resource_revisions(asset):
+    """revisions of the source and provider resources, whose names
+    update_asset_map_with_resource() adds to the asset's map. For ETags"""
+    revisions = []
+    for field in ['sourceId', 'providerId']:
+        if asset._my_map.get(field):
+            mgr = get_resource_manager()
+            rls = mgr.get_resource_lookup_session(proxy=mgr._proxy)
+            rls.use_federated_bin_view()
+            revisions.append(get_revision(rls.get_resource(clean_id(asset._my_map[field]))))
+    return revisions
+
+
 def get_or_create_resource_id(catalog, resource_name):
     mgr = get_resource_manager()
     bin_ = mgr.get_bin(catalog.ident)
@@ -50,35 +59,7 @@ def get_or_create_resource_id(catalog, resource_name):
 
 
 def get_resource_manager():
-    condition = PROXY_SESSION.get_proxy_condition()
-    dummy_request = SimpleRequest(username=web.ctx.env.get('HTTP_X_API_PROXY', 'student@tiss.edu'),
-                                  authenticated=True)
-    condition.set_http_request(dummy_request)
-
-    if 'HTTP_X_API_LOCALE' in web.ctx.env:
-        language_code = web.ctx.env['HTTP_X_API_LOCALE'].lower()
-        if language_code in ['en', 'hi', 'te']:
-            if language_code == 'en':
-                language_code = 'ENG'
-                script_code = 'LATN'
-            elif language_code == 'hi':
-                language_code = 'HIN'
-                script_code = 'DEVA'
-            else:
-                language_code = 'TEL'
-                script_code = 'TELU'
-        else:
-            language_code = DEFAULT_LANGUAGE_TYPE.identifier
-            script_code = DEFAULT_SCRIPT_TYPE.identifier
-
-        locale = InitializableLocale(language_type_identifier=language_code,
-                                     script_type_identifier=script_code)
-
-        condition.set_locale(locale)
-
-    proxy = PROXY_SESSION.get_proxy(condition)
-    return RUNTIME.get_service_manager('RESOURCE',
-                                       proxy=proxy)
+    return get_service_manager('RESOURCE')
 
 
 def update_asset_map_with_resource(asset_map):
@@ -0,0 +1,71 @@
+"""Import-time breakdown for `python main.py --profile-startup`.
+main.py imports this first, so that it can time all of the other imports"""
+import sys
+import time
+
+import __builtin__
+
+IMPORT_TIMES = {}  # module name -> (own seconds, cumulative seconds)
+START_TIME = time.time()
+
+_original_import = __builtin__.__import__
+_stack = []
+
+
+def get_full_name(name, globals_, level):
+    """resolve relative and implicit relative imports to the module name"""
+    if not globals_ or level == 0 or '__name__' not in globals_:
+        return name
+    package = globals_['__name__']
+    if '__path__' not in globals_:
+        package = package.rpartition('.')[0]
+    if level > 0:
+        if level > 1:
+            package = package.rsplit('.', level - 1)[0]
+        return '{0}.{1}'.format(package, name).strip('.')
+    # implicit relative import, i.e. Python 2 "import managers"
+    relative_name = '{0}.{1}'.format(package, name)
+    if package and sys.modules.get(relative_name) is not None:
+        return relative_name
+    return name
+
+
+def install():
+    __builtin__.__import__ = timed_import
+
+
+def print_report(out=sys.stdout, limit=25):
+    total = time.time() - START_TIME
+    slowest = sorted(IMPORT_TIMES.items(), key=lambda item: -item[1][1])[:limit]
+    out.write('startup: {0:.3f}s, {1} modules imported\n'.format(total, len(IMPORT_TIMES)))
+    out.write('{0:>10} {1:>10}  module\n'.format('self (s)', 'cum (s)'))
+    for name, (own, cumulative) in slowest:
+        out.write('{0:10.3f} {1:10.3f}  {2}\n'.format(own, cumulative, name))
+
+
+def timed_import(name, globals=None, locals=None, fromlist=None, level=-1):
+    full_name = get_full_name(name, globals, level)
+    if full_name in sys.modules:
+        return _original_import(name, globals, locals, fromlist, level)
+
+    _stack.append(0.0)
+    start = time.time()
+    try:
+        return _original_import(name, globals, locals, fromlist, level)
+    finally:
+        elapsed = time.time() - start
+        nested = _stack.pop()
+        if _stack:
+            _stack[-1] += elapsed
+        # implicit relative imports only resolve once imported
+        full_name = get_full_name(name, globals, level)
+        if full_name in sys.modules:
+            IMPORT_TIMES[full_name] = (elapsed - nested, elapsed)
+
+
+def uninstall():
+    __builtin__.__import__ = _original_import
+
+
+if '--profile-startup' in sys.argv:
+    install()
@@ -23,6 +23,9 @@ from urllib import unquote
 
 from main import app
 
+from assessment import assessment_utilities as autils
+import utilities
+
 
 # PROJECT_PATH = os.path.dirname(os.path.abspath(__file__))
 # ABS_PATH = os.path.abspath(os.path.join(PROJECT_PATH, os.pardir))
@@ -414,7 +417,8 @@ def get_managers(username='student@tiss.edu'):
     managers = [('am', 'ASSESSMENT'),
                 ('authzm', 'AUTHORIZATION'),
                 ('logm', 'LOGGING'),
-                ('rm', 'REPOSITORY')]
+                ('rm', 'REPOSITORY'),
+                ('resm', 'RESOURCE')]
     results = {}
     for manager in managers:
         nickname = manager[0]
@@ -488,6 +492,24 @@ class BaseTestCase(TestCase):
         middleware = []
         self.app = TestApp(app.wsgifunc(*middleware))
 
+        # pooled managers cache authz results, so start each test fresh
+        utilities.MANAGER_POOL.clear()
+        # and search indexes, archive banks, bank routes, answer keys, rendered QTI
+        # and media paths, because the fixture banks keep their ids
+        autils.ITEM_SEARCH_INDEX.clear()
+        autils.BANK_SEARCH_INDEX.clear()
+        autils.ARCHIVE_BANK_IDS.clear()
+        autils.BANK_ROUTES.clear()
+        autils.ANSWER_KEY_CACHE.clear()
+        autils.QTI_CACHE.clear()
+        autils.MEDIA_PATH_CACHE.clear()
+        # and the on-disk stores, which point into the datastores dropped below
+        for store_path in [autils.SEARCH_INDEX_PATH,
+                           autils.QTI_IMPORT_JOBS_PATH,
+                           autils.RESULTS_SUMMARIES_PATH,
+                           autils.QTI_MEDIA_INDEX_PATH]:
+            shutil.rmtree(store_path, ignore_errors=True)
+
         envoy.run('mongo test_qbank_lite_assessment --eval "db.dropDatabase()"')
         envoy.run('mongo test_qbank_lite_assessment_authoring --eval "db.dropDatabase()"')
         envoy.run('mongo test_qbank_lite_hierarchy --eval "db.dropDatabase()"')
@@ -1,15 +1,30 @@
 # -*- coding: utf-8 -*-
 import csv
+import inspect
 import json
 import os
+import shutil
+import tempfile
+import threading
+import zlib
 
 from bs4 import BeautifulSoup
 
 from copy import deepcopy
 
+from cStringIO import StringIO
+
+from main import app, CompressionMiddleware, get_content_coding, get_options
+
+import startup_profile
+
+from assessment import assessment_utilities as autils
+
+from paste import fixture
 from paste.fixture import AppError
 
 from dlkit.runtime.primordium import Id, Type
+from dlkit.records.assessment.basic.assessment_records import ReviewOptionsAssessmentTakenRecord
 from dlkit.records.assessment.qti.basic import _stringify
 from dlkit.records.registry import ITEM_GENUS_TYPES, ITEM_RECORD_TYPES,\
     ANSWER_RECORD_TYPES, QUESTION_RECORD_TYPES, ANSWER_GENUS_TYPES,\
@@ -983,6 +998,14 @@ class AssessmentCrUDTests(BaseAssessmentTestCase):
                             headers={'content-type': 'application/json'})
         return self.json(req)
 
+    def create_mc_multi_select_item(self):
+        url = '{0}/items'.format(self.url)
+        self._mc_multi_select_test_file.seek(0)
+        req = self.app.post(url,
+                            upload_files=[('qtiFile', 'testFile', self._mc_multi_select_test_file.read())])
+        self.ok(req)
+        return self.json(req)
+
     def create_mw_sentence_item(self):
         url = '{0}/items'.format(self.url)
         self._mw_sentence_test_file.seek(0)
@@ -1023,6 +1046,7 @@ class AssessmentCrUDTests(BaseAssessmentTestCase):
         self.url += '/banks/' + unquote(str(self._bank.ident))
 
         self._mw_sentence_test_file = open('{0}/tests/files/mw_sentence_with_audio_file.zip'.format(ABS_PATH), 'rb')
+        self._mc_multi_select_test_file = open('{0}/tests/files/mc_multi_select_test_file.zip'.format(ABS_PATH), 'rb')
 
     def tearDown(self):
         """
@@ -1033,6 +1057,7 @@ class AssessmentCrUDTests(BaseAssessmentTestCase):
         super(AssessmentCrUDTests, self).tearDown()
 
         self._mw_sentence_test_file.close()
+        self._mc_multi_select_test_file.close()
 
     def test_assessment_offered_crud(self):
         """
@@ -2174,6 +2199,111 @@ class AssessmentCrUDTests(BaseAssessmentTestCase):
                 expected_choices[choice_id]
             )
 
+    def test_item_get_returns_not_modified_for_matching_etag(self):
+        item = self.create_mw_sentence_item()
+        url = '{0}/items/{1}'.format(self.url,
+                                     unquote(item['id']))
+        req = self.app.get(url)
+        self.ok(req)
+        etag = req.header('ETag')
+
+        req = self.app.get(url,
+                           headers={'If-None-Match': etag})
+        self.code(req, 304)
+        self.assertEqual(req.body, '')
+
+        # weak and multiple tags also match
+        req = self.app.get(url,
+                           headers={'If-None-Match': '"foo", W/{0}'.format(etag)})
+        self.code(req, 304)
+
+        payload = {
+            'name': 'a new name'
+        }
+        req = self.app.put(url,
+                           params=json.dumps(payload),
+                           headers={'content-type': 'application/json'})
+        self.ok(req)
+
+        req = self.app.get(url,
+                           headers={'If-None-Match': etag})
+        self.ok(req)
+        self.assertNotEqual(req.header('ETag'), etag)
+        self.assertEqual(self.json(req)['displayName']['text'], 'a new name')
+
+    def test_item_qti_get_returns_not_modified_for_matching_etag(self):
+        item = self.create_mw_sentence_item()
+        url = '{0}/items/{1}/qti'.format(self.url,
+                                         unquote(item['id']))
+        req = self.app.get(url)
+        self.ok(req)
+        etag = req.header('ETag')
+        self.assertIn('<assessmentItem', req.body)
+
+        req = self.app.get(url,
+                           headers={'If-None-Match': etag})
+        self.code(req, 304)
+        self.assertEqual(req.body, '')
+
+        # the QTI has media URLs with the host in it
+        req = self.app.get(url,
+                           headers={'If-None-Match': etag},
+                           extra_environ={'HTTP_HOST': 'example.com'})
+        self.ok(req)
+        self.assertNotEqual(req.header('ETag'), etag)
+
+    def test_item_qti_rendered_once_until_item_changes(self):
+        item = self.create_mc_multi_select_item()
+        url = '{0}/items/{1}/qti'.format(self.url,
+                                         unquote(item['id']))
+        req = self.app.get(url)
+        self.ok(req)
+        stats = autils.QTI_CACHE.stats()
+
+        req2 = self.app.get(url)
+        self.ok(req2)
+        self.assertEqual(req2.body, req.body)
+        self.assertEqual(autils.QTI_CACHE.stats()['hits'], stats['hits'] + 1)
+        self.assertEqual(autils.QTI_CACHE.stats()['misses'], stats['misses'])
+
+        req = self.app.put('{0}/items/{1}'.format(self.url, unquote(item['id'])),
+                           params=json.dumps({'name': 'a new name'}),
+                           headers={'content-type': 'application/json'})
+        self.ok(req)
+
+        req = self.app.get(url)
+        self.ok(req)
+        self.assertEqual(autils.QTI_CACHE.stats()['misses'], stats['misses'] + 1)
+        self.assertEqual(autils.QTI_CACHE.stats()['entries'], stats['entries'])
+
+    def test_shuffled_item_qti_rendered_for_each_request(self):
+        item = self.create_mw_sentence_item()
+        url = '{0}/items/{1}/qti'.format(self.url,
+                                         unquote(item['id']))
+        entries = autils.QTI_CACHE.stats()['entries']
+        for _ in range(2):
+            req = self.app.get(url)
+            self.ok(req)
+            self.assertIn('orderInteraction', req.body)
+        self.assertEqual(autils.QTI_CACHE.stats()['entries'], entries)
+
+    def test_items_qti_list_looks_up_media_path_once_per_bank(self):
+        self.create_mw_sentence_item()
+        self.create_item(self._bank.ident)
+        url = '{0}/items?qti'.format(self.url)
+        misses = autils.MEDIA_PATH_CACHE.stats()['misses']
+        req = self.app.get(url)
+        self.ok(req)
+        self.assertEqual(len(self.json(req)), 2)
+        self.assertEqual(autils.MEDIA_PATH_CACHE.stats()['misses'], misses + 1)
+
+        self.ok(self.app.get(url))
+        self.assertEqual(autils.MEDIA_PATH_CACHE.stats()['misses'], misses + 1)
+
+        # the media path includes the host
+        self.ok(self.app.get(url, extra_environ={'HTTP_HOST': 'example.com'}))
+        self.assertEqual(autils.MEDIA_PATH_CACHE.stats()['misses'], misses + 2)
+
     def test_can_assign_to_banks_on_create(self):
         new_bank = self.create_bank()
 
@@ -3645,6 +3775,259 @@ class AssessmentTakingTests(BaseAssessmentTestCase):
             self.assertTrue(question['response']['isCorrect'])
             self.assertFalse(question['additionalAttempts'][0]['isCorrect'])
 
+    def test_can_export_results_for_offered(self):
+        item = self.create_item(with_feedback=True)
+        self.assessment = self.create_assessment()
+        self.link_item_to_assessment(item, self.assessment)
+        offered = self.create_offered()
+        assessment_offering_takens_endpoint = '{0}/assessmentsoffered/{1}/assessmentstaken'.format(self.url,
+                                                                                                   unquote(offered['id']))
+        req = self.app.post(assessment_offering_takens_endpoint,
+                            headers={
+                                'x-api-proxy': 'student@tiss.edu'
+                            })
+        self.ok(req)
+        taken = json.loads(req.body)
+        taken_questions_url = '{0}/assessmentstaken/{1}/questions'.format(self.url,
+                                                                          unquote(taken['id']))
+        req = self.app.get(taken_questions_url)
+        self.ok(req)
+        question_1 = self.json(req)['data'][0]
+        url = '{0}/{1}/submit'.format(taken_questions_url,
+                                      question_1['id'])
+        payload = {
+            'choiceIds': ['idc561552b-ed48-46c3-b20d-873150dfd4a2']
+        }
+        req = self.app.post(url,
+                            params=json.dumps(payload),
+                            headers={'content-type': 'application/json'})
+        self.ok(req)
+
+        export_url = '{0}/assessmentsoffered/{1}/results/export'.format(self.url,
+                                                                        unquote(offered['id']))
+        req = self.app.get(export_url)
+        self.ok(req)
+        self.assertIn('application/x-ndjson', req.header('Content-Type'))
+        lines = req.body.splitlines()
+        self.assertEqual(len(lines), 1)
+        taken_map = json.loads(lines[0])
+        self.assertEqual(taken_map['id'], taken['id'])
+        self.assertTrue(taken_map['sections'][0]['questions'][0]['response']['isCorrect'])
+
+        req = self.app.get(export_url + '?format=csv')
+        self.ok(req)
+        self.assertIn('text/csv', req.header('Content-Type'))
+        rows = list(csv.DictReader(StringIO(req.body)))
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['takenId'], taken['id'])
+        self.assertEqual(rows[0]['takingAgentId'], taken['takingAgentId'])
+        self.assertEqual(rows[0]['isCorrect'], 'True')
+        self.assertEqual(rows[0]['choiceIds'], payload['choiceIds'][0])
+        self.assertEqual(rows[0]['error'], '')
+
+        req = self.app.get(export_url + '?since=2000-01-01T00:00:00Z')
+        self.ok(req)
+        self.assertEqual(len(req.body.splitlines()), 1)
+
+        req = self.app.get(export_url + '?since=3000-01-01T00:00:00Z')
+        self.ok(req)
+        self.assertEqual(req.body, '')
+
+        self.assertRaises(AppError,
+                          self.app.get,
+                          export_url + '?since=yesterday')
+        self.assertRaises(AppError,
+                          self.app.get,
+                          export_url + '?format=xml')
+
+    def test_results_summary_is_updated_as_takens_are_taken(self):
+        item = self.create_item(with_feedback=True)
+        self.assessment = self.create_assessment()
+        self.link_item_to_assessment(item, self.assessment)
+        offered = self.create_offered()
+        summary_url = '{0}/assessmentsoffered/{1}/results/summary'.format(self.url,
+                                                                          unquote(offered['id']))
+        req = self.app.get(summary_url)
+        self.ok(req)
+        summary = self.json(req)
+        self.assertEqual(summary['assessmentOfferedId'], offered['id'])
+        self.assertEqual(summary['takens'], 0)
+        self.assertEqual(summary['completed'], 0)
+        self.assertEqual(summary['questions'], [])
+
+        assessment_offering_takens_endpoint = '{0}/assessmentsoffered/{1}/assessmentstaken'.format(self.url,
+                                                                                                   unquote(offered['id']))
+        req = self.app.post(assessment_offering_takens_endpoint,
+                            headers={
+                                'x-api-proxy': 'student@tiss.edu'
+                            })
+        self.ok(req)
+        taken = json.loads(req.body)
+        req = self.app.get(summary_url)
+        self.ok(req)
+        self.assertEqual(self.json(req)['takens'], 1)
+
+        taken_endpoint = '{0}/assessmentstaken/{1}'.format(self.url,
+                                                           unquote(taken['id']))
+        req = self.app.get(taken_endpoint + '/questions')
+        self.ok(req)
+        question_1 = self.json(req)['data'][0]
+        url = '{0}/questions/{1}/submit'.format(taken_endpoint,
+                                                question_1['id'])
+        wrong_answer_id = 'foo'
+        right_answer_id = 'idc561552b-ed48-46c3-b20d-873150dfd4a2'
+        req = self.app.post(url,
+                            params=json.dumps({'choiceIds': [wrong_answer_id]}),
+                            headers={'content-type': 'application/json'})
+        self.ok(req)
+        req = self.app.get(summary_url)
+        self.ok(req)
+        question = self.json(req)['questions'][0]
+        self.assertEqual(question['itemId'], item['id'])
+        self.assertEqual(question['responded'], 1)
+        self.assertEqual(question['correct'], 0)
+        self.assertEqual(question['correctRate'], 0.0)
+        self.assertEqual(question['choiceIds'], {wrong_answer_id: 1})
+
+        # a new response replaces the taken's old one
+        req = self.app.post(url,
+                            params=json.dumps({'choiceIds': [right_answer_id]}),
+                            headers={'content-type': 'application/json'})
+        self.ok(req)
+        req = self.app.post(taken_endpoint + '/finish')
+        self.ok(req)
+        req = self.app.get(summary_url)
+        self.ok(req)
+        summary = self.json(req)
+        self.assertEqual(summary['takens'], 1)
+        self.assertEqual(summary['completed'], 1)
+        self.assertEqual(len(summary['questions']), 1)
+        question = summary['questions'][0]
+        self.assertEqual(question['responded'], 1)
+        self.assertEqual(question['correct'], 1)
+        self.assertEqual(question['correctRate'], 1.0)
+        self.assertEqual(question['choiceIds'], {right_answer_id: 1})
+
+        # counting all of the takens again gives the same summary
+        offered_id = utilities.clean_id(offered['id'])
+        shutil.rmtree(os.path.join(autils.RESULTS_SUMMARIES_PATH, offered_id.identifier))
+        req = self.app.get(summary_url)
+        self.ok(req)
+        self.assertEqual(self.json(req), summary)
+
+        req = self.app.delete(taken_endpoint)
+        self.ok(req)
+        req = self.app.get(summary_url)
+        self.ok(req)
+        summary = self.json(req)
+        self.assertEqual(summary['takens'], 0)
+        self.assertEqual(summary['completed'], 0)
+        self.assertEqual(summary['questions'][0]['responded'], 0)
+        self.assertIsNone(summary['questions'][0]['correctRate'])
+        self.assertEqual(summary['questions'][0]['choiceIds'], {})
+
+    def test_failed_results_summary_update_does_not_fail_the_submit(self):
+        item = self.create_item(with_feedback=True)
+        self.assessment = self.create_assessment()
+        self.link_item_to_assessment(item, self.assessment)
+        offered = self.create_offered()
+        summary_url = '{0}/assessmentsoffered/{1}/results/summary'.format(self.url,
+                                                                          unquote(offered['id']))
+        assessment_offering_takens_endpoint = '{0}/assessmentsoffered/{1}/assessmentstaken'.format(self.url,
+                                                                                                   unquote(offered['id']))
+        req = self.app.post(assessment_offering_takens_endpoint,
+                            headers={
+                                'x-api-proxy': 'student@tiss.edu'
+                            })
+        self.ok(req)
+        taken = json.loads(req.body)
+        self.ok(self.app.get(summary_url))
+
+        # a taken share that cannot be subtracted
+        offered_id = utilities.clean_id(offered['id'])
+        taken_file_path = os.path.join(autils.RESULTS_SUMMARIES_PATH,
+                                       offered_id.identifier,
+                                       'takens',
+                                       '{0}.json'.format(utilities.clean_id(taken['id']).identifier))
+        with open(taken_file_path, 'w') as taken_file:
+            json.dump({'completed': False, 'questions': None}, taken_file)
+
+        taken_endpoint = '{0}/assessmentstaken/{1}'.format(self.url,
+                                                           unquote(taken['id']))
+        req = self.app.get(taken_endpoint + '/questions')
+        self.ok(req)
+        question_1 = self.json(req)['data'][0]
+        url = '{0}/questions/{1}/submit'.format(taken_endpoint,
+                                                question_1['id'])
+        right_answer_id = 'idc561552b-ed48-46c3-b20d-873150dfd4a2'
+        req = self.app.post(url,
+                            params=json.dumps({'choiceIds': [right_answer_id]}),
+                            headers={'content-type': 'application/json'})
+        self.ok(req)
+        self.assertTrue(self.json(req)['correct'])
+
+        # the summary is counted again
+        req = self.app.get(summary_url)
+        self.ok(req)
+        summary = self.json(req)
+        self.assertEqual(summary['takens'], 1)
+        self.assertEqual(summary['questions'][0]['correct'], 1)
+        self.assertEqual(summary['questions'][0]['choiceIds'], {right_answer_id: 1})
+
+    def test_lost_taken_share_does_not_count_the_taken_twice(self):
+        item = self.create_item(with_feedback=True)
+        self.assessment = self.create_assessment()
+        self.link_item_to_assessment(item, self.assessment)
+        offered = self.create_offered()
+        summary_url = '{0}/assessmentsoffered/{1}/results/summary'.format(self.url,
+                                                                          unquote(offered['id']))
+        assessment_offering_takens_endpoint = '{0}/assessmentsoffered/{1}/assessmentstaken'.format(self.url,
+                                                                                                   unquote(offered['id']))
+        req = self.app.post(assessment_offering_takens_endpoint,
+                            headers={
+                                'x-api-proxy': 'student@tiss.edu'
+                            })
+        self.ok(req)
+        taken = json.loads(req.body)
+        req = self.app.get(summary_url)
+        self.ok(req)
+        self.assertEqual(self.json(req)['takens'], 1)
+        self.assertNotIn('takenIds', self.json(req))
+
+        offered_id = utilities.clean_id(offered['id'])
+        taken_file_path = os.path.join(autils.RESULTS_SUMMARIES_PATH,
+                                       offered_id.identifier,
+                                       'takens',
+                                       '{0}.json'.format(utilities.clean_id(taken['id']).identifier))
+        os.remove(taken_file_path)
+
+        taken_endpoint = '{0}/assessmentstaken/{1}'.format(self.url,
+                                                           unquote(taken['id']))
+        req = self.app.get(taken_endpoint + '/questions')
+        self.ok(req)
+        question_1 = self.json(req)['data'][0]
+        url = '{0}/questions/{1}/submit'.format(taken_endpoint,
+                                                question_1['id'])
+        right_answer_id = 'idc561552b-ed48-46c3-b20d-873150dfd4a2'
+        req = self.app.post(url,
+                            params=json.dumps({'choiceIds': [right_answer_id]}),
+                            headers={'content-type': 'application/json'})
+        self.ok(req)
+        req = self.app.get(summary_url)
+        self.ok(req)
+        summary = self.json(req)
+        self.assertEqual(summary['takens'], 1)
+        self.assertEqual(summary['questions'][0]['responded'], 1)
+        self.assertEqual(summary['questions'][0]['choiceIds'], {right_answer_id: 1})
+
+        # and a deleted taken with a lost share is not left in the summary
+        os.remove(taken_file_path)
+        req = self.app.delete(taken_endpoint)
+        self.ok(req)
+        req = self.app.get(summary_url)
+        self.ok(req)
+        self.assertEqual(self.json(req)['takens'], 0)
+
 
 class BankTests(BaseAssessmentTestCase):
     def setUp(self):
@@ -3705,6 +4088,44 @@ class BankTests(BaseAssessmentTestCase):
         data = self.json(req)
         self.assertEqual(len(data), 0)
 
+    def test_bank_get_returns_not_modified_for_matching_etag(self):
+        payload = {
+            "name": "New bank"
+        }
+        req = self.app.post(self.url,
+                            params=json.dumps(payload),
+                            headers={'content-type': 'application/json'})
+        self.ok(req)
+        url = '{0}/{1}'.format(self.url,
+                               self.json(req)['id'])
+
+        req = self.app.get(url)
+        self.ok(req)
+        etag = req.header('ETag')
+
+        req = self.app.get(url,
+                           headers={'If-None-Match': etag})
+        self.code(req, 304)
+
+        # a different locale is a different representation
+        req = self.app.get(url,
+                           headers={'If-None-Match': etag,
+                                    'x-api-locale': 'hi'})
+        self.ok(req)
+
+        payload = {
+            "description": "changed"
+        }
+        req = self.app.put(url,
+                           params=json.dumps(payload),
+                           headers={'content-type': 'application/json'})
+        self.ok(req)
+
+        req = self.app.get(url,
+                           headers={'If-None-Match': etag})
+        self.ok(req)
+        self.assertEqual(self.json(req)['description']['text'], 'changed')
+
     def test_can_update_bank_alias(self):
         alias_id = "assessment.Bank%3Apublished-012345678910111213141516%40ODL.MIT.EDU"
         name = "New Bank"
@@ -3760,6 +4181,332 @@ class BasicServiceTests(BaseAssessmentTestCase):
         self.ok(req)
         self.message(req, '[]')
 
+    def test_repeat_requests_reuse_pooled_managers(self):
+        url = self.url + '/banks'
+        self.ok(self.app.get(url))
+        stats = utilities.MANAGER_POOL.stats()
+        self.assertEqual(stats['size'], 1)
+        self.assertEqual(stats['misses'], 1)
+
+        self.ok(self.app.get(url))
+        stats = utilities.MANAGER_POOL.stats()
+        self.assertEqual(stats['size'], 1)
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['hits'], 1)
+
+    def test_managers_pooled_per_user_and_locale(self):
+        url = self.url + '/banks'
+        self.ok(self.app.get(url))
+        self.ok(self.app.get(url, headers={'x-api-locale': 'hi'}))
+        # unknown users are not authorized, but still get their own managers
+        self.app.get(url, headers={'x-api-proxy': 'teacher@tiss.edu'}, expect_errors=True)
+        stats = utilities.MANAGER_POOL.stats()
+        self.assertEqual(stats['size'], 3)
+        self.assertEqual(stats['misses'], 3)
+        self.assertEqual(stats['hits'], 0)
+
+    def test_request_context_hands_out_each_manager_once(self):
+        context = utilities.RequestContext({'HTTP_X_API_LOCALE': 'HI'})
+        self.assertEqual(context.username, 'student@tiss.edu')
+        self.assertEqual(context.language_code, 'hi')
+        self.assertEqual(context.locale.language_type.identifier, 'HIN')
+        self.assertEqual(context.locale.script_type.identifier, 'DEVA')
+
+        am = context.get_manager('ASSESSMENT')
+        self.assertIs(context.get_manager('ASSESSMENT'), am)
+        stats = utilities.MANAGER_POOL.stats()
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['hits'], 0)
+
+    def test_request_context_loads_each_object_once(self):
+        context = utilities.RequestContext({})
+        lookups = []
+
+        def lookup(object_id):
+            lookups.append(object_id)
+            return object()
+
+        bank = context.get_object('assessment.Bank', self._bank.ident, lookup)
+        self.assertIs(context.get_object('assessment.Bank', self._bank.ident, lookup), bank)
+        self.assertEqual(len(lookups), 1)
+
+        context.forget_object(self._bank.ident)
+        self.assertIsNot(context.get_object('assessment.Bank', self._bank.ident, lookup), bank)
+        self.assertEqual(len(lookups), 2)
+
+    def test_request_context_resets_cached_bank_views(self):
+        context = utilities.RequestContext({})
+        am = context.get_manager('ASSESSMENT')
+        bank = context.get_object('assessment.Bank', self._bank.ident, am.get_bank,
+                                  reset=autils.reset_bank_views)
+        isolated_bank = am.get_bank(self._bank.ident)
+        isolated_bank.use_isolated_bank_view()
+
+        bank.use_federated_bank_view()
+        bank.use_plenary_item_view()
+        self.assertIs(context.get_object('assessment.Bank', self._bank.ident, am.get_bank,
+                                         reset=autils.reset_bank_views), bank)
+        self.assertEqual(bank._bank_view, isolated_bank._bank_view)
+        self.assertEqual(bank._object_views, {})
+
+    def test_stream_items_yields_one_element_at_a_time(self):
+        chunks = list(utilities.stream_items([{'id': 1}, {'id': 2}]))
+        self.assertEqual(len(chunks), 4)
+        self.assertEqual(json.loads(''.join(chunks)), [{'id': 1}, {'id': 2}])
+        self.assertEqual(''.join(utilities.stream_items([])), '[]')
+
+    def test_stream_items_skips_items_whose_update_fails(self):
+        def update_map(item_map):
+            if item_map['id'] == 2:
+                raise KeyError('no such resource')
+            item_map['updated'] = True
+            return item_map
+
+        chunks = list(utilities.stream_items([{'id': 1}, {'id': 2}, {'id': 3}], update_map=update_map))
+        self.assertEqual(json.loads(''.join(chunks)), [{'id': 1, 'updated': True},
+                                                       {'id': 3, 'updated': True}])
+
+    def test_to_json_falls_back_to_json_dumps(self):
+        def broken_encoder(data):
+            raise TypeError('not supported')
+
+        original_encoder = utilities.JSON_ENCODER
+        utilities.JSON_ENCODER = broken_encoder
+        try:
+            self.assertEqual(json.loads(utilities.to_json({'a': [1, 2.5]})), {'a': [1, 2.5]})
+        finally:
+            utilities.JSON_ENCODER = original_encoder
+
+    def test_manager_pool_evicts_least_recently_used(self):
+        pool = utilities.ManagerPool(max_size=2)
+        pool.get(('a', None), 'ASSESSMENT', lambda: 'a')
+        pool.get(('b', None), 'ASSESSMENT', lambda: 'b')
+        self.assertEqual(pool.get(('a', None), 'ASSESSMENT', lambda: 'new a'), 'a')
+        pool.get(('c', None), 'ASSESSMENT', lambda: 'c')
+        self.assertEqual(len(pool), 2)
+        self.assertEqual(pool.get(('a', None), 'ASSESSMENT', lambda: 'new a'), 'a')
+        self.assertEqual(pool.get(('b', None), 'ASSESSMENT', lambda: 'new b'), 'new b')
+        self.assertEqual(pool.stats()['hits'], 2)
+        self.assertEqual(pool.stats()['misses'], 4)
+
+    def test_manager_pool_rebuilds_expired_managers(self):
+        pool = utilities.ManagerPool(ttl=60)
+        self.assertEqual(pool.get(('a', None), 'ASSESSMENT', lambda: 'a'), 'a')
+        self.assertEqual(pool.get(('a', None), 'ASSESSMENT', lambda: 'new a'), 'a')
+
+        pool = utilities.ManagerPool(ttl=0)
+        self.assertEqual(pool.get(('a', None), 'ASSESSMENT', lambda: 'a'), 'a')
+        self.assertEqual(pool.get(('a', None), 'ASSESSMENT', lambda: 'new a'), 'new a')
+        self.assertEqual(len(pool), 1)
+        self.assertEqual(pool.stats()['misses'], 2)
+
+    def test_manager_pool_never_shares_a_manager_between_threads(self):
+        pool = utilities.ManagerPool()
+        self.assertEqual(pool.get(('a', None), 'ASSESSMENT', lambda: 'a'), 'a')
+        other_thread_managers = []
+        other_thread = threading.Thread(
+            target=lambda: other_thread_managers.append(pool.get(('a', None), 'ASSESSMENT', lambda: 'other a')))
+        other_thread.start()
+        other_thread.join()
+        self.assertEqual(other_thread_managers, ['other a'])
+        self.assertEqual(pool.get(('a', None), 'ASSESSMENT', lambda: 'new a'), 'a')
+        self.assertEqual(len(pool), 2)
+
+    def test_unknown_locales_share_a_pooled_manager(self):
+        url = self.url + '/banks'
+        self.ok(self.app.get(url, headers={'x-api-locale': 'xx'}))
+        self.ok(self.app.get(url, headers={'x-api-locale': 'yy'}))
+        stats = utilities.MANAGER_POOL.stats()
+        self.assertEqual(stats['size'], 1)
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['hits'], 1)
+
+    def test_search_index_applies_another_process_writes(self):
+        journal_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, journal_dir)
+        journal_path = os.path.join(journal_dir, 'items')
+        index = utilities.SearchIndex(text_fields=['displayName'], journal_path=journal_path)
+        other_process_index = utilities.SearchIndex(text_fields=['displayName'], journal_path=journal_path)
+        documents = [('a', {'displayName': ['Unit 1 Lesson 1']})]
+        loads = []
+
+        def get_documents():
+            loads.append(1)
+            return list(documents)
+
+        other_process_index.add('a', dict(documents)['a'])
+        index.load('bank', get_documents)
+        self.assertEqual(index.search([('displayName', 'lesson')]), set(['a']))
+
+        documents = [('b', {'displayName': ['Unit 2 Lesson 1']})]
+        other_process_index.add('b', dict(documents)['b'])
+        other_process_index.remove('a')
+        index.load('bank', get_documents)
+        self.assertEqual(index.search([('displayName', 'lesson')]), set(['b']))
+        self.assertEqual(index.search([('displayName', 'T 2 L')]), set(['b']))
+        self.assertEqual(len(loads), 1)
+
+        other_process_index.forget_scopes()
+        index.load('bank', get_documents)
+        self.assertEqual(len(loads), 2)
+
+    def test_search_index_reloads_after_another_process_starts_the_journal_over(self):
+        journal_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, journal_dir)
+        journal_path = os.path.join(journal_dir, 'items')
+        index = utilities.SearchIndex(text_fields=['displayName'], journal_path=journal_path)
+        other_process_index = utilities.SearchIndex(text_fields=['displayName'], journal_path=journal_path,
+                                                    max_journal_size=100)
+        documents = [('a', {'displayName': ['Unit 1 Lesson 1']})]
+        loads = []
+
+        def get_documents():
+            loads.append(1)
+            return list(documents)
+
+        other_process_index.add('a', dict(documents)['a'])
+        index.load('bank', get_documents)
+        documents.append(('b', {'displayName': ['Unit 2 Lesson 1']}))
+        other_process_index.add('b', dict(documents)['b'])
+        index.load('bank', get_documents)
+        self.assertEqual(len(loads), 2)
+        self.assertEqual(index.search([('displayName', 'lesson')]), set(['a', 'b']))
+        self.assertEqual(other_process_index.search([('displayName', 'lesson')]), set(['a', 'b']))
+
+    def test_search_index_matches_any_part_of_text_fields(self):
+        index = utilities.SearchIndex(text_fields=['displayName'])
+        index.add('a', {'displayName': ['Unit 1 Lesson 1', u'Le\xe7on 1'], 'genusTypeId': ['g1']})
+        index.add('b', {'displayName': ['Lessons learned'], 'genusTypeId': ['g2']})
+        index.add('c', {'displayName': ['Nessie'], 'genusTypeId': ['g1']})
+        self.assertEqual(index.search([('displayName', 'LESSON')]), set(['a', 'b']))
+        self.assertEqual(index.search([('displayName', 'ess')]), set(['a', 'b', 'c']))
+        self.assertEqual(index.search([('displayName', 't 1 l')]), set(['a']))
+        self.assertEqual(index.search([('displayName', u'\xe7on')]), set(['a']))
+        self.assertEqual(index.search([('displayName', 'e')]), set(['a', 'b', 'c']))
+        self.assertEqual(index.search([('displayName', 'lessen')]), set())
+        self.assertEqual(index.search([('displayName', 'ess'), ('genusTypeId', 'g1')]), set(['a', 'c']))
+        self.assertEqual(index.search([('genusTypeId', 'g')]), set())
+
+        index.add('b', {'displayName': ['Nested'], 'genusTypeId': ['g2']})
+        self.assertEqual(index.search([('displayName', 'less')]), set(['a']))
+        index.remove('a')
+        self.assertEqual(index.search([('displayName', 'less')]), set())
+        self.assertEqual(index.search([('displayName', 'nes')]), set(['b', 'c']))
+
+    def test_json_responses_compressed_per_accept_encoding(self):
+        compressed_app = fixture.TestApp(app.wsgifunc(lambda wsgi: CompressionMiddleware(wsgi, min_size=1)))
+        url = '{0}/banks/{1}'.format(self.url,
+                                     unquote(str(self._bank.ident)))
+        expected = self.json(self.app.get(url))
+
+        req = compressed_app.get(url, headers={'Accept-Encoding': 'gzip, deflate'})
+        self.ok(req)
+        self.assertEqual(req.header('Content-Encoding'), 'gzip')
+        self.assertEqual(req.header('Vary'), 'Accept-Encoding')
+        self.assertTrue(req.header('ETag').startswith('W/'))
+        self.assertEqual(json.loads(zlib.decompress(req.body, 16 + zlib.MAX_WBITS)), expected)
+
+        req = compressed_app.get(url, headers={'Accept-Encoding': 'gzip;q=0, deflate'})
+        self.ok(req)
+        self.assertEqual(req.header('Content-Encoding'), 'deflate')
+        self.assertEqual(json.loads(zlib.decompress(req.body)), expected)
+
+        req = compressed_app.get(url)
+        self.ok(req)
+        self.assertIsNone(req.header('Content-Encoding', None))
+        self.assertEqual(self.json(req), expected)
+
+    def test_streamed_json_responses_are_compressed(self):
+        compressed_app = fixture.TestApp(app.wsgifunc(lambda wsgi: CompressionMiddleware(wsgi, min_size=1)))
+        url = '{0}/banks/{1}/assessments'.format(self.url,
+                                                 unquote(str(self._bank.ident)))
+        req = compressed_app.get(url, headers={'Accept-Encoding': 'gzip'})
+        self.ok(req)
+        self.assertEqual(req.header('Content-Encoding'), 'gzip')
+        self.assertEqual(json.loads(zlib.decompress(req.body, 16 + zlib.MAX_WBITS)), [])
+
+    def test_small_and_non_json_responses_not_compressed(self):
+        compressed_app = fixture.TestApp(app.wsgifunc(lambda wsgi: CompressionMiddleware(wsgi, min_size=100000)))
+        url = '{0}/banks/{1}'.format(self.url,
+                                     unquote(str(self._bank.ident)))
+        req = compressed_app.get(url, headers={'Accept-Encoding': 'gzip'})
+        self.ok(req)
+        self.assertIsNone(req.header('Content-Encoding', None))
+        self.assertEqual(req.header('Vary'), 'Accept-Encoding')
+        self.assertEqual(self.json(req)['id'], str(self._bank.ident))
+
+        json_headers = [('Content-type', 'application/json')]
+        self.assertTrue(CompressionMiddleware.is_compressible('200 OK', json_headers))
+        self.assertFalse(CompressionMiddleware.is_compressible('206 Partial Content', json_headers))
+        video_headers = [('Content-Type', 'video/mp4'), ('Accept-Ranges', 'bytes')]
+        self.assertFalse(CompressionMiddleware.is_compressible('200 OK', video_headers))
+        self.assertFalse(CompressionMiddleware.is_compressible('200 OK', [('Content-Type', 'text/plain')]))
+
+        self.assertEqual(get_content_coding('deflate, gzip;q=0.5'), 'gzip')
+        self.assertEqual(get_content_coding('*'), 'gzip')
+        self.assertIsNone(get_content_coding('identity'))
+        self.assertIsNone(get_content_coding(''))
+
+    def test_lru_cache_evicts_least_recently_used_by_size(self):
+        cache = utilities.LRUCache(10, size_of=len)
+        self.assertEqual(cache.get('a', lambda: 'aaaa'), 'aaaa')
+        self.assertEqual(cache.get('b', lambda: 'bbbb'), 'bbbb')
+        self.assertEqual(cache.get('a', lambda: 'new'), 'aaaa')
+        cache.get('c', lambda: 'cccc')
+        # 'b' was least recently used
+        self.assertEqual(cache.get('b', lambda: 'new'), 'new')
+        self.assertEqual(cache.stats()['hits'], 1)
+        self.assertLessEqual(cache.stats()['size'], 10)
+
+        # values bigger than the whole cache are not kept
+        cache.get('d', lambda: 'd' * 11)
+        self.assertEqual(cache.get('d', lambda: 'small'), 'small')
+
+        cache.forget(lambda key: key in ('c', 'd'))
+        self.assertEqual(len(cache), 1)
+
+    def test_unshuffled_choices_reordered_without_getting_the_item(self):
+        unrandomized_order = {
+            'choices': {'REGION_1': ['a', 'b', 'c']},
+            'zones': ['z1', 'z2']
+        }
+        item_map = {
+            'question': {
+                'choices': {'REGION_1': [{'id': 'c'}, {'id': 'a'}, {'id': 'b'}]},
+                'zones': [{'id': 'z2'}, {'id': 'z1'}]
+            }
+        }
+        # no bank, so this fails if the item is re-fetched
+        data = autils.update_item_json_random_choices(None, None, json.dumps(item_map), unrandomized_order)
+        question = json.loads(data)['question']
+        self.assertEqual([c['id'] for c in question['choices']['REGION_1']], ['a', 'b', 'c'])
+        self.assertEqual([z['id'] for z in question['zones']], ['z1', 'z2'])
+
+    def test_server_options_default_to_one_worker_on_8080(self):
+        options = get_options([])
+        self.assertEqual(options.address, '')
+        self.assertEqual(options.workers, 1)
+        self.assertEqual(options.threads, 10)
+
+        options = get_options(['127.0.0.1:8888', '--workers', '4', '--threads', '20'])
+        self.assertEqual(options.address, '127.0.0.1:8888')
+        self.assertEqual(options.workers, 4)
+        self.assertEqual(options.threads, 20)
+        self.assertFalse(options.profile_startup)
+        self.assertTrue(get_options(['--profile-startup']).profile_startup)
+
+    def test_startup_profile_resolves_relative_imports(self):
+        package = {'__name__': 'dlkit.runtime', '__path__': []}
+        module = {'__name__': 'dlkit.runtime.managers'}
+        self.assertEqual(startup_profile.get_full_name('json', None, -1), 'json')
+        self.assertEqual(startup_profile.get_full_name('json', module, 0), 'json')
+        self.assertEqual(startup_profile.get_full_name('configs', package, 1), 'dlkit.runtime.configs')
+        self.assertEqual(startup_profile.get_full_name('configs', module, 1), 'dlkit.runtime.configs')
+        self.assertEqual(startup_profile.get_full_name('errors', module, 2), 'dlkit.errors')
+        # implicit relative imports resolve to the package's module, if there is one
+        self.assertEqual(startup_profile.get_full_name('managers', module, -1), 'dlkit.runtime.managers')
+        self.assertEqual(startup_profile.get_full_name('json', module, -1), 'json')
+
 
 class DragAndDropTests(BaseAssessmentTestCase):
     def setUp(self):
@@ -5272,6 +6019,58 @@ class MultipleChoiceAndMWTests(BaseAssessmentTestCase):
         self.assertNotIn('Correct Feedback goes here!', data['feedback'])
         self.assertIn('Wrong...Feedback goes here!', data['feedback'])
 
+    def test_can_submit_a_batch_of_responses(self):
+        mc_item = self.create_mw_sentence_item()
+        taken, offered = self.create_taken_for_item(self._bank.ident, Id(mc_item['id']))
+
+        question_id = self.get_question_id(taken)
+        right_choice_ids = ['id51b2feca-d407-46d5-b548-d6645a021008',
+                            'id881a8e9c-844b-4394-be62-d28a5fda5296',
+                            'idcccac9f8-3b85-4a2f-a95c-1922dec5d04a',
+                            'id28a924d9-32ac-4ac5-a4b2-1b1cfe2caba0',
+                            'id78ce22bf-559f-44a4-95ee-156f222ad510',
+                            'id3045d860-24b4-4b30-9ca1-72408a3bcc9b',
+                            'id2cad48be-2782-4625-9669-dfcb2062bf3c']
+        wrong_choice_ids = list(reversed(right_choice_ids))
+        answer_type = 'answer-type%3Aqti-order-interaction-mw-sentence%40ODL.MIT.EDU'
+        missing_question_id = 'assessment.Item%3A111111111111111111111111%40ODL.MIT.EDU'
+
+        url = '{0}/assessmentstaken/{1}/submit'.format(self.url,
+                                                       unquote(str(taken.ident)))
+        payload = [{
+            'questionId': question_id,
+            'choiceIds': wrong_choice_ids,
+            'type': answer_type
+        }, {
+            'questionId': missing_question_id,
+            'choiceIds': right_choice_ids,
+            'type': answer_type
+        }, {
+            'questionId': question_id,
+            'choiceIds': right_choice_ids,
+            'type': answer_type
+        }]
+        req = self.app.post(url,
+                            params=json.dumps(payload),
+                            headers={'content-type': 'application/json'})
+        self.ok(req)
+        data = self.json(req)
+        self.assertEqual(len(data), 3)
+        self.assertEqual([result['questionId'] for result in data],
+                         [question_id, missing_question_id, question_id])
+        self.assertFalse(data[0]['correct'])
+        self.assertIn('Wrong...Feedback goes here!', data[0]['feedback'])
+        self.assertIn('error', data[1])
+        self.assertNotIn('correct', data[1])
+        self.assertTrue(data[2]['correct'])
+        self.assertIn('Correct Feedback goes here!', data[2]['feedback'])
+
+        self.assertRaises(AppError,
+                          self.app.post,
+                          url,
+                          params=json.dumps({'questionId': question_id}),
+                          headers={'content-type': 'application/json'})
+
     def test_cannot_submit_too_many_choices_even_if_partially_correct_mw_sentence(self):
         mc_item = self.create_mw_sentence_item()
         taken, offered = self.create_taken_for_item(self._bank.ident, Id(mc_item['id']))
@@ -5616,6 +6415,97 @@ class MultipleChoiceAndMWTests(BaseAssessmentTestCase):
         self.assertNotIn('You are correct! A square has the properties of both a rectangle, and a rhombus. Hence, it can also occupy the shaded region.', data['feedback'])
         self.assertIn('Please try again!', data['feedback'])
 
+    def test_answer_keys_compiled_once_per_question(self):
+        mc_item = self.create_mc_multi_select_item()
+        bank = get_managers()['am'].get_bank(self._bank.ident)
+        item = bank.get_item(Id(mc_item['id']))
+        response = {
+            'choiceIds': ['id47e56db8-ee16-4111-9bcc-b8ac9716bcd4',  # swapped order
+                          'idb5345daa-a5c2-4924-a92b-e326886b5d1d',  # swapped order
+                          'id4f525d00-e24c-4ac3-a104-848a2cd686c0'],
+            'type': 'answer-type%3Aqti-choice-interaction-multi-select%40ODL.MIT.EDU'
+        }
+        self.assertTrue(autils.validate_response(response, item))
+        stats = autils.ANSWER_KEY_CACHE.stats()
+        self.assertEqual(stats['misses'], 1)
+
+        response['choiceIds'] = response['choiceIds'][:2]
+        self.assertFalse(autils.validate_response(response, item))
+        response['choiceIds'].append(response['choiceIds'][0])
+        self.assertFalse(autils.validate_response(response, item))
+        self.assertEqual(autils.ANSWER_KEY_CACHE.stats()['misses'], 1)
+        self.assertEqual(autils.ANSWER_KEY_CACHE.stats()['hits'], stats['hits'] + 2)
+
+        # the right and the wrong answers, each with its own key
+        answers, answer_keys = autils.get_answer_keys(item)
+        self.assertEqual([str(answer.ident) for answer in answers],
+                         [str(answer.ident) for answer in autils.get_item_answers(item)])
+        self.assertTrue(len(answers) > len(list(item.get_answers())))
+        self.assertEqual([key.right for key in answer_keys.answers],
+                         [str(answer.genus_type) == str(autils.RIGHT_ANSWER) for answer in answers])
+
+        numeric_item = self.create_item(self._bank.ident)
+        response = {
+            'decimalValue': self.right_answer + self.tolerance / 2,
+            'type': 'answer-record-type%3Anumeric-response-edx%40ODL.MIT.EDU'
+        }
+        self.assertTrue(autils.validate_response(response, numeric_item))
+        response['decimalValue'] = self.right_answer + self.tolerance * 2
+        self.assertFalse(autils.validate_response(response, numeric_item))
+        self.assertEqual(autils.ANSWER_KEY_CACHE.stats()['misses'], 2)
+
+    def test_taken_section_map_includes_responses_and_feedback(self):
+        mc_item = self.create_mc_multi_select_item()
+        taken, offered = self.create_taken_for_item(self._bank.ident, Id(mc_item['id']))
+        url = '{0}/assessmentstaken/{1}/questions/{2}/submit'.format(self.url,
+                                                                     unquote(str(taken.ident)),
+                                                                     unquote(mc_item['id']))
+        payload = {
+            'choiceIds': ['id47e56db8-ee16-4111-9bcc-b8ac9716bcd4',
+                          'id4f525d00-e24c-4ac3-a104-848a2cd686c0'],
+            'type': 'answer-type%3Aqti-choice-interaction-multi-select%40ODL.MIT.EDU'
+        }
+        req = self.app.post(url,
+                            params=json.dumps(payload),
+                            headers={'content-type': 'application/json'})
+        self.ok(req)
+
+        bank = get_managers()['am'].get_bank(self._bank.ident)
+        taken = bank.get_assessment_taken(taken.ident)
+        section_maps = autils.get_taken_section_map(taken, update=True, bank=bank)
+        self.assertEqual(len(section_maps), 1)
+        question = section_maps[0]['questions'][0]
+        self.assertEqual(question['itemId'], mc_item['id'])
+        self.assertTrue(question['responded'])
+        self.assertFalse(question['isCorrect'])
+        self.assertEqual(question['response']['choiceIds'], payload['choiceIds'])
+        self.assertIn('year', question['response']['submissionTime'])
+
+    def test_section_item_lookup_matches_dlkit_internals(self):
+        # get_taken_section_map() looks up a section's items in one query,
+        # through dlkit internals that an upgrade could change.
+        # See autils.SectionItemLookupSession
+        bank = get_managers()['am'].get_bank(self._bank.ident)
+        for item in [self.create_mc_multi_select_item(), self.create_mw_sentence_item()]:
+            taken, offered = self.create_taken_for_item(self._bank.ident, Id(item['id']))
+            section = bank.get_first_assessment_section(taken.ident)
+            question_ids = [question.ident for question in section.get_questions()]
+            expected_maps = [section._get_item(question_id).object_map for question_id in question_ids]
+
+            lookup = autils.SectionItemLookupSession(section)
+            section._item_lookup_session = lookup
+            self.assertIs(section._get_item_lookup_session(), lookup)
+            self.assertEqual(len(lookup._items), len(question_ids))
+            for question_id, expected_map in zip(question_ids, expected_maps):
+                found = section._get_item(question_id)
+                self.assertTrue(any(found is batched for batched in lookup._items.values()))
+                self.assertEqual(found.object_map, expected_map)
+
+        # and autils.get_item_solution() finds solutions like dlkit does
+        source = inspect.getsource(ReviewOptionsAssessmentTakenRecord.get_solution_for_question)
+        self.assertIn("item_map['solution']", source)
+        self.assertIn("item_map['texts']['solution']", source)
+
     def test_cannot_submit_too_many_choices_even_if_partially_correct_mc_multi_select(self):
         mc_item = self.create_mc_multi_select_item()
         taken, offered = self.create_taken_for_item(self._bank.ident, Id(mc_item['id']))
@@ -8400,6 +9290,22 @@ class FileUploadTests(BaseAssessmentTestCase):
         self.assertTrue(data['correct'])
         self.assertIn('<p/>', data['feedback'])
 
+    def test_batch_submit_needs_a_file_for_mw_sandbox(self):
+        sandbox = self.create_mw_sandbox_item()
+        self._taken, self._offered, self._assessment = self.create_taken_for_item(self._bank.ident, utilities.clean_id(sandbox['id']))
+
+        question_id = self.get_question_id(self._taken)
+
+        url = '{0}/assessmentstaken/{1}/submit'.format(self.url,
+                                                       unquote(str(self._taken.ident)))
+        req = self.app.post(url,
+                            params=json.dumps([{'questionId': question_id}]),
+                            headers={'content-type': 'application/json'})
+        self.ok(req)
+        data = self.json(req)
+        self.assertEqual(len(data), 1)
+        self.assertIn('You must supply a file', data[0]['error'])
+
 
 class ExtendedTextInteractionTests(BaseAssessmentTestCase):
     @staticmethod
@@ -9429,6 +10335,42 @@ class MultiLanguageTests(BaseAssessmentTestCase):
         data = self.json(req)
         self.assertEqual(len(data), 0)
 
+    def test_item_search_is_kept_current(self):
+        item = self.create_mc_feedback_item()
+        url = '{0}/items?displayNames={1}'.format(self.url,
+                                                  quote(self._hindi_text.encode('utf8')))
+        req = self.app.get(url)
+        self.ok(req)
+        self.assertEqual(len(self.json(req)), 0)
+
+        item_url = '{0}/items/{1}'.format(self.url,
+                                          unquote(item['id']))
+        req = self.app.put(item_url,
+                           params=json.dumps({'name': self._hindi_text}),
+                           headers=self._hindi_headers())
+        self.ok(req)
+
+        req = self.app.get(url)
+        self.ok(req)
+        data = self.json(req)
+        self.assertEqual(len(data), 1)
+        self.assertEqual(data[0]['id'], item['id'])
+
+        # any part of the other names matches, too
+        url = '{0}/items?displayName=L01A04'.format(self.url)
+        req = self.app.get(url)
+        self.ok(req)
+        data = self.json(req)
+        self.assertEqual(len(data), 1)
+        self.assertEqual(data[0]['id'], item['id'])
+
+        req = self.app.delete(item_url)
+        self.ok(req)
+
+        req = self.app.get(url)
+        self.ok(req)
+        self.assertEqual(len(self.json(req)), 0)
+
     def test_can_set_multiple_answer_feedbacks(self):
         item = self.create_mc_multi_select_item()
         url = '{0}/items/{1}'.format(self.url,
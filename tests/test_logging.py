@@ -1,3 +1,4 @@
+import base64
 import json
 
 from copy import deepcopy
@@ -7,6 +8,7 @@ from dlkit.runtime.primordium import Id
 from paste.fixture import AppError
 
 from urllib import quote
+from urlparse import urlparse
 
 from testing_utilities import BaseTestCase, get_managers, get_fixture_bank
 
@@ -346,6 +348,37 @@ class LogEntryCrUDTests(BaseLoggingTestCase):
             'foo'
         )
 
+    def test_can_page_through_log_entries(self):
+        for text in ['foo', 'bar', 'baz']:
+            self.setup_entry(self.log.ident, text)
+
+        req = self.app.get(self.url + '?limit=2')
+        self.ok(req)
+        page = self.json(req)
+        self.assertEqual(len(page['data']), 2)
+        self.assertIn('cursor=', page['next'])
+        self.assertIn('limit=2', page['next'])
+        texts = [entry['text']['text'] for entry in page['data']]
+
+        next_url = urlparse(page['next'])
+        req = self.app.get('{0}?{1}'.format(next_url.path, next_url.query))
+        self.ok(req)
+        page = self.json(req)
+        self.assertEqual(len(page['data']), 1)
+        self.assertIsNone(page['next'])
+        texts += [entry['text']['text'] for entry in page['data']]
+        self.assertEqual(sorted(texts), ['bar', 'baz', 'foo'])
+
+    def test_invalid_page_limit_throws_exception(self):
+        req = self.app.get(self.url + '?limit=0', expect_errors=True)
+        self.code(req, 500)
+
+    def test_negative_page_cursor_throws_exception(self):
+        cursor = base64.urlsafe_b64encode(json.dumps({'offset': -1}))
+        req = self.app.get(self.url + '?limit=2&cursor=' + cursor, expect_errors=True)
+        self.code(req, 500)
+        self.assertIn('invalid cursor', req.body)
+
     def test_can_create_log_entry(self):
         self.num_entries(0)
         payload = {
@@ -1,7 +1,12 @@
 # -*- coding: utf-8 -*-
 import json
+import os
+import time
+import zipfile
 from bs4 import BeautifulSoup, Tag
 
+from cStringIO import StringIO
+
 from urllib import unquote, quote
 
 from .test_assessment import BaseAssessmentTestCase, _stringify, ABS_PATH,\
@@ -40,6 +45,10 @@ from .test_assessment import BaseAssessmentTestCase, _stringify, ABS_PATH,\
     QTI_QUESTION_ORDER_INTERACTION_MW_SENTENCE_GENUS,\
     QTI_QUESTION_ORDER_INTERACTION_OBJECT_MANIPULATION_GENUS
 
+from assessment import assessment_utilities as autils
+
+from dlkit.runtime.primordium import Id
+
 from testing_utilities import get_managers, get_valid_contents
 
 import utilities
@@ -118,6 +127,29 @@ class QTIEndpointTests(BaseAssessmentTestCase):
         taken = bank.create_assessment_taken(form)
         return taken, new_offered, new_assessment
 
+    def edited_qti_package(self, qti_file):
+        """qti_file's package with a change to its item, but the same QTI identifier"""
+        qti_file.seek(0)
+        edited = StringIO()
+        with zipfile.ZipFile(qti_file) as original, zipfile.ZipFile(edited, 'w') as package:
+            for name in original.namelist():
+                data = original.read(name)
+                if name.endswith('.xml') and name != 'imsmanifest.xml':
+                    data = data.replace('</assessmentItem>', '<!-- edited --></assessmentItem>')
+                package.writestr(name, data)
+        return edited.getvalue()
+
+    def wait_for_import(self, job):
+        url = '{0}/itemimports/{1}'.format(self.url, job['id'])
+        for i in range(0, 600):
+            req = self.app.get(url)
+            self.ok(req)
+            job = self.json(req)
+            if job['status'] in ['complete', 'failed']:
+                break
+            time.sleep(0.1)
+        return job
+
     def setUp(self):
         super(QTIEndpointTests, self).setUp()
 
@@ -995,7 +1027,145 @@ class QTIEndpointTests(BaseAssessmentTestCase):
         self.assertTrue(item.responseDeclaration)
         self.assertTrue(item.responseProcessing)
 
-    def test_uploading_same_qti_item_id_sets_provenance(self):
+    def test_can_bulk_import_qti_packages(self):
+        self._test_file2.seek(0)
+        self._mw_sentence_test_file.seek(0)
+        # parse in the process pool, like a served worker does
+        autils.start_qti_import_pool()
+        try:
+            req = self.app.post('{0}/itemimports'.format(self.url),
+                                upload_files=[('qtiFiles', 'choice.zip', self._test_file2.read()),
+                                              ('qtiFiles', 'mw_sentence.zip', self._mw_sentence_test_file.read())])
+            self.code(req, 202)
+            job = self.json(req)
+            self.assertEqual(job['fileNames'], ['choice.zip', 'mw_sentence.zip'])
+            self.assertEqual(job['bankId'], str(self._bank.ident))
+
+            job = self.wait_for_import(job)
+        finally:
+            autils.stop_qti_import_pool()
+        self.assertEqual(job['status'], 'complete')
+        self.assertEqual(job['total'], 2)
+        self.assertEqual(job['processed'], 2)
+        self.assertEqual(job['errors'], [])
+        self.assertEqual(len(job['itemIds']), 2)
+
+        req = self.app.get('{0}/items'.format(self.url))
+        self.ok(req)
+        item_ids = [item['id'] for item in self.json(req)]
+        for item_id in job['itemIds']:
+            self.assertIn(item_id, item_ids)
+
+        # imported the same way as single uploads
+        req = self.app.get('{0}/items/{1}'.format(self.url, job['itemIds'][1]))
+        self.ok(req)
+        item = self.json(req)
+        self.assertEqual(item['genusTypeId'], str(QTI_ITEM_ORDER_INTERACTION_MW_SENTENCE_GENUS))
+        self.assertEqual(len(item['question']['fileIds']), 2)
+
+    def test_bulk_import_accepts_zip_of_packages_and_reports_errors(self):
+        self._test_file2.seek(0)
+        self._mc_feedback_test_file.seek(0)
+        bundle = StringIO()
+        with zipfile.ZipFile(bundle, 'w') as bundle_zip:
+            bundle_zip.writestr('unit1/choice.zip', self._test_file2.read())
+            bundle_zip.writestr('unit1/broken.zip', 'not a zip')
+            bundle_zip.writestr('unit1/feedback.zip', self._mc_feedback_test_file.read())
+        req = self.app.post('{0}/itemimports'.format(self.url),
+                            upload_files=[('qtiFiles', 'unit1.zip', bundle.getvalue()),
+                                          ('qtiFiles', 'notes.txt', 'not a zip either')])
+        self.code(req, 202)
+
+        job = self.wait_for_import(self.json(req))
+        self.assertEqual(job['status'], 'complete')
+        self.assertEqual(job['total'], 3)
+        self.assertEqual(job['processed'], 3)
+        self.assertEqual(len(job['itemIds']), 2)
+        self.assertEqual([e['fileName'] for e in job['errors']],
+                         ['notes.txt', 'unit1.zip/unit1/broken.zip'])
+
+    def test_bulk_import_needs_qti_files(self):
+        req = self.app.post('{0}/itemimports'.format(self.url),
+                            expect_errors=True)
+        self.code(req, 500)
+
+        url = '{0}/itemimports/{1}'.format(self.url, '0' * 32)
+        req = self.app.get(url, expect_errors=True)
+        self.code(req, 500)
+
+    def test_finished_and_abandoned_import_jobs_expire(self):
+        self._test_file2.seek(0)
+        data = self._test_file2.read()
+        req = self.app.post('{0}/itemimports'.format(self.url),
+                            upload_files=[('qtiFiles', 'choice.zip', data)])
+        self.code(req, 202)
+        old_job = self.wait_for_import(self.json(req))
+        self.assertEqual(old_job['status'], 'complete')
+
+        # and the uploads of a job whose worker stopped mid-job
+        abandoned_path = os.path.join(autils.QTI_IMPORT_JOBS_PATH, '1' * 32)
+        os.makedirs(abandoned_path)
+        expired = time.time() - autils.QTI_IMPORT_JOB_TTL - 1
+        os.utime(os.path.join(autils.QTI_IMPORT_JOBS_PATH, '{0}.json'.format(old_job['id'])),
+                 (expired, expired))
+        os.utime(abandoned_path, (expired, expired))
+
+        req = self.app.post('{0}/itemimports'.format(self.url),
+                            upload_files=[('qtiFiles', 'choice.zip', data)])
+        self.code(req, 202)
+        job = self.wait_for_import(self.json(req))
+        self.assertEqual(job['status'], 'complete')
+
+        self.assertFalse(os.path.exists(abandoned_path))
+        req = self.app.get('{0}/itemimports/{1}'.format(self.url, old_job['id']),
+                           expect_errors=True)
+        self.code(req, 500)
+
+    def test_qti_package_media_is_only_read_when_stored(self):
+        opened = []
+
+        class SpyZipFile(zipfile.ZipFile):
+            def open(self, name, *args, **kwargs):
+                opened.append(name)
+                return zipfile.ZipFile.open(self, name, *args, **kwargs)
+
+        self._audio_recording_test_file.seek(0)
+        qti_zip = SpyZipFile(self._audio_recording_test_file)
+        package = autils.read_qti_package(qti_zip)
+        self.assertEqual(package['mediaNames'], ['media/audioTestFile_.mp3'])
+        self.assertEqual(package['keywords'], ['AudioRT'])
+        self.assertEqual(package['learningObjective'], 'Grade 8.3')
+        self.assertFalse(package['numericResponse'])
+        self.assertNotIn('media/audioTestFile_.mp3', opened)
+
+        media_files = autils.get_qti_media_files(qti_zip, package['mediaNames'])
+        self.assertNotIn('media/audioTestFile_.mp3', opened)
+        media_file = media_files['audioTestFile__mp3']
+        data = qti_zip.read('media/audioTestFile_.mp3')
+        self.assertEqual(media_file.read(), data)
+        media_file.seek(0)
+        self.assertEqual(media_file.read(1024), data[:1024])
+
+    def test_revised_qti_media_is_stored_once(self):
+        url = '{0}/items'.format(self.url)
+        self._test_file2.seek(0)
+        req = self.app.post(url,
+                            upload_files=[('qtiFile', 'testFile', self._test_file2.read())])
+        self.ok(req)
+        item = self.json(req)
+
+        req = self.app.post(url,
+                            upload_files=[('qtiFile', 'testFile', self.edited_qti_package(self._test_file2))])
+        self.ok(req)
+        item2 = self.json(req)
+
+        self.assertEqual(item2['provenanceId'], item['id'])
+        file_ids = item['question']['fileIds']
+        self.assertTrue(len(file_ids) > 0)
+        self.assertEqual(item2['question']['fileIds'], file_ids)
+        self.assertEqual(len(set(f['assetId'] for f in file_ids.values())), len(file_ids))
+
+    def test_uploading_identical_qti_package_returns_existing_item(self):
         url = '{0}/items'.format(self.url)
         self._test_file2.seek(0)
         req = self.app.post(url,
@@ -1009,6 +1179,58 @@ class QTIEndpointTests(BaseAssessmentTestCase):
         self.ok(req)
         item2 = self.json(req)
 
+        self.assertEqual(item2['id'], item['id'])
+        self.assertEqual(item2['provenanceId'], '')
+        self.assertEqual(item2['question']['fileIds'], item['question']['fileIds'])
+
+        req = self.app.get('/api/v1/assessment/banks')
+        self.ok(req)
+        self.assertEqual(len(self.json(req)), 1)
+
+        # a revision is still a new item
+        req = self.app.post(url,
+                            upload_files=[('qtiFile', 'testFile', self.edited_qti_package(self._test_file2))])
+        self.ok(req)
+        item3 = self.json(req)
+        self.assertNotEqual(item3['id'], item['id'])
+        self.assertEqual(item3['provenanceId'], item['id'])
+
+    def test_reuploading_qti_package_after_editing_its_item_imports_it(self):
+        url = '{0}/items'.format(self.url)
+        self._test_file2.seek(0)
+        req = self.app.post(url,
+                            upload_files=[('qtiFile', 'testFile', self._test_file2.read())])
+        self.ok(req)
+        item = self.json(req)
+
+        req = self.app.put('{0}/{1}'.format(url, item['id']),
+                           params=json.dumps({'name': 'an edited item'}),
+                           headers={'content-type': 'application/json'})
+        self.ok(req)
+
+        # to restore the original
+        self._test_file2.seek(0)
+        req = self.app.post(url,
+                            upload_files=[('qtiFile', 'testFile', self._test_file2.read())])
+        self.ok(req)
+        item2 = self.json(req)
+        self.assertNotEqual(item2['id'], item['id'])
+        self.assertEqual(item2['provenanceId'], item['id'])
+        self.assertEqual(item2['displayName']['text'], item['displayName']['text'])
+
+    def test_uploading_same_qti_item_id_sets_provenance(self):
+        url = '{0}/items'.format(self.url)
+        self._test_file2.seek(0)
+        req = self.app.post(url,
+                            upload_files=[('qtiFile', 'testFile', self._test_file2.read())])
+        self.ok(req)
+        item = self.json(req)
+
+        req = self.app.post(url,
+                            upload_files=[('qtiFile', 'testFile', self.edited_qti_package(self._test_file2))])
+        self.ok(req)
+        item2 = self.json(req)
+
         self.assertNotEqual(item['id'], item2['id'])
         self.assertEqual(item['provenanceId'], '')
         self.assertEqual(item2['provenanceId'], item['id'])
@@ -1028,9 +1250,8 @@ class QTIEndpointTests(BaseAssessmentTestCase):
         banks = self.json(req)
         self.assertEqual(len(banks), 1)
 
-        self._test_file2.seek(0)
         req = self.app.post(url,
-                            upload_files=[('qtiFile', 'testFile', self._test_file2.read())])
+                            upload_files=[('qtiFile', 'testFile', self.edited_qti_package(self._test_file2))])
         self.ok(req)
         item2 = self.json(req)
 
@@ -1075,9 +1296,8 @@ class QTIEndpointTests(BaseAssessmentTestCase):
         banks = self.json(req)
         self.assertEqual(len(banks), 1)
 
-        self._test_file2.seek(0)
         req = self.app.post(url,
-                            upload_files=[('qtiFile', 'testFile', self._test_file2.read())])
+                            upload_files=[('qtiFile', 'testFile', self.edited_qti_package(self._test_file2))])
         self.ok(req)
         item2 = self.json(req)
 
@@ -1134,6 +1354,66 @@ class QTIEndpointTests(BaseAssessmentTestCase):
         item_ids = [i['id'] for i in items]
         self.assertIn(item3['id'], item_ids)
 
+    def test_archiving_replaces_a_missing_cached_archive_bank(self):
+        archive_name = autils.archive_bank_names(self._bank.ident)
+        autils.ARCHIVE_BANK_IDS[archive_name] = Id(identifier='111111111111111111111111',
+                                                   namespace=self._bank.ident.namespace,
+                                                   authority=self._bank.ident.authority)
+
+        url = '{0}/items'.format(self.url)
+        self._test_file2.seek(0)
+        req = self.app.post(url,
+                            upload_files=[('qtiFile', 'testFile', self._test_file2.read())])
+        self.ok(req)
+        item = self.json(req)
+
+        req = self.app.post(url,
+                            upload_files=[('qtiFile', 'testFile', self.edited_qti_package(self._test_file2))])
+        self.ok(req)
+
+        req = self.app.get('/api/v1/assessment/banks')
+        self.ok(req)
+        banks = self.json(req)
+        self.assertEqual(len(banks), 2)
+        archive_bank = [b for b in banks if 'archive' in b['genusTypeId']][0]
+        self.assertEqual(str(autils.ARCHIVE_BANK_IDS[archive_name]), archive_bank['id'])
+
+        req = self.app.get('/api/v1/assessment/banks/{0}/items'.format(archive_bank['id']))
+        self.ok(req)
+        items = self.json(req)
+        self.assertEqual(len(items), 1)
+        self.assertEqual(items[0]['id'], item['id'])
+
+    def test_item_details_are_routed_to_the_archive_bank(self):
+        url = '{0}/items'.format(self.url)
+        self._test_file2.seek(0)
+        req = self.app.post(url,
+                            upload_files=[('qtiFile', 'testFile', self._test_file2.read())])
+        self.ok(req)
+        item = self.json(req)
+
+        item_url = '{0}/{1}'.format(url, unquote(item['id']))
+        req = self.app.get(item_url)
+        self.ok(req)
+        self.assertEqual(self.json(req)['assignedBankIds'], [str(self._bank.ident)])
+        misses = autils.BANK_ROUTES.stats()['misses']
+
+        req = self.app.get(item_url + '/qti')
+        self.ok(req)
+        self.assertEqual(autils.BANK_ROUTES.stats()['misses'], misses)
+
+        req = self.app.post(url,
+                            upload_files=[('qtiFile', 'testFile', self.edited_qti_package(self._test_file2))])
+        self.ok(req)
+
+        req = self.app.get(item_url)
+        self.ok(req)
+        data = self.json(req)
+        self.assertEqual(data['id'], item['id'])
+        self.assertEqual(len(data['assignedBankIds']), 1)
+        self.assertNotEqual(data['assignedBankIds'][0], str(self._bank.ident))
+        self.assertEqual(autils.BANK_ROUTES.stats()['misses'], misses + 1)
+
     def test_feedback_gets_set_on_qti_mc_upload(self):
         url = '{0}/items'.format(self.url)
         self._mc_feedback_test_file.seek(0)
@@ -1283,6 +1563,28 @@ class QTIEndpointTests(BaseAssessmentTestCase):
             ['learning.Objective%3AGrade 9.B2%40CLIX.TISS.EDU']
         )
 
+    def test_can_query_items_by_learning_objective(self):
+        url = '{0}/items'.format(self.url)
+        self._mw_sandbox_test_file.seek(0)
+        req = self.app.post(url,
+                            upload_files=[('qtiFile', 'testFile', self._mw_sandbox_test_file.read())])
+        self.ok(req)
+        item = self.json(req)
+
+        url = '{0}/items?learningObjectiveId={1}'.format(self.url,
+                                                         quote('learning.Objective:Grade 9.B2@CLIX.TISS.EDU'))
+        req = self.app.get(url)
+        self.ok(req)
+        data = self.json(req)
+        self.assertEqual(len(data), 1)
+        self.assertEqual(data[0]['id'], item['id'])
+
+        url = '{0}/items?learningObjectiveId={1}'.format(self.url,
+                                                         quote('learning.Objective:Grade 9@CLIX.TISS.EDU'))
+        req = self.app.get(url)
+        self.ok(req)
+        self.assertEqual(len(self.json(req)), 0)
+
     def test_can_upload_mw_sandbox_qti_file(self):
         url = '{0}/items'.format(self.url)
         self._mw_sandbox_test_file.seek(0)
@@ -1171,6 +1171,63 @@ class AssetCRUDTests(BaseRepositoryTestCase):
             new_name
         )
 
+    def test_asset_get_returns_not_modified_for_matching_etag(self):
+        self._video_upload_test_file.seek(0)
+        req = self.app.post(self.url,
+                            upload_files=[('inputFile', 'video-js-test.mp4', self._video_upload_test_file.read())])
+        self.ok(req)
+        url = '{0}/{1}'.format(self.url,
+                               self.json(req)['id'])
+
+        req = self.app.get(url)
+        self.ok(req)
+        etag = req.header('ETag')
+
+        req = self.app.get(url,
+                           headers={'If-None-Match': etag})
+        self.code(req, 304)
+        self.assertEqual(req.body, '')
+
+        # ?fullUrls is a different representation
+        req = self.app.get(url + '?fullUrls',
+                           headers={'If-None-Match': etag})
+        self.ok(req)
+
+        payload = {
+            "displayName": "foobar"
+        }
+        req = self.app.put(url,
+                           params=json.dumps(payload),
+                           headers={'content-type': 'application/json'})
+        self.ok(req)
+
+        req = self.app.get(url,
+                           headers={'If-None-Match': etag})
+        self.ok(req)
+        self.assertEqual(self.json(req)['displayName']['text'], 'foobar')
+
+    def test_asset_etag_changes_when_source_is_renamed(self):
+        data = self.upload_asset_with_source()
+        url = '{0}/{1}'.format(self.url,
+                               data['id'])
+        req = self.app.get(url)
+        self.ok(req)
+        etag = req.header('ETag')
+
+        resm = get_managers()['resm']
+        rls = resm.get_resource_lookup_session(proxy=resm._proxy)
+        rls.use_federated_bin_view()
+        resource = rls.get_resource(Id(data['sourceId']))
+        bin_ = resm.get_bin(Id(resource._my_map['assignedBinIds'][0]))
+        form = bin_.get_resource_form_for_update(resource.ident)
+        form.display_name = 'Jane Doe, (c) 2017'
+        bin_.update_resource(form)
+
+        req = self.app.get(url,
+                           headers={'If-None-Match': etag})
+        self.ok(req)
+        self.assertEqual(self.json(req)['source']['text'], 'Jane Doe, (c) 2017')
+
     def test_can_update_asset_description(self):
         self._video_upload_test_file.seek(0)
         req = self.app.post(self.url,
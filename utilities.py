@@ -1,17 +1,34 @@
+import base64
+import fcntl
 import functools
+import hashlib
+import itertools
 import json
+import threading
+import time
 import traceback
+import uuid
 import web
 import os
 
-from urllib import quote
+from collections import OrderedDict
+from urllib import quote, urlencode
+from urlparse import parse_qsl
 
 from dlkit.json_ import types
 
+from dlkit.runtime import PROXY_SESSION, RUNTIME
 from dlkit.runtime.errors import PermissionDenied, IllegalState,\
-    OperationFailed
+    OperationFailed, InvalidArgument
 from dlkit.runtime.primitives import InitializableLocale
 from dlkit.runtime.primordium import Id, Type, DisplayText
+from dlkit.runtime.proxy_example import SimpleRequest
+
+try:
+    # optional, faster JSON encoder for responses
+    import ujson
+except ImportError:
+    ujson = None
 
 DEFAULT_LANGUAGE_TYPE = Type(**types.Language().get_type_data('DEFAULT'))
 DEFAULT_SCRIPT_TYPE = Type(**types.Script().get_type_data('DEFAULT'))
@@ -20,6 +37,18 @@ DEFAULT_FORMAT_TYPE = Type(**types.Format().get_type_data('DEFAULT'))
 
 CORS_HEADERS = "Content-Type,Authorization,X-Api-Proxy,X-Api-Key,request-line,X-Api-Locale"
 
+DEFAULT_PROXY_USERNAME = 'student@tiss.edu'
+# used by to_json(); set to any dumps-like function, or None for json.dumps
+JSON_ENCODER = None
+if ujson is not None:
+    JSON_ENCODER = functools.partial(ujson.dumps,
+                                     double_precision=15,
+                                     escape_forward_slashes=False)
+MANAGER_POOL_SIZE = 256  # per process, shared by all its server threads
+# seconds a pooled manager is used for, so that authz changes (and the
+# managers' caches) are picked up without a restart. 0 = not pooled
+MANAGER_POOL_TTL = int(os.environ.get('QBANK_MANAGER_POOL_TTL', 300))
+
 
 class BaseClass:
     def OPTIONS(self, *args, **kwargs):
@@ -48,6 +77,429 @@ class BaseClass:
         return url_data
 
 
+class LRUCache(object):
+    """thread-safe LRU cache, bounded by the total size of its values.
+    size_of(value) measures each value, i.e. len for strings.
+    By default each value counts as 1, so max_size is a number of entries
+    """
+    def __init__(self, max_size, size_of=None):
+        self.max_size = max_size
+        self.size_of = size_of or (lambda value: 1)
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (value, size)
+        self._lock = threading.Lock()
+        self._size = 0
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+            self.hits = 0
+            self.misses = 0
+
+    def forget(self, matches):
+        """drop every entry whose key matches, i.e. after a write"""
+        with self._lock:
+            for key in [k for k in self._entries if matches(k)]:
+                self._size -= self._entries.pop(key)[1]
+
+    def get(self, key, factory):
+        """return the cached value for key, calling factory() to build it
+        on a miss. Like ManagerPool, the value is built outside of the lock"""
+        with self._lock:
+            if key in self._entries:
+                entry = self._entries.pop(key)
+                self._entries[key] = entry  # most recently used goes last
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        value = factory()
+        size = self.size_of(value)
+        if size > self.max_size:
+            return value
+
+        with self._lock:
+            if key in self._entries:
+                self._size -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size)
+            self._size += size
+            while self._size > self.max_size:
+                self._size -= self._entries.popitem(last=False)[1][1]
+        return value
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'size': self._size,
+                'maxSize': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+
+class ManagerPool(object):
+    """thread-safe, bounded LRU cache of service managers.
+    Entries are keyed by (server thread, username, locale), and each
+    entry holds one manager per service name, i.e. 'ASSESSMENT' or
+    'LOGGING'. dlkit managers, and the sessions and caches they hold,
+    are not thread-safe, so a manager is only ever used by the thread
+    that built it, one request at a time. Managers are re-built once
+    they are ttl seconds old
+    """
+    def __init__(self, max_size=MANAGER_POOL_SIZE, ttl=MANAGER_POOL_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def get(self, key, service_name, factory):
+        """return the pooled manager for key + service_name, calling
+        factory() to build it on a miss. The manager is built outside of
+        the lock, so a slow build does not block other users."""
+        key = (threading.current_thread().ident, key)
+        with self._lock:
+            try:
+                managers = self._entries.pop(key)
+            except KeyError:
+                managers = {}
+            self._entries[key] = managers  # most recently used goes last
+            if service_name in managers:
+                manager, created = managers[service_name]
+                if time.time() - created < self.ttl:
+                    self.hits += 1
+                    return manager
+                del managers[service_name]
+            self.misses += 1
+
+        manager = factory()
+        created = time.time()
+
+        with self._lock:
+            managers = self._entries.pop(key, managers)
+            manager = managers.setdefault(service_name, (manager, created))[0]
+            self._entries[key] = managers
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return manager
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'maxSize': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+
+MANAGER_POOL = ManagerPool()
+
+
+class SearchIndex(object):
+    """thread-safe, in-memory inverted index of object ids, by field.
+    Text fields are lowercased and indexed by each of their substrings of
+    up to GRAM_SIZE characters, so a search matches any part of the text,
+    like the datastore's case-insensitive regex did, but only compares the
+    text of objects that have all of its grams. Other fields only match
+    exactly. Call add() / remove() after each write. Each scope, i.e. a
+    bank, is loaded from the datastore the first time it is searched.
+    With journal_path, the server worker processes share their writes:
+    each write is appended to that file, and a process applies the other
+    processes' writes before it loads a scope. Once the journal is over
+    max_journal_size it is started over, and only then do the other
+    processes forget what they loaded
+    """
+    GRAM_SIZE = 3
+
+    def __init__(self, text_fields=(), journal_path=None, max_journal_size=4 * 1024 * 1024):
+        self.text_fields = text_fields
+        self.journal_path = journal_path
+        self.max_journal_size = max_journal_size
+        self._documents = {}  # object id -> {field: set of terms}
+        self._postings = {}  # field -> {term, or gram for text fields: set of object ids}
+        self._scopes = set()
+        self._journal = None  # the journal's first line, which names it
+        self._offset = 0  # how much of the journal has been applied
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._documents)
+
+    def _add(self, object_id, fields):
+        self._remove(object_id)
+        document = {}
+        for field, values in fields.items():
+            document[field] = self._get_terms(field, values)
+            postings = self._postings.setdefault(field, {})
+            for key in self._get_keys(field, document[field]):
+                postings.setdefault(key, set()).add(object_id)
+        self._documents[object_id] = document
+
+    def _apply(self, entry):
+        """apply a journal entry, see add(), remove() and forget_scopes()"""
+        if entry[0] == 'add':
+            self._add(entry[1], entry[2])
+        elif entry[0] == 'remove':
+            self._remove(entry[1])
+        else:
+            self._scopes.clear()
+
+    def _clear(self):
+        self._documents.clear()
+        self._postings.clear()
+        self._scopes.clear()
+
+    def _get_grams(self, text, sizes):
+        grams = set()
+        for size in sizes:
+            for start in range(len(text) - size + 1):
+                grams.add(text[start:start + size])
+        return grams
+
+    def _get_keys(self, field, terms):
+        """the postings keys of a field's terms"""
+        if field not in self.text_fields:
+            return terms
+        keys = set()
+        for term in terms:
+            keys.update(self._get_grams(term, range(1, self.GRAM_SIZE + 1)))
+        return keys
+
+    def _get_terms(self, field, values):
+        terms = set()
+        for value in values:
+            value = self._normalize(field, value)
+            if value:
+                terms.add(value)
+        return terms
+
+    def _normalize(self, field, value):
+        if isinstance(value, str):
+            value = value.decode('utf8')
+        else:
+            value = unicode(value)
+        if field in self.text_fields:
+            value = value.strip().lower()
+        return value
+
+    def _read_entries(self, start, end):
+        if start >= end:
+            return []
+        with open(self.journal_path, 'rb') as journal_file:
+            journal_file.seek(start)
+            return [json.loads(line) for line in journal_file.read(end - start).splitlines()]
+
+    def _remove(self, object_id):
+        for field, terms in self._documents.pop(object_id, {}).items():
+            postings = self._postings[field]
+            for key in self._get_keys(field, terms):
+                postings[key].discard(object_id)
+                if not postings[key]:
+                    del postings[key]
+
+    def _reset(self):
+        """forget everything, and where this process is in the journal"""
+        self._clear()
+        self._journal = None
+        self._offset = 0
+
+    def _sync(self):
+        """apply what the other processes appended to the journal since
+        this one last looked. Call with the lock held"""
+        if self.journal_path is None:
+            return
+        try:
+            with open(self.journal_path, 'rb') as journal_file:
+                journal = journal_file.readline()
+                if journal != self._journal:
+                    # started over, so this process may have missed writes
+                    self._clear()
+                    self._journal = journal
+                    self._offset = len(journal)
+                journal_file.seek(self._offset)
+                data = journal_file.read()
+        except IOError:
+            if self._journal is not None:
+                # removed, so this process may have missed writes
+                self._reset()
+            return
+        # a writer may be half-way through appending the last entry
+        data = data[:data.rfind('\n') + 1]
+        for line in data.splitlines():
+            self._apply(json.loads(line))
+        self._offset += len(data)
+
+    def _write(self, entry):
+        """apply entry and append it to the journal, locked across threads
+        and server worker processes"""
+        with self._lock:
+            if self.journal_path is None:
+                self._apply(entry)
+                return
+            makedirs(os.path.dirname(self.journal_path))
+            with open(self.journal_path + '.lock', 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    self._sync()
+                    line = json.dumps(entry) + '\n'
+                    if self._journal is None or self._offset + len(line) > self.max_journal_size:
+                        # this process has applied every write, so it keeps its index
+                        self._journal = '{0}\n'.format(uuid.uuid4().hex)
+                        self._offset = len(self._journal)
+                        save_file(self.journal_path, self._journal)
+                    with open(self.journal_path, 'ab') as journal_file:
+                        journal_file.write(line)
+                    self._apply(entry)
+                    self._offset += len(line)
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def add(self, object_id, fields):
+        """(re-)index object_id, fields is {field: list of values}"""
+        self._write(['add', object_id, fields])
+
+    def clear(self):
+        with self._lock:
+            self._reset()
+
+    def forget_scopes(self):
+        """re-load each scope on its next search, in every process, i.e.
+        after the bank hierarchy changes"""
+        self._write(['forget_scopes'])
+
+    def load(self, scope, get_documents):
+        """index get_documents(), (object id, fields) pairs, if scope
+        has not been loaded yet"""
+        with self._lock:
+            self._sync()
+            if scope in self._scopes:
+                return
+            journal, offset = self._journal, self._offset
+        documents = list(get_documents())
+        with self._lock:
+            self._sync()
+            for object_id, fields in documents:
+                self._add(object_id, fields)
+            if self._journal != journal:
+                return  # started over meanwhile, so load it again next time
+            # the documents may predate the writes since, so apply them again
+            entries = self._read_entries(offset, self._offset)
+            for entry in entries:
+                self._apply(entry)
+            if ['forget_scopes'] not in entries:
+                self._scopes.add(scope)
+
+    def remove(self, object_id):
+        self._write(['remove', object_id])
+
+    def search(self, criteria):
+        """ids of the objects that match all of criteria, (field, value)
+        pairs. load() the scope first"""
+        with self._lock:
+            matches = None
+            for field, value in criteria:
+                value = self._normalize(field, value)
+                postings = self._postings.get(field, {})
+                if field in self.text_fields and len(value) > self.GRAM_SIZE:
+                    grams = sorted([postings.get(gram, set()) for gram in self._get_grams(value, [self.GRAM_SIZE])],
+                                   key=len)
+                    object_ids = set(object_id for object_id in set.intersection(*grams)
+                                     if any(value in term for term in self._documents[object_id][field]))
+                elif field in self.text_fields and not value:
+                    object_ids = set(object_id for object_id, document in self._documents.items()
+                                     if document.get(field))
+                else:
+                    object_ids = postings.get(value, set())
+                matches = object_ids if matches is None else matches & object_ids
+            return set(matches or ())
+
+
+class RequestContext(object):
+    """per-request state, parsed once from the request headers.
+    Each service manager is handed out at most once per request.
+    With pooled=False, the managers are built for this context only,
+    instead of coming from MANAGER_POOL, i.e. for background threads"""
+    def __init__(self, env, pooled=True):
+        self.pooled = pooled
+        self.username = env.get('HTTP_X_API_PROXY', DEFAULT_PROXY_USERNAME)
+        self.language_code = None
+        self.locale = None
+        if 'HTTP_X_API_LOCALE' in env:
+            self.language_code = env['HTTP_X_API_LOCALE'].lower()
+            self.locale = convert_locale_header_to_locale_object(self.language_code)
+        self._managers = {}
+        self._objects = {}
+
+    def get_manager(self, service_name, use_locale=True):
+        key = (service_name, use_locale)
+        if key not in self._managers:
+            locale = self.locale if use_locale else None
+            language_code = self.language_code if use_locale else None
+
+            def build_manager():
+                condition = PROXY_SESSION.get_proxy_condition()
+                dummy_request = SimpleRequest(username=self.username,
+                                              authenticated=True)
+                condition.set_http_request(dummy_request)
+                if locale is not None:
+                    condition.set_locale(locale)
+                proxy = PROXY_SESSION.get_proxy(condition)
+                return RUNTIME.get_service_manager(service_name,
+                                                   proxy=proxy)
+
+            if not self.pooled:
+                self._managers[key] = build_manager()
+            else:
+                # unknown locales all get the default locale, so they share
+                # one pool entry, instead of one per header value
+                if (language_code is not None and
+                        convert_two_digit_lang_code_to_locale_object(language_code) is None):
+                    language_code = 'default'
+                self._managers[key] = MANAGER_POOL.get((self.username, language_code),
+                                                       service_name,
+                                                       build_manager)
+        return self._managers[key]
+
+    def get_object(self, object_type, object_id, lookup, reset=None):
+        """identity map, so each object is loaded at most once per request.
+        lookup is only called on a miss, with object_id. reset, if given,
+        is called with the object on each hit, i.e. to reset its views"""
+        key = (object_type, str(object_id))
+        if key not in self._objects:
+            self._objects[key] = lookup(object_id)
+        elif reset is not None:
+            reset(self._objects[key])
+        return self._objects[key]
+
+    def forget_object(self, object_id=None):
+        """invalidate object_id after a write, or everything if None"""
+        if object_id is None:
+            self._objects.clear()
+        else:
+            for key in [k for k in self._objects if k[1] == str(object_id)]:
+                del self._objects[key]
+
+
 def create_agent_id(username, authority='MIT-ODL'):
     return Id(identifier=username,
               namespace='osid.agent.Agent',
@@ -59,34 +511,23 @@ def create_display_text(text_string, language_code=None):
         return DisplayText(display_text_map=text_string)
 
     # check the web headers to see if it was included
-    header_language_code = web.ctx.env.get('HTTP_X_API_LOCALE', None)
-
-    if language_code is None and header_language_code is not None:
-        language_code = header_language_code
-
     if language_code is None:
-        return DisplayText(display_text_map={
-            'text': text_string,
-            'languageTypeId': str(DEFAULT_LANGUAGE_TYPE),
-            'formatTypeId': str(DEFAULT_FORMAT_TYPE),
-            'scriptTypeId': str(DEFAULT_SCRIPT_TYPE)
-        })
-    else:
-        language_code = language_code.lower()
-        if language_code in ['en', 'hi', 'te']:
-            locale = convert_two_digit_lang_code_to_locale_object(language_code)
+        language_code = get_request_context().language_code
+
+    language_type_id = DEFAULT_LANGUAGE_TYPE
+    script_type_id = DEFAULT_SCRIPT_TYPE
+    if language_code is not None:
+        locale = convert_two_digit_lang_code_to_locale_object(language_code.lower())
+        if locale is not None:
             language_type_id = locale.language_type
             script_type_id = locale.script_type
-        else:
-            language_type_id = DEFAULT_LANGUAGE_TYPE
-            script_type_id = DEFAULT_SCRIPT_TYPE
 
-        return DisplayText(display_text_map={
-            'text': text_string,
-            'languageTypeId': str(language_type_id),
-            'formatTypeId': str(DEFAULT_FORMAT_TYPE),
-            'scriptTypeId': str(script_type_id)
-        })
+    return DisplayText(display_text_map={
+        'text': text_string,
+        'languageTypeId': str(language_type_id),
+        'formatTypeId': str(DEFAULT_FORMAT_TYPE),
+        'scriptTypeId': str(script_type_id)
+    })
 
 
 def format_response_mit_type(func):
@@ -100,22 +541,25 @@ def format_response_mit_type(func):
     """
     @functools.wraps(func)
     def wrapper(self, *args):
-        from assessment.assessment_utilities import get_assessment_manager
+        from assessment import assessment_utilities as autils
         results = func(self, *args)
 
+        if isinstance(results, basestring):
+            results = json.loads(results)  # return an object
         response = {
             "format": "MIT-CLIx-OEA",
-            "data": json.loads(results)  # return an object
+            "data": results
         }
 
         # inject the offered N of M also, if available
         if (len(args) == 2 and
                 args[0].startswith('assessment.Bank') and
                 args[1].startswith('assessment.AssessmentTaken')):
-            am = get_assessment_manager()
-            bank = am.get_bank(clean_id(args[0]))
-            taken = bank.get_assessment_taken(clean_id(args[1]))
-            offered = bank.get_assessment_offered(clean_id(taken.object_map['assessmentOfferedId']))
+            # the handler usually loaded these already, this request
+            am = autils.get_assessment_manager()
+            bank = autils.get_bank(am, clean_id(args[0]))
+            taken = autils.get_assessment_taken(bank, clean_id(args[1]))
+            offered = autils.get_assessment_offered(bank, clean_id(taken.object_map['assessmentOfferedId']))
             offered_map = offered.object_map
             if 'nOfM' in offered_map:
                 response.update({
@@ -126,18 +570,22 @@ def format_response_mit_type(func):
 
 
 def format_response(func):
-    """set json header and convert response to json string"""
+    """set json header and convert response to json string.
+    Generators, like from stream_items(), are passed through as-is,
+    so the response is sent with chunked transfer encoding"""
     @functools.wraps(func)
     def wrapper(self, *args):
         results = func(self, *args)
-        web.header('Content-type', 'application/json')
+        if not web.ctx.status.startswith('304'):
+            # 304 responses have no body, so no type
+            web.header('Content-type', 'application/json')
         web.header("Access-Control-Allow-Origin", "*")
         web.header("Access-Control-Allow-Credentials", "true")
         web.header("Access-Control-Allow-Headers", CORS_HEADERS)
         web.header("Access-Control-Allow-Methods", "GET, POST, OPTIONS, PUT, DELETE")
         web.header("Access-Control-Max-Age", "1728000")
         if isinstance(results, dict) or isinstance(results, list):
-            return json.dumps(results)
+            return to_json(results)
         else:
             return results
     return wrapper
@@ -148,7 +596,8 @@ def format_xml_response(func):
     @functools.wraps(func)
     def wrapper(self, *args):
         results = func(self, *args)
-        web.header('Content-type', 'application/xml')
+        if not web.ctx.status.startswith('304'):
+            web.header('Content-type', 'application/xml')
         web.header("Access-Control-Allow-Origin", "*")
         web.header("Access-Control-Allow-Credentials", "true")
         web.header("Access-Control-Allow-Headers", CORS_HEADERS)
@@ -232,6 +681,16 @@ def convert_two_digit_lang_code_to_locale_object(language_code):
     return None
 
 
+def convert_locale_header_to_locale_object(language_code):
+    """like convert_two_digit_lang_code_to_locale_object, but unknown
+    codes map to the default language and script, like the managers expect"""
+    locale = convert_two_digit_lang_code_to_locale_object(language_code.lower())
+    if locale is None:
+        locale = InitializableLocale(language_type_identifier=DEFAULT_LANGUAGE_TYPE.identifier,
+                                     script_type_identifier=DEFAULT_SCRIPT_TYPE.identifier)
+    return locale
+
+
 def extract_items(item_list):
     try:
         if item_list.available() > 0:
@@ -263,6 +722,88 @@ def extract_items(item_list):
         return json.dumps([])
 
 
+def get_etag(obj, *extras):
+    """strong ETag for obj as rendered for the current request. It changes
+    when the stored object changes, or with the query string, host,
+    proxy user, locale or any extras"""
+    context = get_request_context()
+    stamp = hashlib.sha1(get_revision(obj))
+    for part in (context.username,
+                 context.language_code,
+                 web.ctx.get('homedomain', ''),
+                 web.ctx.get('query', '')) + extras:
+        stamp.update('\0' + unicode(part).encode('utf-8'))
+    return '"{0}"'.format(stamp.hexdigest())
+
+
+def get_page(item_list, params):
+    """support ?limit= and ?cursor= on list endpoints.
+    Returns (page, next_url). If no limit is requested, page is item_list
+    unchanged. Only the items up to the end of the page are read
+    from item_list, plus one to see if there is a next page.
+    """
+    if 'limit' not in params:
+        return item_list, None
+    try:
+        limit = int(params['limit'])
+    except ValueError:
+        limit = 0
+    if limit < 1:
+        raise InvalidArgument('limit must be a positive integer')
+
+    offset = 0
+    if 'cursor' in params:
+        # opaque to clients, so we can change it later
+        try:
+            offset = int(json.loads(base64.urlsafe_b64decode(str(params['cursor'])))['offset'])
+        except (TypeError, ValueError, KeyError):
+            raise InvalidArgument('invalid cursor')
+        if offset < 0:
+            raise InvalidArgument('invalid cursor')
+
+    # O(offset): the dlkit object lists cannot skip, so the items before
+    # the page are still built, and thrown away, on each page
+    page = list(itertools.islice(item_list, offset, offset + limit + 1))
+    next_url = None
+    if len(page) > limit:
+        page = page[:limit]
+        cursor = base64.urlsafe_b64encode(json.dumps({'offset': offset + limit}))
+        query = [(k, v) for k, v in parse_qsl(str(web.ctx.query).lstrip('?'), keep_blank_values=True)
+                 if k != 'cursor']
+        query.append(('cursor', cursor))
+        next_url = '{0}{1}?{2}'.format(web.ctx.home,
+                                       web.ctx.path,
+                                       urlencode(query))
+    return page, next_url
+
+
+def get_request_context():
+    """return the RequestContext for the current request, creating it
+    if the load hook has not run, i.e. when a sub-app is used on its own,
+    or outside of a request"""
+    if 'request_context' not in web.ctx:
+        web.ctx.request_context = RequestContext(web.ctx.get('env', {}))
+    return web.ctx.request_context
+
+
+def get_revision(obj):
+    """revision stamp for a dlkit object, from its stored map, so it is
+    cheap compared to .object_map and changes on every update"""
+    try:
+        stored_map = obj._my_map
+    except AttributeError:
+        stored_map = obj._catalog._my_map  # services catalogs, like Bank
+    return hashlib.sha1(json.dumps(stored_map,
+                                   sort_keys=True,
+                                   default=str)).hexdigest()
+
+
+def get_service_manager(service_name, use_locale=True):
+    """return a service manager for the X-Api-Proxy user and,
+    if use_locale, the X-Api-Locale header of the current request"""
+    return get_request_context().get_manager(service_name, use_locale=use_locale)
+
+
 def handle_exceptions(ex):
     message = str(ex)
     if 'WEBENV' in os.environ and os.environ['WEBENV'] == 'test':
@@ -286,6 +827,87 @@ def handle_exceptions(ex):
         raise web.InternalError(message)
 
 
+def iter_item_maps(item_list, update_map=None):
+    """yield the object map of each item, skipping bad items like
+    extract_items does. Items that are already dicts pass through.
+    An item whose update_map(item_map) fails is skipped too, so that
+    stream_items() never sends a truncated array after the 200"""
+    for item in item_list:
+        try:
+            try:
+                item_map = item.object_map
+            except AttributeError:
+                if hasattr(item, 'get_node_map'):
+                    # Hierarchy Nodes do not have .object_map
+                    item_map = item.get_node_map()
+                else:
+                    item_map = item
+            if update_map is not None:
+                item_map = update_map(item_map)
+        except Exception:  # yes, this is overly broad, see extract_items
+            continue
+        yield item_map
+
+
+def load_request_context():
+    """web.py load hook, so the headers are only parsed once per request"""
+    web.ctx.request_context = RequestContext(web.ctx.env)
+
+
+def log_exception():
+    """print the current exception's traceback to the server logs, like
+    handle_exceptions(), for a failure that should not fail the request"""
+    if os.environ.get('WEBENV') != 'test':
+        print traceback.format_exc(10)
+
+
+def makedirs(path):
+    """os.makedirs(), that also succeeds if path already exists, e.g.
+    created by another thread or worker process in the meantime"""
+    try:
+        os.makedirs(path)
+    except OSError:
+        if not os.path.isdir(path):
+            raise
+
+
+def not_modified(etag):
+    """set the ETag header, and if the client's If-None-Match already has
+    etag, set a 304 status and return True. The handler should then
+    return an empty body. Raising web.notmodified() inside a handler's
+    try block would turn into a 500 in handle_exceptions()"""
+    web.header('ETag', etag)
+    if_none_match = web.ctx.env.get('HTTP_IF_NONE_MATCH')
+    if if_none_match is None:
+        return False
+    # weak comparison, which is what If-None-Match uses
+    tags = [tag.strip().replace('W/', '', 1) for tag in if_none_match.split(',')]
+    if '*' in tags or etag in tags:
+        web.ctx.status = '304 Not Modified'
+        return True
+    return False
+
+
+def page_response(page, params, next_url, update_map=None):
+    """with ?limit=, return {"data": <the page>, "next": <next page url or None>}.
+    Otherwise stream the whole list, as before"""
+    if 'limit' not in params:
+        return stream_items(page, update_map=update_map)
+    return {
+        'data': list(iter_item_maps(page, update_map=update_map)),
+        'next': next_url
+    }
+
+
+def save_file(file_path, data):
+    """write data to file_path atomically: readers, in any thread or
+    worker process, see either the old file or the new one, never half"""
+    temp_path = '{0}.{1}.tmp'.format(file_path, uuid.uuid4().hex)
+    with open(temp_path, 'w') as temp_file:
+        temp_file.write(data)
+    os.rename(temp_path, file_path)
+
+
 def set_form_basics(form, data):
     def _grab_first_match(keys):
         # filtered = {k:v for k, v in data.iteritems() if k in keys}
@@ -330,10 +952,40 @@ def set_form_basics(form, data):
     return form
 
 
+def stream_items(item_list, update_map=None):
+    """like extract_items, but yields the JSON array one element at a
+    time, so the whole list is never in memory at once.
+    If provided, update_map(item_map) is applied to each element before
+    it is serialized.
+
+    Errors fetching the list should be raised by the handler, before
+    this starts -- once streaming starts, the status is already sent.
+    """
+    yield '['
+    first = True
+    for item_map in iter_item_maps(item_list, update_map=update_map):
+        if first:
+            first = False
+            yield to_json(item_map)
+        else:
+            yield ',' + to_json(item_map)
+    yield ']'
+
+
 def success():
     return json.dumps({"success": True})
 
 
+def to_json(data):
+    """serialize a response body. Uses JSON_ENCODER, if one is set"""
+    if JSON_ENCODER is not None:
+        try:
+            return JSON_ENCODER(data)
+        except (TypeError, ValueError, OverflowError):
+            pass  # i.e. something the fast encoder does not support
+    return json.dumps(data)
+
+
 def verify_at_least_one_key_present(_data, _keys_list):
     """
     at least one of the keys is present